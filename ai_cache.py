@@ -0,0 +1,345 @@
+import os
+import re
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import config
+from config import debug_print
+from memory import save_json, load_json, add_node_listener, get_node_data, get_root_children_ids
+
+# 노드 내용 해시 (주제 + 요약)
+def content_hash(node_data: dict) -> str:
+    text = f"{node_data.get('topic', '')}\n{node_data.get('summary', '')}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+# 질의 해시 (공백과 대소문자 차이는 같은 질의로 취급)
+def query_hash(query: str) -> str:
+    normalized = ' '.join(query.split()).lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+# 유사도 판단 결과 캐시
+class SimilarityCache:
+    """
+    (노드 내용 해시, 질의 해시) -> 유사도 점수 문자열을 저장하는 LRU 캐시
+    노드 내용이 바뀌면 키가 달라지므로 오래된 점수는 다시 사용되지 않고,
+    save_node_data로 주제나 요약이 바뀐 노드의 이전 항목은 즉시 제거됨
+    Args:
+        max_entries: 최대 항목 수 (초과 시 가장 오래 사용하지 않은 항목부터 제거)
+        file_path: 디스크 저장 경로 (None이면 메모리에만 유지)
+    """
+    def __init__(self, max_entries: int = 10000, file_path: str = None):
+        self.max_entries = max_entries
+        self.file_path = file_path
+        self._entries = OrderedDict()  # (content_hash, query_hash) -> score
+        self._by_content = {}  # content_hash -> {query_hash}
+        self._by_node = {}  # node_id -> 마지막으로 조회한 content_hash
+        self._lock = threading.Lock()
+        if file_path:
+            self._load()
+    
+    def _load(self):
+        entries = load_json(self.file_path, [])
+        if not isinstance(entries, list):
+            return
+        with self._lock:
+            for item in entries[-self.max_entries:]:
+                if isinstance(item, list) and len(item) == 3:
+                    self._store(item[0], item[1], item[2])
+        debug_print(f"SimilarityCache loaded ({len(self._entries)} entries)")
+    
+    def save(self) -> bool:
+        """캐시를 LRU 순서대로 디스크에 저장"""
+        if not self.file_path:
+            return True
+        with self._lock:
+            entries = [[content, query, score] for (content, query), score in self._entries.items()]
+        return save_json(self.file_path, entries)
+    
+    def _store(self, content: str, query: str, score: str):
+        key = (content, query)
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        self._by_content.setdefault(content, set()).add(query)
+        while len(self._entries) > self.max_entries:
+            (old_content, old_query), _ = self._entries.popitem(last=False)
+            queries = self._by_content.get(old_content)
+            if queries is not None:
+                queries.discard(old_query)
+                if not queries:
+                    del self._by_content[old_content]
+    
+    def _drop_content(self, content: str):
+        for query in self._by_content.pop(content, ()):
+            self._entries.pop((content, query), None)
+    
+    def get(self, node_id: str, node_data: dict, query: str):
+        """캐시된 점수 반환 (없으면 None)"""
+        key = (content_hash(node_data), query_hash(query))
+        with self._lock:
+            self._by_node[node_id] = key[0]
+            score = self._entries.get(key)
+            if score is not None:
+                self._entries.move_to_end(key)
+            return score
+    
+    def put(self, node_id: str, node_data: dict, query: str, score: str):
+        content = content_hash(node_data)
+        with self._lock:
+            self._by_node[node_id] = content
+            self._store(content, query_hash(query), score)
+    
+    def invalidate_node(self, node_id: str, node_data: dict):
+        """노드의 주제나 요약이 바뀌었으면 이전 내용으로 저장된 점수를 제거"""
+        with self._lock:
+            previous = self._by_node.get(node_id)
+            if previous is None:
+                return
+            current = content_hash(node_data)
+            if previous != current:
+                self._drop_content(previous)
+                del self._by_node[node_id]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_content.clear()
+            self._by_node.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+_similarity_cache = None
+
+def get_similarity_cache():
+    """프로세스 전역 유사도 캐시 반환 (SIMILARITY_CACHE_ENABLED가 false이면 None)"""
+    global _similarity_cache
+    if not config.SIMILARITY_CACHE_ENABLED:
+        return None
+    if _similarity_cache is None:
+        _similarity_cache = SimilarityCache(
+            max_entries=config.SIMILARITY_CACHE_SIZE,
+            file_path='memory/similarity_cache.json' if config.SIMILARITY_CACHE_PERSIST else None
+        )
+        add_node_listener(_similarity_cache.invalidate_node)
+        if config.SIMILARITY_CACHE_PERSIST:
+            atexit.register(_similarity_cache.save)
+    return _similarity_cache
+
+# AI 결과 캐시 (요약, 주제 생성, 부모 갱신)
+class ResultCache:
+    """
+    (모델, 시스템 지침, 프롬프트)의 해시를 키로 AI 응답 텍스트를 저장하는 디스크 캐시
+    입력이 같으면 결과도 같은 AI 함수(summary_AI, topic_generation_AI, parent_update_AI)에만 사용하며,
+    SQLite 파일에 저장하므로 재시작이나 대화 기록으로 트리를 다시 만들 때도 재사용되고 여러 프로세스가 공유할 수 있음
+    Args:
+        db_path: 캐시 데이터베이스 경로
+        max_entries: 최대 항목 수 (초과 시 가장 오래 사용하지 않은 항목부터 제거)
+    """
+    EVICT_EVERY = 64  # 이 횟수만큼 저장할 때마다 크기 확인
+    
+    def __init__(self, db_path: str = 'memory/ai_result_cache.sqlite3', max_entries: int = 50000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._conn = None
+        self._puts = 0
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used)")
+            self._conn = conn
+            self._evict()
+        return self._conn
+    
+    @staticmethod
+    def make_key(model: str, system: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\0{system}\0{prompt}".encode('utf-8')).hexdigest()
+    
+    def get(self, key: str):
+        """캐시된 응답 반환 (없으면 None)"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+    
+    def put(self, key: str, value: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+    
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            debug_print(f"ResultCache evicted {count - self.max_entries} entries")
+    
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+_result_cache = None
+
+def get_result_cache():
+    """프로세스 전역 AI 결과 캐시 반환 (AI_RESULT_CACHE_ENABLED가 false이면 None)"""
+    global _result_cache
+    if not config.AI_RESULT_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        _result_cache = ResultCache(max_entries=config.AI_RESULT_CACHE_SIZE)
+        atexit.register(_result_cache.close)
+    return _result_cache
+
+# 검색 결과 캐시
+class QueryResultCache:
+    """
+    질의 -> search_tree 결과(대화 인덱스 리스트)를 저장하는 LRU/TTL 캐시
+    정규화한 질의가 같거나, 이전 질의와의 글자 n-gram 코사인 유사도가 similarity 이상이면 저장된 결과를 반환
+    항목마다 검색이 따라 내려간 경로의 노드와 당시 노드 version, ROOT 직속 자식 집합을 함께 저장하여,
+    경로의 노드가 save_node_data로 바뀌거나 ROOT에 새 노드가 생기면 즉시 제거하고 조회 시에도 다르면 사용하지 않음
+    (경로 밖 하위 노드의 변화는 반영하지 않으므로 ttl이 지나면 다시 검색)
+    Args:
+        max_entries: 최대 항목 수 (초과 시 가장 오래 사용하지 않은 항목부터 제거)
+        ttl: 항목 유효 시간 (초)
+        similarity: 비슷한 질의로 취급하는 최소 코사인 유사도
+    """
+    def __init__(self, max_entries: int = 256, ttl: float = 600, similarity: float = 0.85):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # query_hash -> (n-gram 빈도, 노름, 결과, {node_id: version}, 저장 시각, ROOT 자식 집합)
+        self._by_node = {}  # node_id -> {query_hash}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _grams(query: str):
+        from vector_index import char_ngrams
+        counts = {}
+        for gram in char_ngrams(re.sub(r'[^\w\s]', ' ', query)):  # 문장 부호 차이는 무시
+            counts[gram] = counts.get(gram, 0) + 1
+        return counts, sum(count * count for count in counts.values()) ** 0.5
+    
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for node_id in entry[3]:
+            keys = self._by_node.get(node_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_node[node_id]
+    
+    def _is_valid(self, entry, now: float) -> bool:
+        if now - entry[4] > self.ttl:
+            return False
+        if frozenset(get_root_children_ids()) != entry[5]:
+            return False
+        for node_id, version in entry[3].items():
+            node_data = get_node_data(node_id)
+            if not node_data or node_data.get('version') != version:
+                return False
+        return True
+    
+    def get(self, query: str):
+        """캐시된 결과 반환 (같거나 비슷한 질의가 없으면 None)"""
+        key = query_hash(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                counts, norm = self._grams(query)
+                best_score = self.similarity
+                for candidate_key, candidate in self._entries.items():
+                    if not norm or not candidate[1]:
+                        continue
+                    dot = sum(count * candidate[0].get(gram, 0) for gram, count in counts.items())
+                    score = dot / (norm * candidate[1])
+                    if score >= best_score:
+                        key, entry, best_score = candidate_key, candidate, score
+            if entry is None:
+                return None
+            if not self._is_valid(entry, now):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return list(entry[2])
+    
+    def put(self, query: str, results: list, path_node_ids):
+        """검색 결과를 경로 노드들의 현재 version과 함께 저장"""
+        path = {}
+        for node_id in path_node_ids:
+            node_data = get_node_data(node_id)
+            if node_data:
+                path[node_id] = node_data.get('version')
+        root_children = frozenset(get_root_children_ids())
+        counts, norm = self._grams(query)
+        key = query_hash(query)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (counts, norm, list(results), path, time.time(), root_children)
+            for node_id in path:
+                self._by_node.setdefault(node_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+    
+    def invalidate_node(self, node_id: str, node_data: dict):
+        """경로에 노드가 포함된 결과와, 새 ROOT 직속 노드가 생겼으면 그 노드를 평가하지 않은 결과를 제거"""
+        with self._lock:
+            for key in list(self._by_node.get(node_id, ())):
+                self._drop(key)
+            if node_data.get('direct_parent_id') is None:
+                for key in [key for key, entry in self._entries.items() if node_id not in entry[5]]:
+                    self._drop(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_node.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+_query_cache = None
+
+def get_query_cache():
+    """프로세스 전역 검색 결과 캐시 반환 (QUERY_CACHE_ENABLED가 false이면 None)"""
+    global _query_cache
+    if not config.QUERY_CACHE_ENABLED:
+        return None
+    if _query_cache is None:
+        _query_cache = QueryResultCache(
+            max_entries=config.QUERY_CACHE_SIZE,
+            ttl=config.QUERY_CACHE_TTL,
+            similarity=config.QUERY_CACHE_SIMILARITY
+        )
+        add_node_listener(_query_cache.invalidate_node)
+    return _query_cache
@@ -1,115 +1,325 @@
 import asyncio
+import contextvars
+import random
+import re
+import threading
 import time
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from config import AI_API, LOAD_API, AI_API_N, LOAD_API_N, CALL_STATS, debug_print, GEMINI_MODEL
-from memory import load_json
+from contextlib import contextmanager
+from config import AI_API, LOAD_API, AI_API_N, LOAD_API_N, CALL_STATS, debug_print
+from memory import get_conversations
+from ai_cache import get_similarity_cache, get_result_cache, ResultCache
+import config
+from scheduler import get_scheduler, estimate_tokens, get_limiter, get_executor, get_single_flight, get_hedger
+from llm_backend import (
+    AIError, AIRateLimitError, AITransientError, AICallBudgetError, get_backend,
+    SIMILARITY_SYSTEM, similarity_prompt
+)
+
+def native_async_available() -> bool:
+    """현재 백엔드가 스레드 없이 비동기 호출을 지원하는지 여부"""
+    return get_backend().native_async()
+
+RETRY_BASE_DELAY = 0.5  # 첫 재시도 전 최대 대기 시간 (초)
+RETRY_MAX_DELAY = 16.0
+RETRY_AFTER_PATTERN = re.compile(r'retry in ([\d.]+)s|seconds: (\d+)')
+_sdk_errors = None
+
+def sdk_errors() -> tuple:
+    """
+    (429 예외 타입들, 일시적 오류 타입들)
+    SDK 예외는 처음 필요할 때 가져오며, SDK가 없으면(로컬 백엔드) 기본 예외만 사용
+    """
+    global _sdk_errors
+    if _sdk_errors is None:
+        try:
+            from google.api_core import exceptions as google_exceptions
+        except ImportError:
+            _sdk_errors = ((), (ConnectionError, TimeoutError))
+        else:
+            _sdk_errors = (
+                (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests),
+                (google_exceptions.InternalServerError, google_exceptions.ServiceUnavailable,
+                 google_exceptions.DeadlineExceeded, google_exceptions.GatewayTimeout,
+                 ConnectionError, TimeoutError)
+            )
+    return _sdk_errors
+
+def classify_error(e: Exception) -> AIError:
+    """SDK 예외를 AIError 하위 타입으로 변환"""
+    if isinstance(e, AIError):
+        return e
+    rate_limit_errors, transient_errors = sdk_errors()
+    message = str(e)
+    if isinstance(e, rate_limit_errors) or "429" in message or "ResourceExhausted" in message:
+        match = RETRY_AFTER_PATTERN.search(message)
+        retry_after = float(match.group(1) or match.group(2)) if match else None
+        return AIRateLimitError(f"AI API 호출이 너무 많아 오류가 발생했습니다: 429 = RPM초과 : {e}", retry_after)
+    if isinstance(e, transient_errors):
+        return AITransientError(f"AI API 일시적 오류: {e}")
+    return AIError(f"AI API 호출 중 예외 발생: {e}")
+
+def backoff_delay(attempt: int, error: AIError) -> float:
+    """지수 백오프 + full jitter 대기 시간 (429는 서버가 알려준 대기 시간 이상)"""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    if isinstance(error, AIRateLimitError) and error.retry_after:
+        delay = max(delay, error.retry_after)
+    return delay
+
+def is_retryable(error: AIError) -> bool:
+    return isinstance(error, (AIRateLimitError, AITransientError))
+
+# AI 호출 예산
+class CallBudget:
+    """
+    실제 백엔드 호출 수 상한
+    재시도, 배치 실패 후 개별 재평가, 헤지 요청을 포함해 백엔드를 한 번 호출할 때마다 차감하고,
+    소진된 뒤의 호출은 AICallBudgetError로 거절함 (결과 캐시 적중과 병합된 호출은 차감하지 않음)
+    """
+    def __init__(self, max_calls: int):
+        self.max_calls = max_calls
+        self.used = 0
+        self.refused = 0
+        self._lock = threading.Lock()  # 동기 호출은 스레드 풀에서 차감함
+    
+    @property
+    def remaining(self) -> int:
+        with self._lock:
+            return max(0, self.max_calls - self.used)
+    
+    def try_charge(self) -> bool:
+        with self._lock:
+            if self.used >= self.max_calls:
+                self.refused += 1
+                return False
+            self.used += 1
+            return True
+
+_call_budget = contextvars.ContextVar('call_budget', default=None)
+
+@contextmanager
+def call_budget(max_calls: int):
+    """
+    블록 안에서 시작한 AI 호출(그 안에서 만든 태스크 포함)에 호출 예산 적용
+    컨텍스트 변수로 전달하므로 동시에 실행되는 검색은 각자의 예산을 가짐
+    """
+    budget = CallBudget(max_calls)
+    token = _call_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _call_budget.reset(token)
+
+def charge_call_budget():
+    """현재 호출 예산에서 한 번 차감 (예산이 없으면 제한 없음, 소진되었으면 AICallBudgetError 발생)"""
+    budget = _call_budget.get()
+    if budget is not None and not budget.try_charge():
+        raise AICallBudgetError(f"AI 호출 예산 소진 ({budget.max_calls}회)")
+
+def call_budget_exhausted() -> bool:
+    budget = _call_budget.get()
+    return budget is not None and budget.remaining == 0
+
+# 히스토리/예시를 포함한 프롬프트 구성
+def build_prompt(prompt: str, history: list = None, fine: list = None) -> str:
+    if fine:
+        ex = ''.join([f"user: {q}\nassistant: {a}\n" for q, a in fine])
+        return f"{ex}user: {prompt}"
+    his = ""
+    if history:
+        for msg in history:
+            role = msg.get('role', 'user')
+            content = msg.get('content', '')
+            his += f"{role}: {content}\n"
+    return f"{his}user: {prompt}"
 
 # 기본 동기 AI 호출 함수
 def AI(prompt: str = '테스트', system: str = '지침', history: list = None, fine: list = None, 
-       api_key: str = None, retries: int = 3, debug: bool = False) -> str:
+       api_key: str = None, retries: int = 3, debug: bool = False, cache: bool = False, task: str = None) -> str:
     """
-    기본적인 gemini API 단일(동기적) 호출 함수
+    기본적인 AI 단일(동기적) 호출 함수 (MODEL 설정에 해당하는 백엔드 사용)
+    일시적 오류와 429는 지수 백오프(jitter 포함)로 최대 retries번 재시도하고, 그래도 실패하면 AIError를 발생시킴
+    cache=True이면 (모델, 시스템 지침, 프롬프트)가 같은 이전 응답을 AI 결과 캐시에서 재사용 (입력만으로 결과가 정해지는 호출용)
+    task는 호출 종류 힌트 (로컬 백엔드가 응답 형식을 정하는 데 사용)
     """
-    if api_key is None:
+    backend = get_backend()
+    if api_key is None and backend.requires_api_key:
         if AI_API_N > 0:
             api_key = AI_API[0]
         else:
-            return "[ERROR] No AI API key available"
+            raise AIError("No AI API key available")
     
     call_start = time.time()
+    combined = build_prompt(prompt, history, fine)
+    
+    result_cache = get_result_cache() if cache else None
+    if result_cache is not None:
+        cache_key = ResultCache.make_key(backend.model_name, system, combined)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            CALL_STATS['result_cache_hits'] += 1
+            if debug:
+                debug_print(f"AI 결과 캐시 적중 (응답 길이: {len(cached)}자)")
+            return cached
     
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            GEMINI_MODEL, 
-            system_instruction=system,
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            }
-        )
-        
-        # 히스토리 처리
-        if fine:
-            ex = ''.join([f"user: {q}\nassistant: {a}\n" for q, a in fine])
-            combined = f"{ex}user: {prompt}"
-        else:
-            his = ""
-            if history:
-                for msg in history:
-                    role = msg.get('role', 'user')
-                    content = msg.get('content', '')
-                    his += f"{role}: {content}\n"
-            combined = f"{his}user: {prompt}"
-        
-        resp = model.start_chat(history=[]).send_message(combined)
-        txt = resp._result.candidates[0].content.parts[0].text.strip()
-        result = txt[10:].strip() if txt.lower().startswith('assistant:') else txt
-        
-        call_end = time.time()
-        
-        if debug:
-            debug_print(f"AI 호출 완료 (응답 길이: {len(result)}자, 소요시간: {call_end - call_start:.2f}초)")
-        
-        return result
-        
-    except Exception as e:
-        if "429" in str(e) or "ResourceExhausted" in str(e):
-            err_msg = f"[ERROR] AI API 호출이 너무 많아 오류가 발생했습니다: 429 = RPM초과 : {e}"
+    attempt = 0
+    while True:
+        charge_call_budget()
+        try:
+            result = backend.generate(combined, system, api_key, task)
+            break
+        except Exception as e:
+            error = classify_error(e)
+            if attempt >= retries or not is_retryable(error):
+                if debug:
+                    debug_print(f"[ERROR] {error}")
+                raise error
+            delay = backoff_delay(attempt, error)
+            attempt += 1
+            if debug:
+                debug_print(f"AI 호출 재시도 {attempt}/{retries} ({delay:.2f}초 후): {error}")
+            time.sleep(delay)
+    
+    if result_cache is not None:
+        result_cache.put(cache_key, result)
+    
+    call_end = time.time()
+    
+    if debug:
+        debug_print(f"AI 호출 완료 (응답 길이: {len(result)}자, 소요시간: {call_end - call_start:.2f}초)")
+    
+    return result
+
+# 백엔드 비동기 API를 사용하는 AI 호출 함수
+async def AI_async(prompt: str, system: str, history: list = None, fine: list = None,
+                   api_key: str = None, retries: int = 3, debug: bool = False, cache: bool = False,
+                   task: str = None) -> str:
+    """AI()와 같은 동작을 스레드 없이 백엔드의 generate_async로 수행"""
+    backend = get_backend()
+    if api_key is None and backend.requires_api_key:
+        if AI_API_N > 0:
+            api_key = AI_API[0]
         else:
-            err_msg = f"[ERROR] AI API 호출 중 예외 발생: {e}"
-        
-        if debug:
-            debug_print(err_msg)
-        return err_msg
+            raise AIError("No AI API key available")
+    
+    call_start = time.time()
+    combined = build_prompt(prompt, history, fine)
+    
+    result_cache = get_result_cache() if cache else None
+    if result_cache is not None:
+        cache_key = ResultCache.make_key(backend.model_name, system, combined)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            CALL_STATS['result_cache_hits'] += 1
+            return cached
+    
+    attempt = 0
+    while True:
+        charge_call_budget()
+        try:
+            result = await backend.generate_async(combined, system, api_key, task)
+            break
+        except Exception as e:
+            error = classify_error(e)
+            if attempt >= retries or not is_retryable(error):
+                if debug:
+                    debug_print(f"[ERROR] {error}")
+                raise error
+            delay = backoff_delay(attempt, error)
+            attempt += 1
+            if debug:
+                debug_print(f"AI 호출 재시도 {attempt}/{retries} ({delay:.2f}초 후): {error}")
+            await asyncio.sleep(delay)
+    
+    if result_cache is not None:
+        result_cache.put(cache_key, result)
+    
+    if debug:
+        debug_print(f"AI 호출 완료 (응답 길이: {len(result)}자, 소요시간: {time.time() - call_start:.2f}초)")
+    
+    return result
+
+def single_flight_key(system: str, prompt: str, history: list = None, fine: list = None) -> str:
+    """동일 요청 병합 키 (AI 결과 캐시와 같은 (모델, 시스템 지침, 프롬프트) 해시)"""
+    return ResultCache.make_key(get_backend().model_name, system, build_prompt(prompt, history, fine))
 
 # 비동기 AI 호출 함수
 async def ASYNC_AI(prompt: str, system: str, history: list = None, fine: list = None, 
-                   api_key: str = None, retries: int = 3, debug: bool = False) -> str:
+                   api_key: str = None, retries: int = 3, debug: bool = False, task: str = None,
+                   coalesce: bool = True, on_start=None) -> str:
     """
-    기본적인 gemini 단일(비동기적) 호출 함수
+    기본적인 AI 단일(비동기적) 호출 함수 (실패 시 AIError 발생)
+    전체/키별 동시 실행 수 제한 안에서 백엔드 비동기 API(사용 가능 시) 또는 전용 스레드 풀로 실행함
+    coalesce=True이면 같은 (모델, 시스템 지침, 프롬프트) 요청이 실행 중일 때 그 결과를 함께 사용 (API 키와 무관)
+    on_start는 동시 실행 슬롯을 얻어 실제 호출을 시작할 때 인자 없이 호출됨 (로컬 대기를 뺀 지연 시간 측정용)
+    다른 요청의 호출에 합류한 경우에는 그 호출이 시작될 때 (이미 시작되었으면 합류할 때 바로) 호출됨
     """
+    if coalesce and config.AI_SINGLE_FLIGHT:
+        key = single_flight_key(system, prompt, history, fine)
+        return await get_single_flight().do(
+            key,
+            lambda started: ASYNC_AI(prompt, system, history, fine, api_key, retries, debug, task,
+                                     coalesce=False, on_start=started),
+            on_start=on_start
+        )
+    
     global CALL_STATS
     CALL_STATS['total_calls'] += 1
     start_time = time.time()
     
+    if api_key is None and AI_API_N > 0 and get_backend().requires_api_key:
+        api_key = AI_API[0]
+    
     try:
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None, 
-            AI, 
-            prompt, system, history, fine, api_key, retries, debug
-        )
+        async with get_limiter().slot(api_key):
+            if on_start is not None:
+                on_start()
+            if native_async_available():
+                result = await AI_async(prompt, system, history, fine, api_key, retries, debug, task=task)
+            else:
+                # 호출 예산이 스레드에서도 보이도록 현재 컨텍스트에서 실행
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    get_executor(), 
+                    contextvars.copy_context().run,
+                    AI, 
+                    prompt, system, history, fine, api_key, retries, debug, False, task
+                )
         
         end_time = time.time()
         CALL_STATS['total_time'] += (end_time - start_time)
         
         return result
     except Exception as e:
-        CALL_STATS['error_count'] += 1
-        err_msg = f"[ERROR] 비동기 AI 호출 중 예외 발생: {e}"
-        if debug:
-            debug_print(err_msg)
-        return err_msg
+        error = classify_error(e)
+        if not isinstance(error, AICallBudgetError):
+            CALL_STATS['error_count'] += 1
+        raise error
 
 # 병렬 AI 호출 함수
 async def ASYNC_MULTI_AI(queries: list, system_prompt: str, history: list = None, fine: list = None, 
                          debug: bool = False, start_debug_message: str = "--start", 
-                         end_debug_message: str = "--end") -> list:
+                         end_debug_message: str = "--end", retries: int = 3, task: str = None) -> list:
     """
     여러 쿼리의 병렬(비동기적) 처리
+    Returns:
+        list: queries와 같은 순서의 응답 (재시도 후에도 실패한 쿼리는 None)
     """
     global CALL_STATS
     
     if not queries:
         return []
     
-    if not LOAD_API or len(queries) <= 1:
-        tasks = [ASYNC_AI(q, system_prompt, history, fine, AI_API[0] if AI_API_N > 0 else None, debug=debug) for q in queries]
-        return await asyncio.gather(*tasks)
+    async def run_single(query):
+        try:
+            return await ASYNC_AI(query, system_prompt, history, fine, AI_API[0] if AI_API_N > 0 else None,
+                                  retries=retries, debug=debug, task=task)
+        except AIError as e:
+            debug_print(f"[ERROR] AI 호출 실패: {e}")
+            return None
+    
+    # 쿼리가 하나뿐이어도 LOAD_API 키 스케줄러를 거침 (파이프라인 검색은 노드마다 따로 호출함)
+    if not LOAD_API or not get_backend().requires_api_key:
+        return await asyncio.gather(*[run_single(q) for q in queries])
     
     CALL_STATS['parallel_calls'] += 1
     start_time = time.time()
@@ -118,24 +328,119 @@ async def ASYNC_MULTI_AI(queries: list, system_prompt: str, history: list = None
         debug_print(start_debug_message)
         debug_print(f"병렬 AI 호출 시작 ({len(queries)}개)")
     
-    async def run_and_debug(i, query):
-        api_key = LOAD_API[i % len(LOAD_API)]
+    # 키는 순서대로 돌리지 않고 RPM/TPM 여유가 가장 많은 키를 스케줄러에서 배정받음
+    # 재시도는 같은 키를 고집하지 않고 매번 새로 배정받으며, 연속으로 실패한 키는 서킷 브레이커로 잠시 제외됨
+    scheduler = get_scheduler()
+    history_text = ''.join(msg.get('content', '') for msg in history) if history else ''
+    tokens = [estimate_tokens(system_prompt, history_text, query) for query in queries]
+    
+    hedger = get_hedger() if config.HEDGE_ENABLED else None
+    
+    async def call(query, api_key, started=None):
+        """
+        한 키로 한 번 호출하고 키별 성공/실패와 지연 시간을 기록
+        지연 시간은 동시 실행 슬롯을 얻은 뒤부터 재며, started(asyncio.Event)는 그 시점에 설정됨
+        """
+        call_start = None
+        def on_start():
+            nonlocal call_start
+            call_start = time.monotonic()
+            if started is not None:
+                started.set()
         try:
-            result = await ASYNC_AI(query, system_prompt, history, fine, api_key, debug=debug)
-            return result
-        except Exception as e:
-            err_msg = f"[ERROR] 병렬 AI 호출 중 예외 발생 (TASK-{i+1:02d}): {e}"
-            if debug:
-                debug_print(err_msg)
-            return err_msg
+            result = await ASYNC_AI(query, system_prompt, history, fine, api_key, retries=0, debug=debug,
+                                    task=task, coalesce=False, on_start=on_start)
+        except AICallBudgetError:
+            raise
+        except AIError as e:
+            scheduler.record_failure(api_key, rate_limited=isinstance(e, AIRateLimitError))
+            raise
+        scheduler.record_success(api_key)
+        if hedger is not None and call_start is not None:
+            hedger.record(task, time.monotonic() - call_start)
+        return result
     
-    tasks = [run_and_debug(i, q) for i, q in enumerate(queries)]
+    async def call_hedged(i, query, api_key):
+        """
+        호출이 같은 task의 백분위 지연 시간을 넘기면 예산 안에서 다른 키로 같은 요청을 한 번 더 보내고,
+        먼저 성공한 응답을 사용 (남은 호출은 취소, 둘 다 실패하면 마지막 오류 발생)
+        대기 시간은 호출이 동시 실행 슬롯을 얻은 뒤부터 재고, 슬롯이 모두 사용 중이면 헤지하지 않음
+        (로컬 대기열 때문에 늦어진 호출에 헤지를 보내면 같은 대기열에 일만 늘어남)
+        """
+        hedger.count_call()
+        started = asyncio.Event()
+        calls = [asyncio.ensure_future(call(query, api_key, started))]
+        try:
+            delay = hedger.delay(task)
+            if delay is not None:
+                start_wait = asyncio.ensure_future(started.wait())
+                await asyncio.wait([calls[0], start_wait], return_when=asyncio.FIRST_COMPLETED)
+                start_wait.cancel()
+                done, _ = await asyncio.wait(calls, timeout=delay)
+                limiter = get_limiter()
+                if (not done and limiter.in_flight < limiter.max_concurrency and hedger.can_hedge()
+                        and not call_budget_exhausted()):
+                    # 바로 보낼 수 있는 다른 키가 없으면 헤지하지 않음 (헤지 요청은 대기열에 넣지 않음)
+                    hedge_key, _ = scheduler.try_acquire(tokens[i], exclude=api_key)
+                    if hedge_key is not None:
+                        hedger.record_hedge()
+                        CALL_STATS['hedged_calls'] += 1
+                        if debug:
+                            debug_print(f"헤지 요청 (TASK-{i+1:02d}): {delay:.2f}초 초과, 키 {hedge_key[:4]}****")
+                        calls.append(asyncio.ensure_future(call(query, hedge_key)))
+            
+            pending = set(calls)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        if finished is not calls[0]:
+                            CALL_STATS['hedge_wins'] += 1
+                        return finished.result()
+                    error = finished.exception()
+            raise error
+        finally:
+            for pending_call in calls:
+                if not pending_call.done():
+                    pending_call.cancel()
+    
+    async def run_and_debug(i, query):
+        attempt = 0
+        while True:
+            if call_budget_exhausted():
+                # 거절될 호출을 위해 키의 RPM/TPM을 쓰지 않음
+                debug_print(f"병렬 AI 호출 생략 (TASK-{i+1:02d}): AI 호출 예산 소진")
+                return None
+            api_key = await scheduler.acquire(tokens[i])
+            try:
+                if hedger is not None:
+                    return await call_hedged(i, query, api_key)
+                return await call(query, api_key)
+            except AIError as e:
+                if attempt >= retries or not is_retryable(e):
+                    debug_print(f"[ERROR] 병렬 AI 호출 실패 (TASK-{i+1:02d}): {e}")
+                    return None
+                delay = backoff_delay(attempt, e)
+                attempt += 1
+                if debug:
+                    debug_print(f"병렬 AI 호출 재시도 (TASK-{i+1:02d}) {attempt}/{retries} ({delay:.2f}초 후)")
+                await asyncio.sleep(delay)
+    
+    # 같은 쿼리가 실행 중이면 키를 배정받기 전에 병합 (재시도까지 포함한 결과를 공유)
+    async def run_coalesced(i, query):
+        if not config.AI_SINGLE_FLIGHT:
+            return await run_and_debug(i, query)
+        key = single_flight_key(system_prompt, query, history, fine)
+        return await get_single_flight().do(key, lambda started: run_and_debug(i, query))
+    
+    tasks = [run_coalesced(i, q) for i, q in enumerate(queries)]
     results = await asyncio.gather(*tasks)
     
     if debug:
         end_time = time.time()
         total_duration = end_time - start_time
-        success_count = sum(1 for r in results if r and not r.startswith("[ERROR]"))
+        success_count = sum(1 for r in results if r is not None)
         debug_print(f"병렬 AI 호출 완료 ({total_duration:.2f}초)(성공 {success_count}/{len(queries)})")
         debug_print(end_debug_message)
     
@@ -164,7 +469,11 @@ def need_memory_judgement_AI(user_input: str) -> bool:
     
     debug_print("기억 필요성 판단 중...")
     
-    result = AI(prompt, system_prompt, debug=True)
+    try:
+        result = AI(prompt, system_prompt, debug=True, task='need_memory')
+    except AIError as e:
+        debug_print(f"기억 필요성 판단 실패, 검색하지 않음: {e}")
+        return False
     result = result.strip().lower()
     
     debug_print(f"기억 필요성 판단 결과: {result}")
@@ -173,16 +482,15 @@ def need_memory_judgement_AI(user_input: str) -> bool:
 
 def respond_AI(user_input: str, memory: list = None) -> str:
     """
-    사용자 질문에 대한 최종 응답 생성
+    사용자 질문에 대한 최종 응답 생성 (실패 시 AIError 발생)
     """
     system_prompt = """사용자의 발화에 응답해라. 과거 대화가 주어진다면 그 대화를 기반으로 응답해라. 간단하게 응답해라."""
     prompt = ""
     
     if memory:
-        all_memory = load_json('memory/all_memory.json', [])
-        for idx in memory:
-            if 0 <= idx < len(all_memory):
-                conversation = all_memory[idx]
+        conversations = get_conversations(memory)
+        for idx, conversation in zip(memory, conversations):
+            if conversation is not None:
                 prompt += f"\n==================================[ {idx} 번 ]==================================\n"
                 for msg in conversation:
                     role = msg.get('role', 'unknown')
@@ -197,7 +505,7 @@ def respond_AI(user_input: str, memory: list = None) -> str:
     
     debug_print("최종 응답 생성 중...")
     
-    result = AI(prompt, system_prompt, debug=True)
+    result = AI(prompt, system_prompt, debug=True, task='respond')
     
     debug_print(f"최종 응답 생성 완료 (응답 길이: {len(result)}자)")
     
@@ -205,18 +513,11 @@ def respond_AI(user_input: str, memory: list = None) -> str:
 
 def judgement_similar_AI(current_conversation: str, node_id: str) -> str:
     """
-    단일 노드와 현재 대화의 유사도 판단
+    단일 노드와 현재 대화의 유사도 판단 (AI 호출에 실패하면 None = 알 수 없음)
     """
     from memory import get_node_data
     
-    system_prompt = """노드의 주제와 요약을 보고 사용자 질문과의 관련성을 0.0~1.0 사이의 점수로 평가해라.
-- 0.9 이상: 매우 강한 관련성 (같은 구체적 주제)
-- 0.7~0.8: 강한 관련성 (같은 카테고리의 세부 주제)
-- 0.5~0.6: 보통 관련성 (같은 큰 분야이지만 다른 세부 주제)
-- 0.3~0.4: 약한 관련성 (넓은 의미로만 관련)
-- 0.2 이하: 관련성 없음
-
-점수만 숫자로 출력하세요 (예: 0.85)"""
+    system_prompt = SIMILARITY_SYSTEM
     
     node_data = get_node_data(node_id)
     if not node_data:
@@ -226,26 +527,148 @@ def judgement_similar_AI(current_conversation: str, node_id: str) -> str:
     summary = node_data.get('summary', '')
     node_summation = f"주제: {topic}\n요약: {summary}"
     
-    prompt = f"노드 정보 : {node_summation}\n현재 대화 : {current_conversation}\n\n위 노드와 현재 대화의 유사도를 0.0~1.0 점수로 평가하세요."
+    prompt = similarity_prompt(node_summation, current_conversation)
     
-    result = AI(prompt, system_prompt)
+    try:
+        result = AI(prompt, system_prompt, task='similarity')
+    except AIError as e:
+        debug_print(f"유사도 판단 실패 (노드 {node_id[:8]}...): {e}")
+        return None
     return result.strip()
 
-# 병렬 노드 유사도 판단 AI
-async def judgement_similar_multi_AI(node_ids: list, current_conversation: str) -> list:
+# 배치 유사도 응답의 "번호: 점수" 줄
+BATCH_SCORE_LINE = re.compile(r'^\s*\[?(\d+)\]?(?:\s*[:.)\-]\s*|\s+)([01](?:\.\d+)?)\s*$')
+
+def parse_batch_scores(result: str, count: int) -> dict:
+    """배치 유사도 응답에서 {0부터 시작하는 번호: 점수 문자열} 추출 (범위 밖 번호는 무시)"""
+    scores = {}
+    for line in result.split('\n'):
+        match = BATCH_SCORE_LINE.match(line.strip())
+        if match:
+            number = int(match.group(1))
+            if 1 <= number <= count:
+                scores.setdefault(number - 1, match.group(2))
+    return scores
+
+async def judgement_similar_batch_AI(node_datas: list, current_conversation: str, batch_size: int = 20) -> list:
     """
-    여러 노드와 현재 대화의 유사도를 병렬로 판단
+    형제 노드들을 한 번의 호출(노드가 많으면 batch_size개씩 나눈 호출)로 평가
+    응답에서 점수를 찾지 못했거나 호출에 실패한 노드는 None으로 반환
     """
-    from memory import get_node_data
-    
-    system_prompt = """노드의 주제와 요약을 보고 사용자 질문과의 관련성을 0.0~1.0 사이의 점수로 평가해라.
+    system_prompt = """번호가 붙은 여러 노드의 주제와 요약을 보고 각 노드와 현재 대화의 관련성을 0.0~1.0 사이의 점수로 평가해라.
 - 0.9 이상: 매우 강한 관련성 (같은 구체적 주제)
 - 0.7~0.8: 강한 관련성 (같은 카테고리의 세부 주제)
 - 0.5~0.6: 보통 관련성 (같은 큰 분야이지만 다른 세부 주제)
 - 0.3~0.4: 약한 관련성 (넓은 의미로만 관련)
 - 0.2 이하: 관련성 없음
 
-점수만 숫자로 출력하세요 (예: 0.85)"""
+모든 노드에 대해 한 줄에 하나씩 "번호: 점수" 형식으로만 출력하세요 (예: 1: 0.85)"""
+    
+    chunks = [node_datas[i:i + batch_size] for i in range(0, len(node_datas), batch_size)]
+    queries = []
+    for chunk in chunks:
+        prompt = f"현재 대화 : {current_conversation}\n\n노드 목록 :\n"
+        for number, node_data in enumerate(chunk, 1):
+            prompt += f"[{number}] 주제: {node_data.get('topic', '')}\n요약: {node_data.get('summary', '')}\n\n"
+        prompt += f"위 {len(chunk)}개 노드 각각과 현재 대화의 유사도를 0.0~1.0 점수로 평가하세요."
+        queries.append(prompt)
+    
+    results = await ASYNC_MULTI_AI(
+        queries, system_prompt, debug=True,
+        start_debug_message="=============[ judgement_similar_batch_AI ]============= [ START ]",
+        end_debug_message="=============[ judgement_similar_batch_AI ]============= [  END  ]",
+        task='similarity_batch'
+    )
+    
+    scores = []
+    for chunk, result in zip(chunks, results):
+        parsed = parse_batch_scores(result, len(chunk)) if result is not None else {}
+        scores.extend(parsed.get(i) for i in range(len(chunk)))
+    return scores
+
+# 병렬 노드 유사도 판단 AI (캐시 사용)
+async def judgement_similar_multi_AI(node_ids: list, current_conversation: str,
+                                     batch: bool = False, batch_size: int = 20) -> list:
+    """
+    여러 노드와 현재 대화의 유사도를 판단
+    같은 (노드 내용, 질의)의 점수가 캐시에 있으면 AI 호출 없이 재사용하고 나머지만 평가함
+    Args:
+        batch: True이면 형제 노드 전체를 한 번의 호출로 평가
+        batch_size: 배치 호출 하나에 넣는 최대 노드 수
+    """
+    from memory import get_node_data
+    
+    cache = get_similarity_cache()
+    if cache is None:
+        return await judgement_similar_uncached_AI(node_ids, current_conversation, batch, batch_size)
+    
+    results = [None] * len(node_ids)
+    node_datas = [get_node_data(node_id) for node_id in node_ids]
+    misses = []
+    for i, (node_id, node_data) in enumerate(zip(node_ids, node_datas)):
+        score = cache.get(node_id, node_data, current_conversation) if node_data else None
+        if score is None:
+            misses.append(i)
+        else:
+            results[i] = score
+    
+    hits = len(node_ids) - len(misses)
+    if hits:
+        CALL_STATS['cache_hits'] += hits
+        debug_print(f"유사도 캐시 적중 {hits}/{len(node_ids)}개 노드")
+    
+    if misses:
+        scored = await judgement_similar_uncached_AI(
+            [node_ids[i] for i in misses], current_conversation, batch, batch_size
+        )
+        for i, score in zip(misses, scored):
+            results[i] = score
+            # 정상적인 점수만 캐시 (오류 응답은 다음에 다시 평가)
+            try:
+                valid = node_datas[i] is not None and 0.0 <= float(score) <= 1.0
+            except (TypeError, ValueError):
+                valid = False
+            if valid:
+                cache.put(node_ids[i], node_datas[i], current_conversation, score.strip())
+    
+    return results
+
+# 병렬 노드 유사도 판단 AI (캐시 미사용)
+async def judgement_similar_uncached_AI(node_ids: list, current_conversation: str,
+                                        batch: bool = False, batch_size: int = 20) -> list:
+    """
+    여러 노드와 현재 대화의 유사도를 병렬로 판단 (AI 호출에 실패한 노드는 None = 알 수 없음)
+    Args:
+        batch: True이면 형제 노드 전체를 한 번의 호출로 평가하고, 점수를 읽지 못한 노드만 개별 호출로 재평가
+        batch_size: 배치 호출 하나에 넣는 최대 노드 수
+    """
+    from memory import get_node_data
+    
+    if batch:
+        node_datas = [get_node_data(node_id) for node_id in node_ids]
+        present = [i for i, node_data in enumerate(node_datas) if node_data]
+        results = ["0.0"] * len(node_ids)  # 노드가 없으면 0.0
+        
+        batch_scores = await judgement_similar_batch_AI(
+            [node_datas[i] for i in present], current_conversation, batch_size
+        )
+        missing = []
+        for i, score in zip(present, batch_scores):
+            if score is None:
+                missing.append(i)
+            else:
+                results[i] = score
+        
+        if missing:
+            debug_print(f"배치 유사도 응답 파싱 실패 {len(missing)}개 노드, 개별 호출로 재평가")
+            fallback = await judgement_similar_uncached_AI([node_ids[i] for i in missing], current_conversation)
+            for i, result in zip(missing, fallback):
+                results[i] = result
+        
+        debug_print(f"배치 유사도 비교 완료 ({len(node_ids)}개 노드, 배치 호출 {-(-len(present) // batch_size)}회, 개별 재평가 {len(missing)}회)")
+        return results
+    
+    system_prompt = SIMILARITY_SYSTEM
     
     queries = []
     for node_id in node_ids:
@@ -254,7 +677,7 @@ async def judgement_similar_multi_AI(node_ids: list, current_conversation: str)
             topic = node_data.get('topic', '')
             summary = node_data.get('summary', '')
             node_summation = f"주제: {topic}\n요약: {summary}"
-            prompt = f"노드 정보 : {node_summation}\n현재 대화 : {current_conversation}\n\n위 노드와 현재 대화의 유사도를 0.0~1.0 점수로 평가하세요."
+            prompt = similarity_prompt(node_summation, current_conversation)
             queries.append(prompt)
         else:
             queries.append("0.0")  # 노드가 없으면 0.0
@@ -265,7 +688,8 @@ async def judgement_similar_multi_AI(node_ids: list, current_conversation: str)
     results = await ASYNC_MULTI_AI(
         queries, system_prompt, debug=True, 
         start_debug_message=start_debug_message, 
-        end_debug_message=end_debug_message
+        end_debug_message=end_debug_message,
+        task='similarity'
     )
     
     # 유사도 점수 통계 출력
@@ -274,13 +698,14 @@ async def judgement_similar_multi_AI(node_ids: list, current_conversation: str)
         try:
             score = float(result)
             scores.append(score)
-        except:
+        except (TypeError, ValueError):
             scores.append(0.0)
     
     if scores:
         avg_score = sum(scores) / len(scores)
         max_score = max(scores)
-        debug_print(f"유사도 비교 완료 - 평균: {avg_score:.2f}, 최고: {max_score:.2f} ({len(node_ids)}개 노드)")
+        unknown_count = sum(1 for result in results if result is None)
+        debug_print(f"유사도 비교 완료 - 평균: {avg_score:.2f}, 최고: {max_score:.2f} ({len(node_ids)}개 노드, 실패 {unknown_count}개)")
     
     return results
 
@@ -305,7 +730,11 @@ async def clustering_AI(candidate_node_ids: list, current_conversation: str, fan
             summary = node_data.get('summary', '')
             prompt += f"노드 ID: {node_id}\n주제: {topic}\n요약: {summary}\n\n"
     
-    result = AI(prompt, system_prompt)
+    try:
+        result = AI(prompt, system_prompt, task='clustering')
+    except AIError as e:
+        debug_print(f"클러스터링 대상 선택 실패: {e}")
+        return [], None
     
     lines = result.split('\n')
     selected_ids = []
@@ -324,7 +753,7 @@ async def clustering_AI(candidate_node_ids: list, current_conversation: str, fan
 
 def summary_AI(conversation_data: list, max_length: int = 200) -> str:
     """
-    대화 데이터를 지정된 길이로 요약
+    대화 데이터를 지정된 길이로 요약 (실패 시 AIError 발생)
     """
     system_prompt = f"""다음 대화를 {max_length}자 이내로 간결하게 요약해라. 핵심 내용만 포함해라."""
     
@@ -335,13 +764,13 @@ def summary_AI(conversation_data: list, max_length: int = 200) -> str:
         prompt += f"{role}: {content}\n"
     
     debug_print(f"요약 생성 중 (대화 수: {len(conversation_data)}개, 목표 길이: {max_length}자)")
-    result = AI(prompt, system_prompt)
+    result = AI(prompt, system_prompt, cache=True, task='summary')
     debug_print(f"요약 생성 완료 (실제 길이: {len(result)}자)")
     return result.strip()
 
 def topic_generation_AI(summary_data: str) -> str:
     """
-    요약 데이터를 바탕으로 적절한 주제명 생성
+    요약 데이터를 바탕으로 적절한 주제명 생성 (실패 시 AIError 발생)
     """
     system_prompt = """주어진 요약 내용을 보고 핵심 주제를 파악하여 간결한 주제명을 생성해라.
 주제명은 다음 규칙을 따라라:
@@ -363,14 +792,14 @@ def topic_generation_AI(summary_data: str) -> str:
     prompt = f"요약 내용: {summary_data}"
     
     debug_print("주제 생성 중...")
-    result = AI(prompt, system_prompt)
+    result = AI(prompt, system_prompt, cache=True, task='topic')
     result = result.strip().replace('**', '').replace('*', '').replace('#', '')
     debug_print(f"주제 생성 완료: '{result}'")
     return result.strip()
 
 def parent_update_AI(old_summary: str, new_content: str, max_length: int = 300) -> tuple:
     """
-    부모 노드의 요약을 압축하여 업데이트
+    부모 노드의 요약을 압축하여 업데이트 (실패 시 기존 요약과 None 주제를 반환)
     """
     system_prompt = f"""기존 요약과 새로운 내용을 통합하여 {max_length}자 이내의 새로운 요약과 업데이트된 주제명을 생성해라.
 
@@ -380,7 +809,11 @@ def parent_update_AI(old_summary: str, new_content: str, max_length: int = 300)
     
     prompt = f"기존 요약: {old_summary}\n새로운 내용: {new_content}"
     
-    result = AI(prompt, system_prompt)
+    try:
+        result = AI(prompt, system_prompt, cache=True, task='parent_update')
+    except AIError as e:
+        debug_print(f"부모 노드 요약 압축 실패: {e}")
+        return old_summary, None
     
     # 결과 파싱
     lines = result.split('\n')
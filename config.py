@@ -59,6 +59,73 @@ NO_RECORD = False
 DEBUG = False
 DEBUG_TXT = False
 
+# 노드 저장소 설정
+FLUSH_POLICY = "turn"  # turn, interval, exit
+FLUSH_INTERVAL_MS = 1000
+JSON_EXPORT_ON_EXIT = True
+WAL_ENABLED = True
+WAL_CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+# 대화 기록 로그 설정
+LOG_SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+
+# 저장소 백엔드 설정
+STORAGE_BACKEND = "json"  # json, sqlite
+
+# 유사도 판단 배치 설정
+SIMILARITY_BATCH_SEARCH = False  # 검색(search_tree) 시 형제 노드를 한 번의 호출로 평가
+SIMILARITY_BATCH_STORAGE = False  # 저장 위치 탐색(find_best_matching_child) 시 형제 노드를 한 번의 호출로 평가
+SIMILARITY_BATCH_SIZE = 20  # 배치 호출 하나에 넣는 최대 노드 수
+
+# 유사도 판단 캐시 설정
+SIMILARITY_CACHE_ENABLED = True  # (노드 내용, 질의)별 유사도 점수 재사용
+SIMILARITY_CACHE_SIZE = 10000  # 캐시 최대 항목 수 (초과 시 LRU 제거)
+SIMILARITY_CACHE_PERSIST = False  # 종료 시 캐시를 memory/similarity_cache.json에 저장하고 시작 시 로드
+
+# AI 결과 캐시 설정
+AI_RESULT_CACHE_ENABLED = True  # 요약/주제/부모 갱신 AI 결과를 디스크 캐시에서 재사용
+AI_RESULT_CACHE_SIZE = 50000  # AI 결과 캐시 최대 항목 수 (초과 시 오래 사용하지 않은 항목부터 제거)
+
+# API 키 속도 제한 설정
+API_RPM_LIMIT = 10  # LOAD_API 키 하나당 분당 요청 수
+API_TPM_LIMIT = 250000  # LOAD_API 키 하나당 분당 토큰 수
+
+# AI 호출 서킷 브레이커 설정
+CIRCUIT_FAILURE_THRESHOLD = 3  # 연속 실패 시 LOAD_API 키를 일시 제외하는 횟수
+CIRCUIT_RESET_SECONDS = 30  # 제외된 키를 다시 시험하기까지의 시간 (초)
+
+# AI 호출 동시 실행 설정
+AI_MAX_CONCURRENCY = 16  # 동시에 실행하는 AI 호출 수 (전체)
+AI_MAX_CONCURRENCY_PER_KEY = 4  # API 키 하나당 동시에 실행하는 AI 호출 수
+AI_NATIVE_ASYNC = True  # SDK의 비동기 API 사용 (false이거나 지원하지 않으면 전용 스레드 풀 사용)
+
+# 동일 요청 병합
+AI_SINGLE_FLIGHT = True  # 실행 중인 같은 (모델, 시스템 지침, 프롬프트) 요청이 있으면 새로 호출하지 않고 그 결과를 함께 사용
+
+# 헤지 요청 (ASYNC_MULTI_AI 병렬 호출의 꼬리 지연 제어)
+HEDGE_ENABLED = False  # 지연되는 호출을 다른 LOAD_API 키로 한 번 더 보내고 먼저 끝난 응답 사용
+HEDGE_PERCENTILE = 95  # 호출이 최근 지연 시간의 이 백분위수를 넘으면 헤지 요청 전송
+HEDGE_BUDGET_PERCENT = 5  # 헤지 요청 수 상한 (전체 호출 대비 %)
+
+# 벡터 사전 필터 (LLM 유사도 판단 전에 형제 노드를 로컬 n-gram 벡터로 줄임, NumPy 필요)
+VECTOR_PREFILTER_ENABLED = False  # 형제 노드 중 질의와 가까운 상위 노드만 LLM으로 평가
+VECTOR_PREFILTER_TOP_K = 5  # 형제 노드 그룹마다 LLM으로 평가하는 노드 수
+
+# 검색 알고리즘 (best_first: 점수가 높은 노드부터 펼치며 호출 수/시간 예산 안에서 상위 기억만 반환)
+SEARCH_ALGORITHM = "bfs"  # bfs, best_first, pipelined
+SEARCH_MAX_LLM_CALLS = 30  # best_first 검색 한 번에 사용하는 최대 AI 호출 수
+SEARCH_TIME_BUDGET_MS = 15000  # best_first 검색 한 번의 최대 소요 시간 (밀리초)
+SEARCH_TOP_K = 5  # best_first 검색이 반환하는 기억 노드 수 (이만큼 확실한 기억을 찾으면 조기 종료)
+
+# 턴 단위 점수 재사용
+REUSE_SEARCH_SCORES = True  # 같은 턴의 검색에서 평가한 노드는 저장 위치 탐색에서 다시 평가하지 않고 그 점수를 사용
+
+# 검색 결과 캐시
+QUERY_CACHE_ENABLED = False  # 같거나 비슷한 질의의 search_tree 결과를 재사용
+QUERY_CACHE_SIZE = 256  # 검색 결과 캐시 최대 항목 수 (초과 시 LRU 제거)
+QUERY_CACHE_TTL = 600  # 검색 결과 유효 시간 (초)
+QUERY_CACHE_SIMILARITY = 0.85  # 이전 질의와의 글자 n-gram 코사인 유사도가 이 값 이상이면 같은 질의로 취급
+
 # 테스트 데이터
 TEST_Q = [
     # 개인정보 관련
@@ -369,7 +436,16 @@ CALL_STATS = {
     'parallel_calls': 0,
     'error_count': 0,
     'memory_searches': 0,
-    'cache_hits': 0
+    'cache_hits': 0,
+    'result_cache_hits': 0,
+    'queued_calls': 0,
+    'queue_wait_time': 0.0,
+    'coalesced_calls': 0,
+    'hedged_calls': 0,
+    'hedge_wins': 0,
+    'prefilter_saved_calls': 0,
+    'turn_score_reuses': 0,
+    'query_cache_hits': 0
 }
 
 # 시스템 상수
@@ -451,6 +527,23 @@ def load_config():
     """config.json에서 설정 로드"""
     global SYSTEM_MODE, SEARCH_MODE, UPDATE_TOPIC, GEMINI_MODEL, FANOUT_LIMIT, MAX_SUMMARY_LENGTH
     global DEBUG, DEBUG_TXT, NO_RECORD
+    global FLUSH_POLICY, FLUSH_INTERVAL_MS
+    global LOG_SEGMENT_MAX_BYTES
+    global STORAGE_BACKEND
+    global JSON_EXPORT_ON_EXIT
+    global WAL_ENABLED, WAL_CHECKPOINT_BYTES
+    global SIMILARITY_BATCH_SEARCH, SIMILARITY_BATCH_STORAGE, SIMILARITY_BATCH_SIZE
+    global SIMILARITY_CACHE_ENABLED, SIMILARITY_CACHE_SIZE, SIMILARITY_CACHE_PERSIST
+    global AI_RESULT_CACHE_ENABLED, AI_RESULT_CACHE_SIZE
+    global API_RPM_LIMIT, API_TPM_LIMIT
+    global CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+    global AI_MAX_CONCURRENCY, AI_MAX_CONCURRENCY_PER_KEY, AI_NATIVE_ASYNC
+    global AI_SINGLE_FLIGHT
+    global HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_BUDGET_PERCENT
+    global VECTOR_PREFILTER_ENABLED, VECTOR_PREFILTER_TOP_K
+    global SEARCH_ALGORITHM, SEARCH_MAX_LLM_CALLS, SEARCH_TIME_BUDGET_MS, SEARCH_TOP_K
+    global REUSE_SEARCH_SCORES
+    global QUERY_CACHE_ENABLED, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_SIMILARITY
     
     try:
         if os.path.exists('config.json'):
@@ -466,6 +559,43 @@ def load_config():
             DEBUG = config.get('DEBUG', DEBUG)
             DEBUG_TXT = config.get('DEBUG_TXT', DEBUG_TXT)
             NO_RECORD = config.get('NO_RECORD', NO_RECORD)
+            FLUSH_POLICY = config.get('FLUSH_POLICY', FLUSH_POLICY)
+            FLUSH_INTERVAL_MS = config.get('FLUSH_INTERVAL_MS', FLUSH_INTERVAL_MS)
+            LOG_SEGMENT_MAX_BYTES = config.get('LOG_SEGMENT_MAX_BYTES', LOG_SEGMENT_MAX_BYTES)
+            STORAGE_BACKEND = config.get('STORAGE_BACKEND', STORAGE_BACKEND)
+            JSON_EXPORT_ON_EXIT = config.get('JSON_EXPORT_ON_EXIT', JSON_EXPORT_ON_EXIT)
+            WAL_ENABLED = config.get('WAL_ENABLED', WAL_ENABLED)
+            WAL_CHECKPOINT_BYTES = config.get('WAL_CHECKPOINT_BYTES', WAL_CHECKPOINT_BYTES)
+            SIMILARITY_BATCH_SEARCH = config.get('SIMILARITY_BATCH_SEARCH', SIMILARITY_BATCH_SEARCH)
+            SIMILARITY_BATCH_STORAGE = config.get('SIMILARITY_BATCH_STORAGE', SIMILARITY_BATCH_STORAGE)
+            SIMILARITY_BATCH_SIZE = config.get('SIMILARITY_BATCH_SIZE', SIMILARITY_BATCH_SIZE)
+            SIMILARITY_CACHE_ENABLED = config.get('SIMILARITY_CACHE_ENABLED', SIMILARITY_CACHE_ENABLED)
+            SIMILARITY_CACHE_SIZE = config.get('SIMILARITY_CACHE_SIZE', SIMILARITY_CACHE_SIZE)
+            SIMILARITY_CACHE_PERSIST = config.get('SIMILARITY_CACHE_PERSIST', SIMILARITY_CACHE_PERSIST)
+            AI_RESULT_CACHE_ENABLED = config.get('AI_RESULT_CACHE_ENABLED', AI_RESULT_CACHE_ENABLED)
+            AI_RESULT_CACHE_SIZE = config.get('AI_RESULT_CACHE_SIZE', AI_RESULT_CACHE_SIZE)
+            API_RPM_LIMIT = config.get('API_RPM_LIMIT', API_RPM_LIMIT)
+            API_TPM_LIMIT = config.get('API_TPM_LIMIT', API_TPM_LIMIT)
+            CIRCUIT_FAILURE_THRESHOLD = config.get('CIRCUIT_FAILURE_THRESHOLD', CIRCUIT_FAILURE_THRESHOLD)
+            CIRCUIT_RESET_SECONDS = config.get('CIRCUIT_RESET_SECONDS', CIRCUIT_RESET_SECONDS)
+            AI_MAX_CONCURRENCY = config.get('AI_MAX_CONCURRENCY', AI_MAX_CONCURRENCY)
+            AI_MAX_CONCURRENCY_PER_KEY = config.get('AI_MAX_CONCURRENCY_PER_KEY', AI_MAX_CONCURRENCY_PER_KEY)
+            AI_NATIVE_ASYNC = config.get('AI_NATIVE_ASYNC', AI_NATIVE_ASYNC)
+            AI_SINGLE_FLIGHT = config.get('AI_SINGLE_FLIGHT', AI_SINGLE_FLIGHT)
+            HEDGE_ENABLED = config.get('HEDGE_ENABLED', HEDGE_ENABLED)
+            HEDGE_PERCENTILE = config.get('HEDGE_PERCENTILE', HEDGE_PERCENTILE)
+            HEDGE_BUDGET_PERCENT = config.get('HEDGE_BUDGET_PERCENT', HEDGE_BUDGET_PERCENT)
+            VECTOR_PREFILTER_ENABLED = config.get('VECTOR_PREFILTER_ENABLED', VECTOR_PREFILTER_ENABLED)
+            VECTOR_PREFILTER_TOP_K = config.get('VECTOR_PREFILTER_TOP_K', VECTOR_PREFILTER_TOP_K)
+            SEARCH_ALGORITHM = config.get('SEARCH_ALGORITHM', SEARCH_ALGORITHM)
+            SEARCH_MAX_LLM_CALLS = config.get('SEARCH_MAX_LLM_CALLS', SEARCH_MAX_LLM_CALLS)
+            SEARCH_TIME_BUDGET_MS = config.get('SEARCH_TIME_BUDGET_MS', SEARCH_TIME_BUDGET_MS)
+            SEARCH_TOP_K = config.get('SEARCH_TOP_K', SEARCH_TOP_K)
+            REUSE_SEARCH_SCORES = config.get('REUSE_SEARCH_SCORES', REUSE_SEARCH_SCORES)
+            QUERY_CACHE_ENABLED = config.get('QUERY_CACHE_ENABLED', QUERY_CACHE_ENABLED)
+            QUERY_CACHE_SIZE = config.get('QUERY_CACHE_SIZE', QUERY_CACHE_SIZE)
+            QUERY_CACHE_TTL = config.get('QUERY_CACHE_TTL', QUERY_CACHE_TTL)
+            QUERY_CACHE_SIMILARITY = config.get('QUERY_CACHE_SIMILARITY', QUERY_CACHE_SIMILARITY)
             
             if DEBUG:
                 print(f"config.json 로드 완료:")
@@ -494,7 +624,44 @@ def save_config():
         'MAX_SUMMARY_LENGTH': MAX_SUMMARY_LENGTH,
         'DEBUG': DEBUG,
         'DEBUG_TXT': DEBUG_TXT,
-        'NO_RECORD': NO_RECORD
+        'NO_RECORD': NO_RECORD,
+        'FLUSH_POLICY': FLUSH_POLICY,
+        'FLUSH_INTERVAL_MS': FLUSH_INTERVAL_MS,
+        'LOG_SEGMENT_MAX_BYTES': LOG_SEGMENT_MAX_BYTES,
+        'STORAGE_BACKEND': STORAGE_BACKEND,
+        'JSON_EXPORT_ON_EXIT': JSON_EXPORT_ON_EXIT,
+        'WAL_ENABLED': WAL_ENABLED,
+        'WAL_CHECKPOINT_BYTES': WAL_CHECKPOINT_BYTES,
+        'SIMILARITY_BATCH_SEARCH': SIMILARITY_BATCH_SEARCH,
+        'SIMILARITY_BATCH_STORAGE': SIMILARITY_BATCH_STORAGE,
+        'SIMILARITY_BATCH_SIZE': SIMILARITY_BATCH_SIZE,
+        'SIMILARITY_CACHE_ENABLED': SIMILARITY_CACHE_ENABLED,
+        'SIMILARITY_CACHE_SIZE': SIMILARITY_CACHE_SIZE,
+        'SIMILARITY_CACHE_PERSIST': SIMILARITY_CACHE_PERSIST,
+        'AI_RESULT_CACHE_ENABLED': AI_RESULT_CACHE_ENABLED,
+        'AI_RESULT_CACHE_SIZE': AI_RESULT_CACHE_SIZE,
+        'API_RPM_LIMIT': API_RPM_LIMIT,
+        'API_TPM_LIMIT': API_TPM_LIMIT,
+        'CIRCUIT_FAILURE_THRESHOLD': CIRCUIT_FAILURE_THRESHOLD,
+        'CIRCUIT_RESET_SECONDS': CIRCUIT_RESET_SECONDS,
+        'AI_MAX_CONCURRENCY': AI_MAX_CONCURRENCY,
+        'AI_MAX_CONCURRENCY_PER_KEY': AI_MAX_CONCURRENCY_PER_KEY,
+        'AI_NATIVE_ASYNC': AI_NATIVE_ASYNC,
+        'AI_SINGLE_FLIGHT': AI_SINGLE_FLIGHT,
+        'HEDGE_ENABLED': HEDGE_ENABLED,
+        'HEDGE_PERCENTILE': HEDGE_PERCENTILE,
+        'HEDGE_BUDGET_PERCENT': HEDGE_BUDGET_PERCENT,
+        'VECTOR_PREFILTER_ENABLED': VECTOR_PREFILTER_ENABLED,
+        'VECTOR_PREFILTER_TOP_K': VECTOR_PREFILTER_TOP_K,
+        'SEARCH_ALGORITHM': SEARCH_ALGORITHM,
+        'SEARCH_MAX_LLM_CALLS': SEARCH_MAX_LLM_CALLS,
+        'SEARCH_TIME_BUDGET_MS': SEARCH_TIME_BUDGET_MS,
+        'SEARCH_TOP_K': SEARCH_TOP_K,
+        'REUSE_SEARCH_SCORES': REUSE_SEARCH_SCORES,
+        'QUERY_CACHE_ENABLED': QUERY_CACHE_ENABLED,
+        'QUERY_CACHE_SIZE': QUERY_CACHE_SIZE,
+        'QUERY_CACHE_TTL': QUERY_CACHE_TTL,
+        'QUERY_CACHE_SIMILARITY': QUERY_CACHE_SIMILARITY
     }
     
     try:
@@ -517,7 +684,44 @@ def create_default_config():
         'MAX_SUMMARY_LENGTH': 1000,
         'DEBUG': False,
         'DEBUG_TXT': False,
-        'NO_RECORD': False
+        'NO_RECORD': False,
+        'FLUSH_POLICY': 'turn',
+        'FLUSH_INTERVAL_MS': 1000,
+        'LOG_SEGMENT_MAX_BYTES': 8388608,
+        'STORAGE_BACKEND': 'json',
+        'JSON_EXPORT_ON_EXIT': True,
+        'WAL_ENABLED': True,
+        'WAL_CHECKPOINT_BYTES': 4194304,
+        'SIMILARITY_BATCH_SEARCH': False,
+        'SIMILARITY_BATCH_STORAGE': False,
+        'SIMILARITY_BATCH_SIZE': 20,
+        'SIMILARITY_CACHE_ENABLED': True,
+        'SIMILARITY_CACHE_SIZE': 10000,
+        'SIMILARITY_CACHE_PERSIST': False,
+        'AI_RESULT_CACHE_ENABLED': True,
+        'AI_RESULT_CACHE_SIZE': 50000,
+        'API_RPM_LIMIT': 10,
+        'API_TPM_LIMIT': 250000,
+        'CIRCUIT_FAILURE_THRESHOLD': 3,
+        'CIRCUIT_RESET_SECONDS': 30,
+        'AI_MAX_CONCURRENCY': 16,
+        'AI_MAX_CONCURRENCY_PER_KEY': 4,
+        'AI_NATIVE_ASYNC': True,
+        'AI_SINGLE_FLIGHT': True,
+        'HEDGE_ENABLED': False,
+        'HEDGE_PERCENTILE': 95,
+        'HEDGE_BUDGET_PERCENT': 5,
+        'VECTOR_PREFILTER_ENABLED': False,
+        'VECTOR_PREFILTER_TOP_K': 5,
+        'SEARCH_ALGORITHM': 'bfs',
+        'SEARCH_MAX_LLM_CALLS': 30,
+        'SEARCH_TIME_BUDGET_MS': 15000,
+        'SEARCH_TOP_K': 5,
+        'REUSE_SEARCH_SCORES': True,
+        'QUERY_CACHE_ENABLED': False,
+        'QUERY_CACHE_SIZE': 256,
+        'QUERY_CACHE_TTL': 600,
+        'QUERY_CACHE_SIMILARITY': 0.85
     }
     
     try:
@@ -531,6 +735,23 @@ def update_config(**kwargs):
     """config.json의 특정 설정값들 업데이트"""
     global SYSTEM_MODE, SEARCH_MODE, UPDATE_TOPIC, GEMINI_MODEL, FANOUT_LIMIT, MAX_SUMMARY_LENGTH
     global DEBUG, DEBUG_TXT, NO_RECORD
+    global FLUSH_POLICY, FLUSH_INTERVAL_MS
+    global LOG_SEGMENT_MAX_BYTES
+    global STORAGE_BACKEND
+    global JSON_EXPORT_ON_EXIT
+    global WAL_ENABLED, WAL_CHECKPOINT_BYTES
+    global SIMILARITY_BATCH_SEARCH, SIMILARITY_BATCH_STORAGE, SIMILARITY_BATCH_SIZE
+    global SIMILARITY_CACHE_ENABLED, SIMILARITY_CACHE_SIZE, SIMILARITY_CACHE_PERSIST
+    global AI_RESULT_CACHE_ENABLED, AI_RESULT_CACHE_SIZE
+    global API_RPM_LIMIT, API_TPM_LIMIT
+    global CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+    global AI_MAX_CONCURRENCY, AI_MAX_CONCURRENCY_PER_KEY, AI_NATIVE_ASYNC
+    global AI_SINGLE_FLIGHT
+    global HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_BUDGET_PERCENT
+    global VECTOR_PREFILTER_ENABLED, VECTOR_PREFILTER_TOP_K
+    global SEARCH_ALGORITHM, SEARCH_MAX_LLM_CALLS, SEARCH_TIME_BUDGET_MS, SEARCH_TOP_K
+    global REUSE_SEARCH_SCORES
+    global QUERY_CACHE_ENABLED, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_SIMILARITY
     
     if 'SYSTEM_MODE' in kwargs:
         SYSTEM_MODE = kwargs['SYSTEM_MODE']
@@ -559,6 +780,80 @@ def update_config(**kwargs):
                 debug_log_close()
     if 'NO_RECORD' in kwargs:
         NO_RECORD = kwargs['NO_RECORD']
+    if 'FLUSH_POLICY' in kwargs:
+        FLUSH_POLICY = kwargs['FLUSH_POLICY']
+    if 'FLUSH_INTERVAL_MS' in kwargs:
+        FLUSH_INTERVAL_MS = kwargs['FLUSH_INTERVAL_MS']
+    if 'LOG_SEGMENT_MAX_BYTES' in kwargs:
+        LOG_SEGMENT_MAX_BYTES = kwargs['LOG_SEGMENT_MAX_BYTES']
+    if 'STORAGE_BACKEND' in kwargs:
+        STORAGE_BACKEND = kwargs['STORAGE_BACKEND']
+    if 'JSON_EXPORT_ON_EXIT' in kwargs:
+        JSON_EXPORT_ON_EXIT = kwargs['JSON_EXPORT_ON_EXIT']
+    if 'WAL_ENABLED' in kwargs:
+        WAL_ENABLED = kwargs['WAL_ENABLED']
+    if 'WAL_CHECKPOINT_BYTES' in kwargs:
+        WAL_CHECKPOINT_BYTES = kwargs['WAL_CHECKPOINT_BYTES']
+    if 'SIMILARITY_BATCH_SEARCH' in kwargs:
+        SIMILARITY_BATCH_SEARCH = kwargs['SIMILARITY_BATCH_SEARCH']
+    if 'SIMILARITY_BATCH_STORAGE' in kwargs:
+        SIMILARITY_BATCH_STORAGE = kwargs['SIMILARITY_BATCH_STORAGE']
+    if 'SIMILARITY_BATCH_SIZE' in kwargs:
+        SIMILARITY_BATCH_SIZE = kwargs['SIMILARITY_BATCH_SIZE']
+    if 'SIMILARITY_CACHE_ENABLED' in kwargs:
+        SIMILARITY_CACHE_ENABLED = kwargs['SIMILARITY_CACHE_ENABLED']
+    if 'SIMILARITY_CACHE_SIZE' in kwargs:
+        SIMILARITY_CACHE_SIZE = kwargs['SIMILARITY_CACHE_SIZE']
+    if 'SIMILARITY_CACHE_PERSIST' in kwargs:
+        SIMILARITY_CACHE_PERSIST = kwargs['SIMILARITY_CACHE_PERSIST']
+    if 'AI_RESULT_CACHE_ENABLED' in kwargs:
+        AI_RESULT_CACHE_ENABLED = kwargs['AI_RESULT_CACHE_ENABLED']
+    if 'AI_RESULT_CACHE_SIZE' in kwargs:
+        AI_RESULT_CACHE_SIZE = kwargs['AI_RESULT_CACHE_SIZE']
+    if 'API_RPM_LIMIT' in kwargs:
+        API_RPM_LIMIT = kwargs['API_RPM_LIMIT']
+    if 'API_TPM_LIMIT' in kwargs:
+        API_TPM_LIMIT = kwargs['API_TPM_LIMIT']
+    if 'CIRCUIT_FAILURE_THRESHOLD' in kwargs:
+        CIRCUIT_FAILURE_THRESHOLD = kwargs['CIRCUIT_FAILURE_THRESHOLD']
+    if 'CIRCUIT_RESET_SECONDS' in kwargs:
+        CIRCUIT_RESET_SECONDS = kwargs['CIRCUIT_RESET_SECONDS']
+    if 'AI_MAX_CONCURRENCY' in kwargs:
+        AI_MAX_CONCURRENCY = kwargs['AI_MAX_CONCURRENCY']
+    if 'AI_MAX_CONCURRENCY_PER_KEY' in kwargs:
+        AI_MAX_CONCURRENCY_PER_KEY = kwargs['AI_MAX_CONCURRENCY_PER_KEY']
+    if 'AI_NATIVE_ASYNC' in kwargs:
+        AI_NATIVE_ASYNC = kwargs['AI_NATIVE_ASYNC']
+    if 'AI_SINGLE_FLIGHT' in kwargs:
+        AI_SINGLE_FLIGHT = kwargs['AI_SINGLE_FLIGHT']
+    if 'HEDGE_ENABLED' in kwargs:
+        HEDGE_ENABLED = kwargs['HEDGE_ENABLED']
+    if 'HEDGE_PERCENTILE' in kwargs:
+        HEDGE_PERCENTILE = kwargs['HEDGE_PERCENTILE']
+    if 'HEDGE_BUDGET_PERCENT' in kwargs:
+        HEDGE_BUDGET_PERCENT = kwargs['HEDGE_BUDGET_PERCENT']
+    if 'VECTOR_PREFILTER_ENABLED' in kwargs:
+        VECTOR_PREFILTER_ENABLED = kwargs['VECTOR_PREFILTER_ENABLED']
+    if 'VECTOR_PREFILTER_TOP_K' in kwargs:
+        VECTOR_PREFILTER_TOP_K = kwargs['VECTOR_PREFILTER_TOP_K']
+    if 'SEARCH_ALGORITHM' in kwargs:
+        SEARCH_ALGORITHM = kwargs['SEARCH_ALGORITHM']
+    if 'SEARCH_MAX_LLM_CALLS' in kwargs:
+        SEARCH_MAX_LLM_CALLS = kwargs['SEARCH_MAX_LLM_CALLS']
+    if 'SEARCH_TIME_BUDGET_MS' in kwargs:
+        SEARCH_TIME_BUDGET_MS = kwargs['SEARCH_TIME_BUDGET_MS']
+    if 'SEARCH_TOP_K' in kwargs:
+        SEARCH_TOP_K = kwargs['SEARCH_TOP_K']
+    if 'REUSE_SEARCH_SCORES' in kwargs:
+        REUSE_SEARCH_SCORES = kwargs['REUSE_SEARCH_SCORES']
+    if 'QUERY_CACHE_ENABLED' in kwargs:
+        QUERY_CACHE_ENABLED = kwargs['QUERY_CACHE_ENABLED']
+    if 'QUERY_CACHE_SIZE' in kwargs:
+        QUERY_CACHE_SIZE = kwargs['QUERY_CACHE_SIZE']
+    if 'QUERY_CACHE_TTL' in kwargs:
+        QUERY_CACHE_TTL = kwargs['QUERY_CACHE_TTL']
+    if 'QUERY_CACHE_SIMILARITY' in kwargs:
+        QUERY_CACHE_SIMILARITY = kwargs['QUERY_CACHE_SIMILARITY']
     
     save_config()
     
@@ -576,7 +871,44 @@ def get_config():
         'MAX_SUMMARY_LENGTH': MAX_SUMMARY_LENGTH,
         'DEBUG': DEBUG,
         'DEBUG_TXT': DEBUG_TXT,
-        'NO_RECORD': NO_RECORD
+        'NO_RECORD': NO_RECORD,
+        'FLUSH_POLICY': FLUSH_POLICY,
+        'FLUSH_INTERVAL_MS': FLUSH_INTERVAL_MS,
+        'LOG_SEGMENT_MAX_BYTES': LOG_SEGMENT_MAX_BYTES,
+        'STORAGE_BACKEND': STORAGE_BACKEND,
+        'JSON_EXPORT_ON_EXIT': JSON_EXPORT_ON_EXIT,
+        'WAL_ENABLED': WAL_ENABLED,
+        'WAL_CHECKPOINT_BYTES': WAL_CHECKPOINT_BYTES,
+        'SIMILARITY_BATCH_SEARCH': SIMILARITY_BATCH_SEARCH,
+        'SIMILARITY_BATCH_STORAGE': SIMILARITY_BATCH_STORAGE,
+        'SIMILARITY_BATCH_SIZE': SIMILARITY_BATCH_SIZE,
+        'SIMILARITY_CACHE_ENABLED': SIMILARITY_CACHE_ENABLED,
+        'SIMILARITY_CACHE_SIZE': SIMILARITY_CACHE_SIZE,
+        'SIMILARITY_CACHE_PERSIST': SIMILARITY_CACHE_PERSIST,
+        'AI_RESULT_CACHE_ENABLED': AI_RESULT_CACHE_ENABLED,
+        'AI_RESULT_CACHE_SIZE': AI_RESULT_CACHE_SIZE,
+        'API_RPM_LIMIT': API_RPM_LIMIT,
+        'API_TPM_LIMIT': API_TPM_LIMIT,
+        'CIRCUIT_FAILURE_THRESHOLD': CIRCUIT_FAILURE_THRESHOLD,
+        'CIRCUIT_RESET_SECONDS': CIRCUIT_RESET_SECONDS,
+        'AI_MAX_CONCURRENCY': AI_MAX_CONCURRENCY,
+        'AI_MAX_CONCURRENCY_PER_KEY': AI_MAX_CONCURRENCY_PER_KEY,
+        'AI_NATIVE_ASYNC': AI_NATIVE_ASYNC,
+        'AI_SINGLE_FLIGHT': AI_SINGLE_FLIGHT,
+        'HEDGE_ENABLED': HEDGE_ENABLED,
+        'HEDGE_PERCENTILE': HEDGE_PERCENTILE,
+        'HEDGE_BUDGET_PERCENT': HEDGE_BUDGET_PERCENT,
+        'VECTOR_PREFILTER_ENABLED': VECTOR_PREFILTER_ENABLED,
+        'VECTOR_PREFILTER_TOP_K': VECTOR_PREFILTER_TOP_K,
+        'SEARCH_ALGORITHM': SEARCH_ALGORITHM,
+        'SEARCH_MAX_LLM_CALLS': SEARCH_MAX_LLM_CALLS,
+        'SEARCH_TIME_BUDGET_MS': SEARCH_TIME_BUDGET_MS,
+        'SEARCH_TOP_K': SEARCH_TOP_K,
+        'REUSE_SEARCH_SCORES': REUSE_SEARCH_SCORES,
+        'QUERY_CACHE_ENABLED': QUERY_CACHE_ENABLED,
+        'QUERY_CACHE_SIZE': QUERY_CACHE_SIZE,
+        'QUERY_CACHE_TTL': QUERY_CACHE_TTL,
+        'QUERY_CACHE_SIMILARITY': QUERY_CACHE_SIMILARITY
     }
 
 def validate_config_value(key, value):
@@ -585,12 +917,49 @@ def validate_config_value(key, value):
         'SYSTEM_MODE': ['test', 'chat'],
         'SEARCH_MODE': ['efficiency', 'force', 'no'],
         'UPDATE_TOPIC': ['always', 'smart', 'never'],
-        'MODEL': ['gemini-1.5-flash', 'gemini-2.5-flash', 'gemini-2.5-flash-lite'],
+        'MODEL': ['gemini-1.5-flash', 'gemini-2.5-flash', 'gemini-2.5-flash-lite', 'local'],
         'FANOUT_LIMIT': lambda x: isinstance(x, int) and 1 <= x <= 50,
         'MAX_SUMMARY_LENGTH': lambda x: isinstance(x, int) and 100 <= x <= 10000,
         'DEBUG': lambda x: isinstance(x, bool),
         'DEBUG_TXT': lambda x: isinstance(x, bool),
-        'NO_RECORD': lambda x: isinstance(x, bool)
+        'NO_RECORD': lambda x: isinstance(x, bool),
+        'FLUSH_POLICY': ['turn', 'interval', 'exit'],
+        'FLUSH_INTERVAL_MS': lambda x: isinstance(x, int) and 10 <= x <= 600000,
+        'LOG_SEGMENT_MAX_BYTES': lambda x: isinstance(x, int) and 4096 <= x <= 1024 * 1024 * 1024,
+        'STORAGE_BACKEND': ['json', 'sqlite'],
+        'JSON_EXPORT_ON_EXIT': lambda x: isinstance(x, bool),
+        'WAL_ENABLED': lambda x: isinstance(x, bool),
+        'WAL_CHECKPOINT_BYTES': lambda x: isinstance(x, int) and 1024 <= x <= 1024 * 1024 * 1024,
+        'SIMILARITY_BATCH_SEARCH': lambda x: isinstance(x, bool),
+        'SIMILARITY_BATCH_STORAGE': lambda x: isinstance(x, bool),
+        'SIMILARITY_BATCH_SIZE': lambda x: isinstance(x, int) and 1 <= x <= 100,
+        'SIMILARITY_CACHE_ENABLED': lambda x: isinstance(x, bool),
+        'SIMILARITY_CACHE_SIZE': lambda x: isinstance(x, int) and 1 <= x <= 1000000,
+        'SIMILARITY_CACHE_PERSIST': lambda x: isinstance(x, bool),
+        'AI_RESULT_CACHE_ENABLED': lambda x: isinstance(x, bool),
+        'AI_RESULT_CACHE_SIZE': lambda x: isinstance(x, int) and 100 <= x <= 10000000,
+        'API_RPM_LIMIT': lambda x: isinstance(x, int) and 1 <= x <= 100000,
+        'API_TPM_LIMIT': lambda x: isinstance(x, int) and 1000 <= x <= 100000000,
+        'CIRCUIT_FAILURE_THRESHOLD': lambda x: isinstance(x, int) and 1 <= x <= 100,
+        'CIRCUIT_RESET_SECONDS': lambda x: isinstance(x, (int, float)) and 1 <= x <= 3600,
+        'AI_MAX_CONCURRENCY': lambda x: isinstance(x, int) and 1 <= x <= 1024,
+        'AI_MAX_CONCURRENCY_PER_KEY': lambda x: isinstance(x, int) and 1 <= x <= 1024,
+        'AI_NATIVE_ASYNC': lambda x: isinstance(x, bool),
+        'AI_SINGLE_FLIGHT': lambda x: isinstance(x, bool),
+        'HEDGE_ENABLED': lambda x: isinstance(x, bool),
+        'HEDGE_PERCENTILE': lambda x: isinstance(x, (int, float)) and 50 <= x < 100,
+        'HEDGE_BUDGET_PERCENT': lambda x: isinstance(x, (int, float)) and 0 <= x <= 100,
+        'VECTOR_PREFILTER_ENABLED': lambda x: isinstance(x, bool),
+        'VECTOR_PREFILTER_TOP_K': lambda x: isinstance(x, int) and 1 <= x <= 100,
+        'SEARCH_ALGORITHM': ['bfs', 'best_first', 'pipelined'],
+        'SEARCH_MAX_LLM_CALLS': lambda x: isinstance(x, int) and 1 <= x <= 10000,
+        'SEARCH_TIME_BUDGET_MS': lambda x: isinstance(x, int) and 100 <= x <= 600000,
+        'SEARCH_TOP_K': lambda x: isinstance(x, int) and 1 <= x <= 100,
+        'REUSE_SEARCH_SCORES': lambda x: isinstance(x, bool),
+        'QUERY_CACHE_ENABLED': lambda x: isinstance(x, bool),
+        'QUERY_CACHE_SIZE': lambda x: isinstance(x, int) and x > 0,
+        'QUERY_CACHE_TTL': lambda x: isinstance(x, (int, float)) and x > 0,
+        'QUERY_CACHE_SIMILARITY': lambda x: isinstance(x, (int, float)) and 0 < x <= 1
     }
     
     if key not in valid_configs:
@@ -638,15 +1007,8 @@ def validate_node_structure(node_data):
 def get_root_children_ids():
     """ROOT 노드의 직접 자식 ID들 반환"""
     try:
-        from memory import load_json
-        hierarchical_data = load_json('memory/hierarchical_memory.json', {})
-        
-        root_children = []
-        for node_id, node_data in hierarchical_data.items():
-            if node_data.get('direct_parent_id') is None:
-                root_children.append(node_id)
-        
-        return root_children
+        from memory import get_node_store
+        return get_node_store().root_children_ids()
     except Exception as e:
         debug_print(f"ROOT 자식 노드 조회 오류: {e}")
         return []
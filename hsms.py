@@ -6,7 +6,8 @@ from config import (
     get_config, update_config, validate_config_value,
     load_config, create_default_config
 )
-from memory import initialize_json_files, load_json
+from llm_backend import LOCAL_MODEL
+from memory import initialize_json_files, get_node_store, export_tree_json, import_tree_json
 from main_ai import chat_mode, test_mode
 
 def show_api_info():
@@ -34,16 +35,13 @@ def show_tree_structure():
     """현재 트리 구조를 도식화하여 표시"""
     print("\n=== 트리 구조 ===")
     
-    hierarchical_memory = load_json('memory/hierarchical_memory.json', {})
-    if not hierarchical_memory:
+    store = get_node_store()
+    if len(store) == 0:
         print("저장된 트리 구조가 없습니다.")
         return
     
-    # ROOT 노드의 자식들을 찾기
-    root_children = []
-    for node_id, node_data in hierarchical_memory.items():
-        if node_data.get('direct_parent_id') is None:
-            root_children.append(node_id)
+    # ROOT 노드의 자식들
+    root_children = store.root_children_ids()
     
     if not root_children:
         print("ROOT 노드에 자식이 없습니다.")
@@ -52,7 +50,7 @@ def show_tree_structure():
     print("ROOT")
     
     def print_node(node_id, depth=1, is_last=True, parent_prefix=""):
-        node_data = hierarchical_memory.get(node_id)
+        node_data = store.get(node_id)
         if not node_data:
             return
         
@@ -85,12 +83,14 @@ def show_tree_structure():
         is_last_child = (i == len(root_children) - 1)
         print_node(child_id, 1, is_last_child, "")
 
-def validate_environment():
+def validate_environment(model_name: str):
     """환경 검증"""
     errors = []
     warnings = []
     
-    if AI_API_N == 0 and LOAD_API_N == 0:
+    if model_name == LOCAL_MODEL:
+        pass  # 로컬 백엔드는 API 키가 필요 없음
+    elif AI_API_N == 0 and LOAD_API_N == 0:
         errors.append("사용 가능한 API 키가 없습니다. .env 파일을 확인하세요.")
     elif AI_API_N == 0:
         warnings.append("AI_API 키가 없습니다. LOAD_API를 대신 사용합니다.")
@@ -126,6 +126,7 @@ def main():
   python hsms.py --api-info                   # API 정보만 표시
   python hsms.py --tree                       # 트리 구조만 표시
   python hsms.py --debug-txt                  # 디버그 텍스트 파일 저장
+  python hsms.py --export-json tree.json      # 트리를 JSON으로 내보내기
         """
     )
     
@@ -139,6 +140,11 @@ def main():
         choices=['efficiency', 'force', 'no'],
         help='검색 방법: efficiency (효율적), force (강제), no (없음)'
     )
+    parser.add_argument(
+        '--search-algorithm',
+        choices=['bfs', 'best_first', 'pipelined'],
+        help='검색 알고리즘: bfs (너비 우선), best_first (점수 우선, 호출 수/시간 예산 적용), pipelined (단계 대기 없는 BFS)'
+    )
     parser.add_argument(
         '--api-info',
         action='store_true',
@@ -167,8 +173,8 @@ def main():
     )
     parser.add_argument(
         '--model',
-        choices=['gemini-1.5-flash', 'gemini-2.5-flash', 'gemini-2.5-flash-lite'],
-        help='사용할 AI 모델'
+        choices=['gemini-1.5-flash', 'gemini-2.5-flash', 'gemini-2.5-flash-lite', 'local'],
+        help='사용할 AI 모델 (local: 네트워크 없이 동작하는 결정적 로컬 백엔드)'
     )
     parser.add_argument(
         '--no-record',
@@ -180,15 +186,25 @@ def main():
         choices=['always', 'smart', 'never'],
         help='토픽 업데이트 모드: always (항상), smart (조건부), never (안함)'
     )
+    parser.add_argument(
+        '--export-json',
+        metavar='PATH',
+        help='현재 트리를 JSON 파일로 내보내고 종료'
+    )
+    parser.add_argument(
+        '--import-json',
+        metavar='PATH',
+        help='JSON 파일로 현재 트리를 대체하고 종료'
+    )
     
     args = parser.parse_args()
     
     print(" HSMS (Hierarchical Semantic Memory System)")
     print("=" * 50)
     
-    if not validate_environment():
-        sys.exit(1)
     load_config()
+    if not validate_environment(args.model or get_config()['MODEL']):
+        sys.exit(1)
     
     config_updates = {}
     
@@ -196,6 +212,8 @@ def main():
         config_updates['SYSTEM_MODE'] = args.mode
     if args.search is not None:
         config_updates['SEARCH_MODE'] = args.search
+    if args.search_algorithm is not None:
+        config_updates['SEARCH_ALGORITHM'] = args.search_algorithm
     if args.debug:
         config_updates['DEBUG'] = True
     if args.debug_txt:
@@ -224,6 +242,22 @@ def main():
         if not current_config['SYSTEM_MODE']:  # API 정보만 보고 종료하려는 경우
             return
     
+    # 트리 JSON 내보내기/가져오기 (요청 시)
+    if args.import_json:
+        if import_tree_json(args.import_json):
+            print(f"트리를 가져왔습니다: {args.import_json}")
+        else:
+            print(f"트리 가져오기 실패: {args.import_json}")
+            sys.exit(1)
+        return
+    if args.export_json:
+        if export_tree_json(args.export_json):
+            print(f"트리를 내보냈습니다: {args.export_json}")
+        else:
+            print(f"트리 내보내기 실패: {args.export_json}")
+            sys.exit(1)
+        return
+    
     # 트리 구조 표시 (요청 시)  
     if args.tree:
         show_tree_structure()
@@ -240,6 +274,7 @@ def main():
     print(f"\n현재 시스템 설정:")
     print(f"  실행 모드: {current_config['SYSTEM_MODE']}")
     print(f"  검색 모드: {current_config['SEARCH_MODE']}")
+    print(f"  검색 알고리즘: {current_config['SEARCH_ALGORITHM']}")
     print(f"  디버그 모드: {'ON' if current_config['DEBUG'] else 'OFF'}")
     print(f"  디버그 파일 저장: {'ON' if current_config['DEBUG_TXT'] else 'OFF'}")
     print(f"  기록 모드: {'OFF' if current_config['NO_RECORD'] else 'ON'}")
@@ -0,0 +1,363 @@
+import asyncio
+import re
+import threading
+import weakref
+from collections import OrderedDict, Counter
+import config
+from config import debug_print
+from scheduler import get_executor
+
+LOCAL_MODEL = 'local'  # MODEL이 이 값이면 네트워크 없이 동작하는 로컬 백엔드 사용
+
+# AI 호출 예외
+class AIError(Exception):
+    """AI 호출 실패 (재시도 후에도 응답을 얻지 못함)"""
+
+class AIRateLimitError(AIError):
+    """429 / ResourceExhausted (retry_after: 서버가 알려준 재시도 대기 시간, 없으면 None)"""
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AITransientError(AIError):
+    """일시적인 서버/네트워크 오류 (재시도 가능)"""
+
+class AIResponseError(AIError):
+    """응답은 받았지만 내용이 없거나 차단됨 (재시도하지 않음)"""
+
+class AICallBudgetError(AIError):
+    """호출 예산이 소진되어 호출하지 않음 (재시도하지 않음)"""
+
+# 유사도 응답을 점수로 변환
+def parse_similarity_score(result):
+    """
+    AI 유사도 응답을 점수로 변환
+    Returns:
+        float: 0.0~1.0 점수, AI 호출이 실패했거나 응답을 해석할 수 없으면 None (관련 없음이 아니라 알 수 없음)
+    """
+    if result is None:
+        return None
+    text = result.strip()
+    try:
+        return float(text)
+    except ValueError:
+        # 숫자로 변환 실패 시 기존 방식으로 fallback
+        if text.lower() == 'true':
+            return 0.8
+        if text.lower() == 'false':
+            return 0.0
+        return None
+
+# 단일 노드 유사도 판단 프롬프트 (ai_func의 유사도 판단과 LLMBackend.score가 공유)
+SIMILARITY_SYSTEM = """노드의 주제와 요약을 보고 사용자 질문과의 관련성을 0.0~1.0 사이의 점수로 평가해라.
+- 0.9 이상: 매우 강한 관련성 (같은 구체적 주제)
+- 0.7~0.8: 강한 관련성 (같은 카테고리의 세부 주제)
+- 0.5~0.6: 보통 관련성 (같은 큰 분야이지만 다른 세부 주제)
+- 0.3~0.4: 약한 관련성 (넓은 의미로만 관련)
+- 0.2 이하: 관련성 없음
+
+점수만 숫자로 출력하세요 (예: 0.85)"""
+
+def similarity_prompt(node_text: str, conversation: str) -> str:
+    """node_text는 '주제: ...\n요약: ...' 형식의 노드 정보"""
+    return f"노드 정보 : {node_text}\n현재 대화 : {conversation}\n\n위 노드와 현재 대화의 유사도를 0.0~1.0 점수로 평가하세요."
+
+class LLMBackend:
+    """
+    LLM 백엔드 인터페이스
+    prompt는 히스토리가 합쳐진 최종 프롬프트이고, task는 호출 종류 힌트
+    ('need_memory', 'respond', 'similarity', 'similarity_batch', 'clustering', 'summary', 'topic', 'parent_update')
+    재시도, 캐시, 키 배정은 ai_func가 담당하고 백엔드는 한 번의 생성만 수행함
+    """
+    model_name = None
+    requires_api_key = True  # False이면 API 키와 RPM/TPM 스케줄링 없이 호출
+    
+    def generate(self, prompt: str, system: str, api_key: str = None, task: str = None) -> str:
+        raise NotImplementedError
+    
+    def native_async(self) -> bool:
+        """generate_async가 스레드 없이 동작하는지 여부"""
+        return False
+    
+    async def generate_async(self, prompt: str, system: str, api_key: str = None, task: str = None) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), self.generate, prompt, system, api_key, task)
+    
+    async def generate_batch(self, prompts: list, system: str, task: str = None) -> list:
+        """여러 프롬프트를 처리 (실패한 항목은 None)"""
+        async def run(prompt):
+            try:
+                return await self.generate_async(prompt, system, task=task)
+            except AIError:
+                return None
+        return await asyncio.gather(*[run(prompt) for prompt in prompts])
+    
+    async def aclose(self):
+        """현재 이벤트 루프에 묶인 자원 정리 (루프를 끝내기 전에 호출)"""
+        pass
+    
+    def score(self, node_text: str, conversation: str, api_key: str = None) -> float:
+        """
+        노드 내용과 대화의 관련도 (0.0~1.0, 응답을 해석할 수 없으면 None)
+        기본 구현은 유사도 판단 프롬프트를 generate(task='similarity')로 한 번 호출함
+        """
+        if api_key is None and self.requires_api_key:
+            if not config.AI_API:
+                raise AIError("No AI API key available")
+            api_key = config.AI_API[0]
+        result = self.generate(similarity_prompt(node_text, conversation), SIMILARITY_SYSTEM, api_key, task='similarity')
+        return parse_similarity_score(result)
+
+MODEL_POOL_MAX = 64
+
+# 응답 텍스트 추출
+def response_text(resp) -> str:
+    try:
+        txt = resp._result.candidates[0].content.parts[0].text.strip()
+    except (AttributeError, IndexError) as e:
+        raise AIResponseError(f"AI 응답이 비어 있거나 차단되었습니다: {e}")
+    return txt[10:].strip() if txt.lower().startswith('assistant:') else txt
+
+class GeminiBackend(LLMBackend):
+    """google.generativeai 기반 백엔드 (SDK는 이 백엔드를 만들 때 가져오므로 로컬 백엔드는 SDK 없이 동작)"""
+    def __init__(self, model_name: str):
+        import google.generativeai as genai
+        import google.ai.generativelanguage as glm
+        from google.api_core import client_options as client_options_lib
+        from google.generativeai.types import HarmCategory, HarmBlockThreshold
+        self._genai, self._glm, self._client_options = genai, glm, client_options_lib.ClientOptions
+        self._safety_settings = {
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        }
+        self.model_name = model_name
+        # 모델 객체 풀 (API 키, 시스템 지침)별로 재사용
+        self._model_pool = OrderedDict()
+        self._service_clients = {}
+        # 비동기 모델 객체 풀 (비동기 gRPC 클라이언트는 이벤트 루프에 묶이므로 루프별로 유지)
+        self._async_model_pools = weakref.WeakKeyDictionary()  # loop -> (OrderedDict 모델 풀, {API 키: 비동기 클라이언트})
+        self._pool_lock = threading.Lock()
+    
+    def get_model(self, api_key: str, system: str):
+        """
+        (API 키, 시스템 지침)에 해당하는 GenerativeModel을 풀에서 반환 (없으면 생성)
+        genai.configure는 프로세스 전역 설정이라 병렬 호출 시 키가 섞이므로,
+        API 키별 GenerativeServiceClient를 만들어 모델에 직접 연결함
+        """
+        key = (api_key, system)
+        with self._pool_lock:
+            model = self._model_pool.get(key)
+            if model is not None:
+                self._model_pool.move_to_end(key)
+                return model
+            
+            service_client = self._service_clients.get(api_key)
+            if service_client is None:
+                service_client = self._glm.GenerativeServiceClient(
+                    client_options=self._client_options(api_key=api_key)
+                )
+                self._service_clients[api_key] = service_client
+            
+            model = self._genai.GenerativeModel(self.model_name, system_instruction=system, safety_settings=self._safety_settings)
+            model._client = service_client  # 전역 기본 클라이언트 대신 키별 클라이언트 사용
+            self._model_pool[key] = model
+            if len(self._model_pool) > MODEL_POOL_MAX:
+                self._model_pool.popitem(last=False)
+            return model
+    
+    def get_async_model(self, api_key: str, system: str):
+        """현재 이벤트 루프에서 사용할 (API 키, 시스템 지침)별 GenerativeModel 반환 (키별 비동기 클라이언트 연결)"""
+        key = (api_key, system)
+        loop = asyncio.get_running_loop()
+        with self._pool_lock:
+            if loop not in self._async_model_pools:
+                self._async_model_pools[loop] = (OrderedDict(), {})
+            models, clients = self._async_model_pools[loop]
+            model = models.get(key)
+            if model is not None:
+                models.move_to_end(key)
+                return model
+            
+            async_client = clients.get(api_key)
+            if async_client is None:
+                async_client = self._glm.GenerativeServiceAsyncClient(
+                    client_options=self._client_options(api_key=api_key)
+                )
+                clients[api_key] = async_client
+            
+            model = self._genai.GenerativeModel(self.model_name, system_instruction=system, safety_settings=self._safety_settings)
+            model._async_client = async_client
+            models[key] = model
+            if len(models) > MODEL_POOL_MAX:
+                models.popitem(last=False)
+            return model
+    
+    def generate(self, prompt: str, system: str, api_key: str = None, task: str = None) -> str:
+        # 히스토리는 프롬프트에 포함되므로 채팅 세션 없이 단일 요청으로 호출
+        return response_text(self.get_model(api_key, system).generate_content(prompt))
+    
+    def native_async(self) -> bool:
+        return config.AI_NATIVE_ASYNC and hasattr(self._genai.GenerativeModel, 'generate_content_async')
+    
+    async def generate_async(self, prompt: str, system: str, api_key: str = None, task: str = None) -> str:
+        if not self.native_async():
+            return await super().generate_async(prompt, system, api_key, task)
+        return response_text(await self.get_async_model(api_key, system).generate_content_async(prompt))
+    
+    async def aclose(self):
+        """현재 이벤트 루프에서 만든 키별 비동기 클라이언트(gRPC 채널)를 닫고 풀에서 제거"""
+        with self._pool_lock:
+            pool = self._async_model_pools.pop(asyncio.get_running_loop(), None)
+        if pool is None:
+            return
+        for api_key, async_client in pool[1].items():
+            try:
+                await async_client.transport.close()
+            except Exception as e:
+                debug_print(f"비동기 클라이언트 종료 실패 ({api_key[:4]}****): {e}")
+
+# 로컬 백엔드 텍스트 처리
+WORD_PATTERN = re.compile(r'[0-9A-Za-z가-힣]+')
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?。])\s+|\n+')
+MAX_LENGTH_PATTERN = re.compile(r'(\d+)자 이내')
+MAX_COUNT_PATTERN = re.compile(r'최대 (\d+)개')
+MEMORY_KEYWORDS = ('저번', '이전에', '과거', '전에', '말했던', '이야기했던', '나눴던', '정리해', '요약해', '다시 보여', '기억')
+
+def text_features(text: str) -> set:
+    """단어와 단어 내부 글자 bigram 집합 (조사가 붙은 한국어 단어도 겹치도록)"""
+    features = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        features.add(word)
+        features.update(word[i:i + 2] for i in range(len(word) - 1))
+    return features
+
+def extract_sentences(text: str, max_length: int) -> str:
+    """앞에서부터 max_length자를 넘지 않는 만큼의 문장을 이어 붙인 추출 요약"""
+    result = ""
+    for sentence in SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        candidate = f"{result} {sentence}".strip()
+        if len(candidate) > max_length:
+            break
+        result = candidate
+    return result or text.strip().replace('\n', ' ')[:max_length]
+
+def keyword_topic(text: str, count: int = 2) -> str:
+    """가장 자주 나온 단어(2자 이상)로 만든 주제명 (동률이면 먼저 나온 단어)"""
+    words = [word for word in WORD_PATTERN.findall(text) if len(word) >= 2]
+    if not words:
+        return "일반 대화"
+    return ' '.join(word for word, _ in Counter(words).most_common(count))
+
+def section(text: str, label: str, end: str = None) -> str:
+    """'label' 뒤부터 'end' 앞까지의 텍스트"""
+    start = text.find(label)
+    if start < 0:
+        return ""
+    start += len(label)
+    stop = text.find(end, start) if end else -1
+    return text[start:stop if stop >= 0 else len(text)].strip()
+
+class LocalBackend(LLMBackend):
+    """
+    네트워크 없이 결정적으로 동작하는 백엔드 (부하 테스트, 트리 알고리즘 벤치마크, 프로파일링용)
+    ai_func의 프롬프트 형식을 읽어 어휘 겹침 점수, 추출 요약, 빈도 기반 주제명을 만듦
+    """
+    model_name = LOCAL_MODEL
+    requires_api_key = False
+    
+    def score(self, node_text: str, conversation: str, api_key: str = None) -> float:
+        node_features = text_features(node_text)
+        conversation_features = text_features(conversation)
+        if not node_features or not conversation_features:
+            return 0.0
+        overlap = len(node_features & conversation_features) / min(len(node_features), len(conversation_features))
+        return round(min(1.0, overlap), 2)
+    
+    def native_async(self) -> bool:
+        return True
+    
+    async def generate_async(self, prompt: str, system: str, api_key: str = None, task: str = None) -> str:
+        return self.generate(prompt, system, api_key, task)
+    
+    def generate(self, prompt: str, system: str, api_key: str = None, task: str = None) -> str:
+        # build_prompt가 붙인 "user: " 제거 (task가 있는 호출은 히스토리 없이 호출됨)
+        if prompt.startswith("user: "):
+            prompt = prompt[6:]
+        handler = getattr(self, f'_{task}', None) if task else None
+        if handler is None:
+            return prompt.strip()[:200]
+        return handler(prompt, system)
+    
+    def _need_memory(self, prompt: str, system: str) -> str:
+        return "True" if any(keyword in prompt for keyword in MEMORY_KEYWORDS) else "False"
+    
+    def _respond(self, prompt: str, system: str) -> str:
+        memory_count = prompt.count("번 ]====")
+        question = prompt.strip().split('\n')[-1]
+        return f"(로컬 응답) 기억 {memory_count}개 참고: {question[:100]}"
+    
+    def _similarity(self, prompt: str, system: str) -> str:
+        node_text = section(prompt, "노드 정보 :", "\n현재 대화 :")
+        conversation = section(prompt, "현재 대화 :", "\n\n위 노드와")
+        return f"{self.score(node_text, conversation):.2f}"
+    
+    def _similarity_batch(self, prompt: str, system: str) -> str:
+        conversation = section(prompt, "현재 대화 :", "\n\n노드 목록 :")
+        nodes = re.split(r'^\[(\d+)\] ', section(prompt, "노드 목록 :", "\n\n위 "), flags=re.MULTILINE)
+        lines = []
+        for number, node_text in zip(nodes[1::2], nodes[2::2]):
+            lines.append(f"{number}: {self.score(node_text, conversation):.2f}")
+        return '\n'.join(lines)
+    
+    def _clustering(self, prompt: str, system: str) -> str:
+        conversation = section(prompt, "현재 대화:", "\n\n후보 노드들:")
+        match = MAX_COUNT_PATTERN.search(system)
+        limit = int(match.group(1)) if match else 1
+        candidates = []
+        for block in section(prompt, "후보 노드들:").split("노드 ID: ")[1:]:
+            node_id, _, node_text = block.partition('\n')
+            candidates.append((self.score(node_text, conversation), node_id.strip(), node_text))
+        candidates.sort(key=lambda candidate: -candidate[0])
+        selected = [candidate for candidate in candidates[:limit] if candidate[0] > 0]
+        topic = keyword_topic(conversation + ' ' + ' '.join(section(text, "주제:", "\n") for _, _, text in selected))
+        return f"선택된 노드 ID들: [{', '.join(node_id for _, node_id, _ in selected)}]\n새 주제명: {topic}"
+    
+    def _summary(self, prompt: str, system: str) -> str:
+        match = MAX_LENGTH_PATTERN.search(system)
+        max_length = int(match.group(1)) if match else 200
+        contents = [line.split(': ', 1)[-1] for line in section(prompt, "대화 내용:").split('\n') if line.strip()]
+        return extract_sentences('\n'.join(contents), max_length)
+    
+    def _topic(self, prompt: str, system: str) -> str:
+        return keyword_topic(section(prompt, "요약 내용:"))
+    
+    def _parent_update(self, prompt: str, system: str) -> str:
+        match = MAX_LENGTH_PATTERN.search(system)
+        max_length = int(match.group(1)) if match else 300
+        old_summary = section(prompt, "기존 요약:", "\n새로운 내용:")
+        new_content = section(prompt, "새로운 내용:")
+        # 새 내용을 우선 남기고 남는 길이만큼 기존 요약을 유지
+        summary = extract_sentences(new_content, max_length)
+        remaining = max_length - len(summary) - 1
+        if remaining > 0 and old_summary:
+            summary = f"{extract_sentences(old_summary, remaining)} {summary}".strip()
+        summary = summary.replace('\n', ' ')
+        return f"새 요약: {summary}\n새 주제명: {keyword_topic(summary)}"
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend() -> LLMBackend:
+    """현재 MODEL 설정에 해당하는 백엔드 반환"""
+    model_name = config.GEMINI_MODEL
+    with _backends_lock:
+        backend = _backends.get(model_name)
+        if backend is None:
+            backend = LocalBackend() if model_name == LOCAL_MODEL else GeminiBackend(model_name)
+            _backends[model_name] = backend
+        return backend
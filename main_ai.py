@@ -3,9 +3,10 @@ from config import (
     SEARCH_MODE, NO_RECORD, DEBUG, FANOUT_LIMIT, MAX_SUMMARY_LENGTH, 
     UPDATE_TOPIC, GEMINI_MODEL, TEST_Q, debug_print, DEBUG_TXT, debug_log_separator, debug_log_close
 )
-from ai_func import need_memory_judgement_AI, respond_AI
-from tree import search_tree, save_tree
-from memory import initialize_json_files
+from ai_func import need_memory_judgement_AI, respond_AI, AIError
+from tree import search_tree, save_tree, start_turn_scoring
+from memory import initialize_json_files, end_turn
+from llm_backend import get_backend
 
 current_search_mode = SEARCH_MODE
 current_no_record = NO_RECORD
@@ -57,6 +58,11 @@ def command(command_input):
     elif cmd == '!status':
         print(f"\n=== 시스템 상태 ===")
         print(f"검색 모드: {current_search_mode}")
+        import config
+        if config.SEARCH_ALGORITHM == 'best_first':
+            print(f"검색 알고리즘: best_first (호출 {config.SEARCH_MAX_LLM_CALLS}회, {config.SEARCH_TIME_BUDGET_MS}ms, top-k {config.SEARCH_TOP_K})")
+        else:
+            print(f"검색 알고리즘: {config.SEARCH_ALGORITHM}")
         print(f"기록 모드: {'ON' if not current_no_record else 'OFF'}")
         print(f"디버그 모드: {'ON' if current_debug else 'OFF'}")
         print(f"디버그 텍스트 저장: {'ON' if current_debug_txt else 'OFF'}")
@@ -64,6 +70,38 @@ def command(command_input):
         print(f"최대 요약 길이: {current_max_summary_length}")
         print(f"토픽 업데이트: {current_update_topic}")
         print(f"AI 모델: {current_model}")
+        from config import CALL_STATS
+        from ai_cache import get_similarity_cache, get_result_cache, get_query_cache
+        cache = get_similarity_cache()
+        if cache is not None:
+            print(f"유사도 캐시: {len(cache)}개 항목, 적중 {CALL_STATS['cache_hits']}회")
+        else:
+            print("유사도 캐시: OFF")
+        print(f"AI 결과 캐시: {'ON' if get_result_cache() is not None else 'OFF'} (적중 {CALL_STATS['result_cache_hits']}회)")
+        query_cache = get_query_cache()
+        if query_cache is not None:
+            print(f"검색 결과 캐시: {len(query_cache)}개 항목, 적중 {CALL_STATS['query_cache_hits']}회 (검색 {CALL_STATS['memory_searches']}회)")
+        else:
+            print("검색 결과 캐시: OFF")
+        from ai_func import native_async_available
+        from scheduler import get_limiter
+        limiter = get_limiter()
+        print(f"AI 동시 실행: 최대 {limiter.max_concurrency}개 (키당 {limiter.max_per_key}개), "
+              f"실행 중 {limiter.in_flight}개, 최고 {limiter.peak_in_flight}개, "
+              f"{'SDK 비동기' if native_async_available() else '전용 스레드 풀'}")
+        if CALL_STATS['prefilter_saved_calls']:
+            searches = max(1, CALL_STATS['memory_searches'])
+            print(f"벡터 사전 필터: 유사도 판단 {CALL_STATS['prefilter_saved_calls']}개 생략 "
+                  f"(검색 {CALL_STATS['memory_searches']}회, 검색당 {CALL_STATS['prefilter_saved_calls'] / searches:.1f}개)")
+        if CALL_STATS['turn_score_reuses']:
+            print(f"검색 점수 재사용: 저장 위치 탐색에서 유사도 판단 {CALL_STATS['turn_score_reuses']}개 생략")
+        if CALL_STATS['hedged_calls']:
+            print(f"헤지 요청: {CALL_STATS['hedged_calls']}회 (먼저 응답 {CALL_STATS['hedge_wins']}회)")
+        if CALL_STATS['coalesced_calls']:
+            print(f"동일 요청 병합: {CALL_STATS['coalesced_calls']}회")
+        if CALL_STATS['queued_calls']:
+            average_wait = CALL_STATS['queue_wait_time'] / CALL_STATS['queued_calls']
+            print(f"API 한도 대기: {CALL_STATS['queued_calls']}회 (평균 {average_wait:.2f}초)")
     
     elif cmd == '!search':
         if len(parts) > 1:
@@ -168,6 +206,9 @@ async def main(user_question):
     """핵심 대화 처리 함수"""
     global current_search_mode, current_no_record, current_debug
     
+    # 검색에서 평가한 노드 점수를 같은 턴의 저장 위치 탐색에서 재사용
+    start_turn_scoring()
+    
     if current_debug:
         debug_print(f"대화 처리 시작: {user_question[:50]}...")
     
@@ -203,7 +244,12 @@ async def main(user_question):
     elif current_debug_txt:
         debug_print("응답 생성 시작...")
         
-    response = respond_AI(user_question, memory_results)
+    try:
+        response = respond_AI(user_question, memory_results)
+    except AIError:
+        # 응답 생성에 실패한 대화는 저장하지 않고 호출한 쪽에 알림
+        end_turn()
+        raise
     
     if current_debug:
         debug_print("응답 생성 완료")
@@ -228,6 +274,9 @@ async def main(user_question):
         elif current_debug_txt:
             debug_print("기억 저장 완료")
     
+    # 턴 종료 (flush 정책에 따라 노드 저장)
+    end_turn()
+    
     # 질의응답 완료 후 구분선 추가
     if current_debug_txt:
         debug_log_separator()
@@ -236,7 +285,13 @@ async def main(user_question):
 
 def main_sync(user_question):
     """main 함수의 동기 버전"""
-    return asyncio.run(main(user_question))
+    async def run_turn():
+        try:
+            return await main(user_question)
+        finally:
+            # 턴마다 새 이벤트 루프를 사용하므로 이 루프에서 만든 비동기 클라이언트를 루프와 함께 정리
+            await get_backend().aclose()
+    return asyncio.run(run_turn())
 
 def chat_mode():
     """터미널 기반 대화형 모드"""
@@ -263,6 +318,8 @@ def chat_mode():
             response = main_sync(user_input)
             print(f"AI: {response}")
             
+        except AIError as e:
+            print(f"AI 응답 생성 실패 (대화는 저장되지 않았습니다): {e}")
         except KeyboardInterrupt:
             print("\n\n시스템을 종료합니다.")
             break
@@ -289,6 +346,8 @@ def test_mode():
         try:
             response = main_sync(test_question)
             print(f"응답: {response}")
+        except AIError as e:
+            print(f"AI 응답 생성 실패: {e}")
         except Exception as e:
             print(f"오류: {e}")
             if current_debug:
@@ -301,7 +360,7 @@ def test_mode():
     print("\n=== 테스트 완료 ===")
 
 def process_single_question(question, search_mode="efficiency", no_record=False, debug=False):
-    """단일 질문을 처리하는 외부 API용 함수"""
+    """단일 질문을 처리하는 외부 API용 함수 (응답 생성에 실패하면 AIError 발생)"""
     global current_search_mode, current_no_record, current_debug
     
     old_search_mode = current_search_mode
@@ -1,10 +1,93 @@
 import json
 import os
+import sys
+import mmap
+import struct
+import zlib
 import uuid
+import time
+import atexit
 import shutil
+import stat
+import tempfile
+import threading
+from array import array
+from contextlib import contextmanager
 from datetime import datetime
+import config
 from config import debug_print, get_timestamp
 
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 스레드 잠금만 사용
+    fcntl = None
+
+# 프로세스 간 파일 잠금
+class FileLock:
+    """
+    fcntl advisory lock 기반의 재진입 가능한 잠금
+    같은 프로세스 안에서는 스레드 RLock으로 직렬화하고, 가장 바깥 획득 시에만
+    잠금 파일에 flock을 걸어 같은 메모리 디렉터리를 쓰는 다른 프로세스와 직렬화함
+    """
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+    
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                if self._fd is None:
+                    os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+                    self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+    
+    @property
+    def thread_lock(self):
+        """같은 프로세스 안의 스레드만 직렬화하는 잠금 (flock 없음)"""
+        return self._thread_lock
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+        return False
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def get_file_lock(lock_path: str) -> FileLock:
+    """경로별로 하나의 FileLock을 공유하여 반환 (같은 디렉터리의 저장소들이 같은 잠금을 사용)"""
+    key = os.path.abspath(lock_path)
+    with _file_locks_guard:
+        if key not in _file_locks:
+            _file_locks[key] = FileLock(lock_path)
+        return _file_locks[key]
+
+# 프로세스 umask (임시 파일 권한 계산용, 시작 시 한 번 읽음)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def replace_file(temp_path: str, file_path: str):
+    """
+    임시 파일로 기존 파일을 원자적으로 교체
+    mkstemp는 항상 0600으로 파일을 만들므로 기존 파일의 권한(없으면 umask에 따른 권한)을 먼저 적용함
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(file_path).st_mode)
+    except OSError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(temp_path, mode)
+    os.replace(temp_path, file_path)
+
 # JSON 파일 안전 저장
 def save_json(file_path: str, data, backup: bool = False) -> bool:
     """
@@ -16,26 +99,62 @@ def save_json(file_path: str, data, backup: bool = False) -> bool:
     Returns:
         bool: 저장 성공 여부
     """
+    temp_path = None
     try:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
-        # 임시 파일에 저장(원자적 쓰기)
-        temp_path = f"{file_path}.tmp"
-        with open(temp_path, 'w', encoding='utf-8') as f:
+        # 기존 파일 백업 (load_json의 복구에 사용)
+        if backup and os.path.exists(file_path):
+            shutil.copy2(file_path, f"{file_path}.backup")
+        
+        # 임시 파일에 저장(원자적 쓰기, 동시에 저장하는 다른 프로세스와 겹치지 않는 고유 이름)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.',
+                                         prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         
         # 임시 파일을 실제 파일로 이동
-        shutil.move(temp_path, file_path)
+        replace_file(temp_path, file_path)
         # debug_print(f"JSON saved successfully: {file_path}")
         return True
         
     except Exception as e:
         debug_print(f"Error saving JSON {file_path}: {e}")
         # 임시 파일
-        if os.path.exists(f"{file_path}.tmp"):
-            os.remove(f"{file_path}.tmp")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+# 바이너리 파일 원자적 저장
+def save_bytes(file_path: str, data: bytes) -> bool:
+    """바이트 데이터를 임시 파일에 쓰고 fsync 후 교체하여 원자적으로 저장"""
+    temp_path = None
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.',
+                                         prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(temp_path, file_path)
+        return True
+    except Exception as e:
+        debug_print(f"Error saving {file_path}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
         return False
 
+# 디렉터리 항목 변경(이름 바꾸기)을 디스크에 반영
+def fsync_directory(dir_path: str):
+    if os.name == 'nt':
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 # JSON 파일 안전 로드
 def load_json(file_path: str, default=None):
     try:
@@ -69,51 +188,945 @@ def load_json(file_path: str, default=None):
         debug_print(f"Error loading JSON {file_path}: {e}")
         return default
 
-# ALL_MEMORY에 새 대화 추가
-def update_all_memory(new_conversation: list) -> int:
-    try:
-        # 기존 ALL_MEMORY 로드
-        all_memory = load_json('memory/all_memory.json', [])
+# 대화 기록 로그 (append-only, 세그먼트 파일 단위로 분할)
+class ConversationLog:
+    """
+    ALL_MEMORY를 JSONL 세그먼트 파일에 append-only로 저장하는 로그
+    새 대화는 마지막 세그먼트에 한 줄을 추가하는 것으로 끝나며,
+    반환되는 인덱스는 로그 전체에서의 순번이므로 이후에도 변하지 않음
+    index.idx에는 인덱스별 (세그먼트 번호, 오프셋, 길이)가 고정 길이로 기록되어
+    필요한 대화만 mmap으로 바로 읽을 수 있음
+    추가와 읽기는 메모리 디렉터리의 파일 잠금 안에서 수행되므로 여러 프로세스가 같은 로그를 공유할 수 있음
+    Args:
+        dir_path: 세그먼트 파일 디렉터리
+        legacy_path: 마이그레이션할 기존 all_memory.json 경로
+        max_segment_bytes: 세그먼트 파일 최대 크기 (초과 시 새 세그먼트로 전환)
+    """
+    SEGMENT_PREFIX = 'segment_'
+    SEGMENT_SUFFIX = '.jsonl'
+    INDEX_FILE = 'index.idx'
+    INDEX_RECORD = struct.Struct('<IQI')  # segment_no, offset, length
+    
+    def __init__(self, dir_path: str = 'memory/all_memory_log',
+                 legacy_path: str = 'memory/all_memory.json',
+                 max_segment_bytes: int = 8 * 1024 * 1024):
+        self.dir_path = dir_path
+        self.legacy_path = legacy_path
+        self.max_segment_bytes = max_segment_bytes
+        self.index_path = os.path.join(dir_path, self.INDEX_FILE)
+        self._count = None
+        self._current_segment = 0
+        self._current_size = 0
+        self._lock = get_file_lock(os.path.join(os.path.dirname(dir_path) or '.', '.lock'))
+    
+    def _segment_path(self, segment_no: int) -> str:
+        return os.path.join(self.dir_path, f"{self.SEGMENT_PREFIX}{segment_no:05d}{self.SEGMENT_SUFFIX}")
+    
+    def _list_segments(self) -> list:
+        if not os.path.isdir(self.dir_path):
+            return []
+        segments = []
+        for name in os.listdir(self.dir_path):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX):
+                segments.append(int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]))
+        return sorted(segments)
+    
+    def _ensure_open(self):
+        if self._count is not None:
+            # 다른 프로세스가 추가한 대화가 있으면 인덱스 끝부터 따라잡음
+            index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+            if index_size != self._count * self.INDEX_RECORD.size:
+                self._recover_index()
+            return
+        if not self._list_segments() and os.path.exists(self.legacy_path):
+            self._migrate_legacy()
+        os.makedirs(self.dir_path, exist_ok=True)
+        self._recover_index()
+        debug_print(f"ConversationLog opened ({self._count} conversations)")
+    
+    def _recover_index(self):
+        """
+        인덱스 파일을 세그먼트와 맞춤
+        마지막으로 인덱싱된 레코드 이후의 세그먼트 내용만 스캔하므로
+        정상 종료 후에는 스캔 없이 열리고, 인덱스가 없으면 전체를 재구성함
+        """
+        record_size = self.INDEX_RECORD.size
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        count = index_size // record_size
+        
+        with open(self.index_path, 'ab') as index_file:
+            if index_size != count * record_size:
+                index_file.truncate(count * record_size)
+            
+            resume_segment, resume_offset = 0, 0
+            if count > 0:
+                with open(self.index_path, 'rb') as f:
+                    f.seek((count - 1) * record_size)
+                    segment_no, offset, length = self.INDEX_RECORD.unpack(f.read(record_size))
+                resume_segment, resume_offset = segment_no, offset + length
+            
+            segments = [n for n in self._list_segments() if n >= resume_segment]
+            self._current_segment, self._current_size = resume_segment, resume_offset
+            
+            for segment_no in segments:
+                offset = resume_offset if segment_no == resume_segment else 0
+                path = self._segment_path(segment_no)
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break
+                        index_file.write(self.INDEX_RECORD.pack(segment_no, offset, len(line)))
+                        offset += len(line)
+                        count += 1
+                if offset != os.path.getsize(path):
+                    debug_print(f"Truncating incomplete record in {path}")
+                    with open(path, 'r+b') as f:
+                        f.truncate(offset)
+                self._current_segment, self._current_size = segment_no, offset
+            
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        self._count = count
+    
+    def _migrate_legacy(self):
+        """
+        기존 all_memory.json(JSON 배열)을 세그먼트 로그로 1회 변환
+        세그먼트는 임시 디렉터리에 모두 쓴 뒤 로그 디렉터리로 한 번에 이름을 바꾸므로,
+        중간에 중단되면 세그먼트가 없는 상태로 남아 다음 시작 시 처음부터 다시 변환됨
+        """
+        legacy = load_json(self.legacy_path, [])
+        if not isinstance(legacy, list):
+            debug_print(f"ERROR: {self.legacy_path} should be a list, skipping migration")
+            return
+        
+        temp_dir = f"{self.dir_path}.migrating"
+        if os.path.isdir(temp_dir):
+            shutil.rmtree(temp_dir)  # 이전에 중단된 변환
+        os.makedirs(temp_dir)
         
-        # 새 대화 추가
-        all_memory.append(new_conversation)
-        index = len(all_memory) - 1
+        segment_no = 0
+        size = 0
+        out = open(os.path.join(temp_dir, os.path.basename(self._segment_path(segment_no))), 'wb')
+        try:
+            for conversation in legacy:
+                line = (json.dumps(conversation, ensure_ascii=False) + '\n').encode('utf-8')
+                if size > 0 and size + len(line) > self.max_segment_bytes:
+                    out.flush()
+                    os.fsync(out.fileno())
+                    out.close()
+                    segment_no += 1
+                    size = 0
+                    out = open(os.path.join(temp_dir, os.path.basename(self._segment_path(segment_no))), 'wb')
+                out.write(line)
+                size += len(line)
+            out.flush()
+            os.fsync(out.fileno())
+        finally:
+            out.close()
         
-        # 파일 저장
-        if save_json('memory/all_memory.json', all_memory):
-            debug_print(f"New conversation added to all_memory.json at index {index}")
+        # 세그먼트가 없는 로그 디렉터리(빈 인덱스만 있는 경우)는 변환 결과로 대체
+        if os.path.isdir(self.dir_path):
+            shutil.rmtree(self.dir_path)
+        os.rename(temp_dir, self.dir_path)
+        fsync_directory(os.path.dirname(self.dir_path) or '.')
+        
+        shutil.move(self.legacy_path, f"{self.legacy_path}.migrated")
+        debug_print(f"Migrated {len(legacy)} conversations from {self.legacy_path}")
+    
+    def __len__(self):
+        with self._lock:
+            self._ensure_open()
+            return self._count
+    
+    def append(self, conversation: list) -> int:
+        """대화 하나를 로그 끝에 추가하고 전체 인덱스를 반환"""
+        with self._lock:
+            self._ensure_open()
+            # 다른 프로세스가 세그먼트에만 쓰고 중단된 꼬리가 있으면 정리
+            segment_path = self._segment_path(self._current_segment)
+            if os.path.exists(segment_path) and os.path.getsize(segment_path) != self._current_size:
+                self._recover_index()
+            line = (json.dumps(conversation, ensure_ascii=False) + '\n').encode('utf-8')
+            
+            if self._current_size > 0 and self._current_size + len(line) > self.max_segment_bytes:
+                self._current_segment += 1
+                self._current_size = 0
+            
+            # 세그먼트에 먼저 쓰고 인덱스를 나중에 기록 (중간에 중단되면 열 때 복구됨)
+            with open(self._segment_path(self._current_segment), 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.index_path, 'ab') as f:
+                f.write(self.INDEX_RECORD.pack(self._current_segment, self._current_size, len(line)))
+            
+            index = self._count
+            self._current_size += len(line)
+            self._count += 1
             return index
+    
+    def get_conversations(self, indexes: list) -> list:
+        """
+        주어진 인덱스의 대화만 읽어서 반환
+        Args:
+            indexes: ALL_MEMORY 인덱스 목록
+        Returns:
+            list: indexes와 같은 순서의 대화 목록 (범위 밖 인덱스는 None)
+        """
+        with self._lock:
+            self._ensure_open()
+            results = [None] * len(indexes)
+            valid = [(i, idx) for i, idx in enumerate(indexes)
+                     if isinstance(idx, int) and 0 <= idx < self._count]
+            if not valid:
+                return results
+            
+            record_size = self.INDEX_RECORD.size
+            locations = {}
+            with open(self.index_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+                for i, idx in valid:
+                    locations[i] = self.INDEX_RECORD.unpack_from(index_map, idx * record_size)
+            
+            by_segment = {}
+            for i, (segment_no, offset, length) in locations.items():
+                by_segment.setdefault(segment_no, []).append((i, offset, length))
+            
+            for segment_no, entries in by_segment.items():
+                with open(self._segment_path(segment_no), 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as segment_map:
+                    for i, offset, length in entries:
+                        results[i] = json.loads(segment_map[offset:offset + length].decode('utf-8'))
+            return results
+    
+    def get(self, index: int):
+        """인덱스에 해당하는 대화 반환 (없으면 None)"""
+        return self.get_conversations([index])[0]
+    
+    def load_all(self) -> list:
+        """전체 대화 목록 반환 (기존 all_memory.json과 같은 형태)"""
+        with self._lock:
+            self._ensure_open()
+            conversations = []
+            for segment_no in self._list_segments():
+                with open(self._segment_path(segment_no), 'r', encoding='utf-8') as f:
+                    conversations.extend(json.loads(line) for line in f)
+            return conversations
+
+_conversation_log = None
+_sqlite_database = None
+
+def get_sqlite_database():
+    """STORAGE_BACKEND가 sqlite일 때 공유하는 SQLite 연결 관리자 반환"""
+    global _sqlite_database
+    if _sqlite_database is None:
+        from memory_sqlite import SQLiteDatabase
+        _sqlite_database = SQLiteDatabase()
+        atexit.register(_sqlite_database.close)
+    return _sqlite_database
+
+def get_conversation_log():
+    """프로세스 전역 대화 기록 저장소 반환 (최초 호출 시 생성)"""
+    global _conversation_log
+    if _conversation_log is None:
+        if config.STORAGE_BACKEND == 'sqlite':
+            from memory_sqlite import SQLiteConversationLog
+            _conversation_log = SQLiteConversationLog(get_sqlite_database())
         else:
-            debug_print("Failed to save all_memory.json")
-            return -1
+            _conversation_log = ConversationLog(max_segment_bytes=config.LOG_SEGMENT_MAX_BYTES)
+    return _conversation_log
+
+def load_all_memory() -> list:
+    """ALL_MEMORY 전체를 리스트로 반환 (load_json('memory/all_memory.json') 대체)"""
+    try:
+        return get_conversation_log().load_all()
+    except Exception as e:
+        debug_print(f"Error loading all_memory: {e}")
+        return []
+
+def get_conversations(indexes: list) -> list:
+    """지정한 인덱스의 대화만 로그에서 읽어 반환 (범위 밖 인덱스는 None)"""
+    try:
+        return get_conversation_log().get_conversations(indexes)
+    except Exception as e:
+        debug_print(f"Error reading conversations {indexes}: {e}")
+        return [None] * len(indexes)
+
+# ALL_MEMORY에 새 대화 추가
+def update_all_memory(new_conversation: list) -> int:
+    try:
+        index = get_conversation_log().append(new_conversation)
+        debug_print(f"New conversation added to all_memory log at index {index}")
+        return index
             
     except Exception as e:
         debug_print(f"Error updating all_memory: {e}")
         return -1
 
+NO_PARENT = -1
+SNAPSHOT_MAGIC = b'HSMS'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct('<4sH')  # magic, version
+SNAPSHOT_CRC = struct.Struct('<I')  # 본문 crc32
+SNAPSHOT_SECTION = struct.Struct('<Q')  # 열 길이
+WAL_RECORD_HEADER = struct.Struct('<II')  # payload length, crc32
+
+class NodeSaveError(Exception):
+    """트랜잭션 안의 노드 저장이 실패함 (블록 밖으로 전파되면 트랜잭션이 되돌려짐)"""
+    pass
+
+class SnapshotError(Exception):
+    """스냅샷 파일이 있지만 읽을 수 없음 (JSON으로 대체하면 마지막 정상 종료 이후의 변경을 잃으므로 로드를 중단)"""
+    pass
+
+# 숫자 열을 리틀 엔디언 바이트로 변환 (플랫폼과 무관한 스냅샷 형식)
+def pack_array(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def unpack_array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+# 노드 내부 표현
+class Node:
+    """
+    NodeStore 내부에서 사용하는 압축된 노드 표현
+    노드 ID는 NodeStore가 UUID와 매핑하는 정수이고, 조상 경로(all_parent_ids)는
+    저장하지 않고 parent 포인터를 따라 계산함
+    version은 노드가 저장될 때마다 1씩 증가하며 낙관적 동시성 검사에 사용됨
+    """
+    __slots__ = ('topic', 'summary', 'parent', 'children', 'memory_indexes', 'version')
+    
+    def __init__(self, topic: str = '', summary: str = '', parent: int = NO_PARENT,
+                 children=(), memory_indexes=(), version: int = 0):
+        self.topic = topic
+        self.summary = summary
+        self.parent = parent
+        self.children = array('I', children)
+        self.memory_indexes = array('I', memory_indexes)
+        self.version = version
+    
+    def copy(self) -> 'Node':
+        return Node(self.topic, self.summary, self.parent, self.children, self.memory_indexes, self.version)
+    
+    @classmethod
+    def from_columns(cls, topic: str, summary: str, parent: int, children: array, memory_indexes: array,
+                     version: int = 0) -> 'Node':
+        """이미 새로 만든 array를 복사 없이 사용하여 노드 생성 (스냅샷 로드용)"""
+        node = cls.__new__(cls)
+        node.topic = topic
+        node.summary = summary
+        node.parent = parent
+        node.children = children
+        node.memory_indexes = memory_indexes
+        node.version = version
+        return node
+
+# 노드 저장소 (트리를 한 번만 로드하여 메모리에서 제공)
+class NodeStore:
+    """
+    계층 메모리 트리를 한 번 로드한 뒤 읽기는 메모리에서 처리하고,
+    변경된 노드를 추적하여 flush 정책에 따라 파일에 반영하는 저장소
+    내부적으로는 정수 ID와 Node 객체를 사용하며, UUID는 외부 핸들로만 사용함
+    저장(체크포인트)은 바이너리 스냅샷으로 하고, JSON 파일은 내보내기/가져오기 형식으로 유지함
+    WAL을 사용하면 모든 변경이 즉시 로그에 추가되고, 체크포인트는 로그가
+    wal_checkpoint_bytes를 넘을 때(와 종료 시) 로그를 스냅샷에 합치는 방식으로 수행됨
+    여러 프로세스가 같은 메모리 디렉터리를 공유할 수 있도록 쓰기는 파일 잠금 안에서 하고,
+    다른 프로세스가 추가한 WAL 레코드(또는 새 스냅샷)는 쓰기 직전과 refresh() 호출 시(검색/저장 시작)에 반영함
+    로드된 트리의 읽기는 파일 잠금과 파일 상태 확인 없이 메모리에서 처리함
+    (프로세스 간 공유는 WAL 사용 시에만 지원)
+    get()이 반환한 딕셔너리의 version이 저장 시점의 노드 version과 다르면 put()은 저장하지 않고 False를 반환함
+    Args:
+        file_path: 계층 메모리 JSON 파일 경로
+        flush_policy: turn (턴마다), interval (N ms마다), exit (종료 시) - WAL 미사용 시 체크포인트 시점
+        flush_interval_ms: interval 정책의 저장 주기
+        snapshot_path: 바이너리 스냅샷 경로 (기본값: JSON 경로의 확장자를 .snap으로 변경)
+        wal_enabled: write-ahead log 사용 여부
+        wal_checkpoint_bytes: 체크포인트를 수행할 WAL 크기
+    """
+    def __init__(self, file_path: str = 'memory/hierarchical_memory.json',
+                 flush_policy: str = 'turn', flush_interval_ms: int = 1000,
+                 snapshot_path: str = None, wal_enabled: bool = True,
+                 wal_checkpoint_bytes: int = 4 * 1024 * 1024):
+        self.file_path = file_path
+        self.snapshot_path = snapshot_path or os.path.splitext(file_path)[0] + '.snap'
+        self.wal_path = os.path.splitext(self.snapshot_path)[0] + '.wal'
+        self.wal_enabled = wal_enabled
+        self.wal_checkpoint_bytes = wal_checkpoint_bytes
+        self._wal_fd = None
+        self._wal_size = 0
+        self.flush_policy = flush_policy
+        self.flush_interval_ms = flush_interval_ms
+        self._nodes = None  # 정수 ID -> Node (없는 노드는 None)
+        self._uuids = []  # 정수 ID -> UUID
+        self._ids = {}  # UUID -> 정수 ID
+        self._size = 0
+        self._root_children = {}  # ROOT 직속 자식 정수 ID (삽입 순서를 유지하는 집합)
+        self._dirty = set()
+        self._last_flush = time.time()
+        self._txn_undo = None  # 트랜잭션 중 변경 전 노드 (None이면 트랜잭션 아님)
+        self._snapshot_stat = None  # 마지막으로 읽거나 쓴 스냅샷의 (inode, mtime, 크기)
+        self._lock = get_file_lock(os.path.join(os.path.dirname(file_path) or '.', '.lock'))
+    
+    def _intern(self, node_id: str) -> int:
+        """UUID에 대응하는 정수 ID 반환 (처음 보는 UUID면 새로 할당)"""
+        index = self._ids.get(node_id)
+        if index is None:
+            index = len(self._uuids)
+            self._ids[node_id] = index
+            self._uuids.append(node_id)
+            self._nodes.append(None)
+        return index
+    
+    def _snapshot_identity(self):
+        try:
+            st = os.stat(self.snapshot_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def _ensure_loaded(self):
+        if self._nodes is not None:
+            self._refresh()
+            return
+        # 스냅샷이 있으면 스냅샷을 사용하고(읽을 수 없으면 SnapshotError), 없으면(이전 버전 데이터) JSON을 가져와 스냅샷 생성
+        if os.path.exists(self.snapshot_path):
+            self._load_snapshot()
+            debug_print(f"NodeStore loaded from snapshot ({self._size} nodes)")
+        else:
+            data = load_json(self.file_path, {})
+            self._load_dict(data if isinstance(data, dict) else {})
+            debug_print(f"NodeStore loaded from JSON ({self._size} nodes)")
+            if self._size > 0:
+                self.write_snapshot()
+        
+        self._snapshot_stat = self._snapshot_identity()
+        
+        # 마지막 체크포인트 이후의 변경을 WAL에서 재생
+        self._wal_size = 0
+        self._replay_wal()
+    
+    def _refresh(self):
+        """다른 프로세스의 체크포인트나 WAL 추가를 반영 (파일 잠금 안에서 호출)"""
+        if self._txn_undo is not None:
+            return
+        if self._snapshot_identity() != self._snapshot_stat:
+            if self.wal_enabled or not self._dirty:
+                debug_print("NodeStore snapshot changed by another process, reloading")
+                self._nodes = None
+                self._dirty.clear()
+                self._ensure_loaded()
+            return
+        if self.wal_enabled:
+            wal_size = os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+            if wal_size != self._wal_size:
+                self._replay_wal()
+    
+    def _replay_wal(self):
+        """마지막으로 적용한 위치부터 WAL 레코드를 순서대로 적용하고, 중단된 쓰기로 남은 손상된 꼬리는 잘라냄"""
+        if not os.path.exists(self.wal_path):
+            return
+        start = self._wal_size
+        with open(self.wal_path, 'rb') as f:
+            f.seek(start)
+            raw = f.read()
+        
+        offset = applied = 0
+        header_size = WAL_RECORD_HEADER.size
+        while offset + header_size <= len(raw):
+            length, crc = WAL_RECORD_HEADER.unpack_from(raw, offset)
+            payload = raw[offset + header_size:offset + header_size + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            for node_id, node_data in json.loads(payload.decode('utf-8')):
+                index = self._intern(node_id)
+                self._set_node(index, self._from_dict(node_data))
+                self._dirty.add(index)
+            offset += header_size + length
+            applied += 1
+        
+        if offset != len(raw):
+            debug_print(f"Truncating incomplete WAL record in {self.wal_path}")
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(start + offset)
+        self._wal_size = start + offset
+        if applied:
+            debug_print(f"NodeStore replayed {applied} WAL records")
+    
+    def _wal_append(self, indexes):
+        """노드들의 현재 상태를 WAL 레코드 하나로 추가 (프로세스가 죽어도 커널 버퍼에 남음)"""
+        entries = [[self._uuids[index], self._to_dict(index)]
+                   for index in indexes if self._nodes[index] is not None]
+        if not entries:
+            return
+        payload = json.dumps(entries, ensure_ascii=False).encode('utf-8')
+        if self._wal_fd is None:
+            os.makedirs(os.path.dirname(self.wal_path) or '.', exist_ok=True)
+            self._wal_fd = os.open(self.wal_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        record = WAL_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        os.write(self._wal_fd, record)
+        self._wal_size += len(record)
+    
+    def sync_wal(self):
+        """WAL을 디스크에 fsync"""
+        with self._lock:
+            if self._wal_fd is not None:
+                os.fsync(self._wal_fd)
+    
+    def checkpoint(self) -> bool:
+        """스냅샷을 저장한 뒤 WAL을 비움 (WAL 재생은 멱등이므로 중간에 중단되어도 안전)"""
+        with self._lock:
+            if self._nodes is None:
+                return True
+            if not self.write_snapshot():
+                return False
+            if os.path.exists(self.wal_path):
+                with open(self.wal_path, 'r+b') as f:
+                    f.truncate(0)
+                    os.fsync(f.fileno())
+                self._wal_size = 0
+            debug_print(f"NodeStore checkpoint ({self._size} nodes)")
+            return True
+    
+    def _load_snapshot(self):
+        """바이너리 스냅샷 로드 (손상되었거나 읽을 수 없는 형식이면 SnapshotError)"""
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                raw = f.read()
+            magic, version = SNAPSHOT_HEADER.unpack_from(raw)
+        except Exception as e:
+            raise SnapshotError(f"{self.snapshot_path}: {e}") from e
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"{self.snapshot_path}: unknown snapshot format (version {version})")
+        try:
+            uuids, present, topics, summaries, parents, versions, \
+                child_counts, children, memory_counts, memory_indexes = self._decode_columns(raw)
+            if not (len(uuids) == len(present) == len(topics) == len(summaries) == len(parents)
+                    == len(versions) == len(child_counts) == len(memory_counts)
+                    and sum(child_counts) == len(children) and sum(memory_counts) == len(memory_indexes)):
+                raise ValueError("column lengths do not match")
+        except Exception as e:
+            raise SnapshotError(f"{self.snapshot_path}: corrupt snapshot: {e}") from e
+        
+        from_columns = Node.from_columns
+        nodes = []
+        size = 0
+        child_pos = memory_pos = 0
+        for index, is_present in enumerate(present):
+            child_end = child_pos + child_counts[index]
+            memory_end = memory_pos + memory_counts[index]
+            if is_present:
+                nodes.append(from_columns(topics[index], summaries[index], parents[index],
+                                          children[child_pos:child_end], memory_indexes[memory_pos:memory_end],
+                                          versions[index]))
+                size += 1
+            else:
+                nodes.append(None)
+            child_pos, memory_pos = child_end, memory_end
+        
+        self._nodes, self._uuids = nodes, list(uuids)
+        self._ids = dict(zip(self._uuids, range(len(self._uuids))))
+        self._size = size
+        self._root_children = {
+            index: None for index, node in enumerate(nodes)
+            if node is not None and node.parent == NO_PARENT
+        }
+    
+    def _decode_columns(self, raw: bytes) -> tuple:
+        """crc32 확인 후 길이가 붙은 열 10개 (문자열 열은 JSON, 숫자 열은 리틀 엔디언)"""
+        offset = SNAPSHOT_HEADER.size
+        (crc,) = SNAPSHOT_CRC.unpack_from(raw, offset)
+        offset += SNAPSHOT_CRC.size
+        if zlib.crc32(raw[offset:]) != crc:
+            raise ValueError("checksum mismatch")
+        sections = []
+        while offset < len(raw):
+            (length,) = SNAPSHOT_SECTION.unpack_from(raw, offset)
+            offset += SNAPSHOT_SECTION.size
+            sections.append(raw[offset:offset + length])
+            offset += length
+        if len(sections) != 10 or offset != len(raw):
+            raise ValueError("truncated snapshot")
+        uuids, present, topics, summaries = (json.loads(sections[0].decode('utf-8')), sections[1],
+                                             json.loads(sections[2].decode('utf-8')), json.loads(sections[3].decode('utf-8')))
+        return (uuids, present, topics, summaries, unpack_array('q', sections[4]), unpack_array('I', sections[5]),
+                *(unpack_array('I', section) for section in sections[6:]))
+    
+    def write_snapshot(self) -> bool:
+        """현재 트리를 바이너리 스냅샷으로 저장 (열 단위, 길이가 붙은 JSON/리틀 엔디언 배열 + crc32)"""
+        with self._lock:
+            self._ensure_loaded()
+            present = bytearray(len(self._nodes))
+            topics, summaries = [], []
+            parents, versions = array('q'), array('I')
+            child_counts, children = array('I'), array('I')
+            memory_counts, memory_indexes = array('I'), array('I')
+            for index, node in enumerate(self._nodes):
+                if node is None:
+                    topics.append('')
+                    summaries.append('')
+                    parents.append(NO_PARENT)
+                    versions.append(0)
+                    child_counts.append(0)
+                    memory_counts.append(0)
+                    continue
+                present[index] = 1
+                topics.append(node.topic)
+                summaries.append(node.summary)
+                parents.append(node.parent)
+                versions.append(node.version)
+                child_counts.append(len(node.children))
+                children.extend(node.children)
+                memory_counts.append(len(node.memory_indexes))
+                memory_indexes.extend(node.memory_indexes)
+            
+            sections = [
+                json.dumps(self._uuids).encode('utf-8'), bytes(present),
+                json.dumps(topics, ensure_ascii=False).encode('utf-8'),
+                json.dumps(summaries, ensure_ascii=False).encode('utf-8'),
+                pack_array(parents), pack_array(versions), pack_array(child_counts), pack_array(children),
+                pack_array(memory_counts), pack_array(memory_indexes)
+            ]
+            body = b''.join(SNAPSHOT_SECTION.pack(len(section)) + section for section in sections)
+            header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION) + SNAPSHOT_CRC.pack(zlib.crc32(body))
+            if not save_bytes(self.snapshot_path, header + body):
+                return False
+            self._snapshot_stat = self._snapshot_identity()
+            return True
+    
+    def _load_dict(self, data: dict):
+        self._nodes, self._uuids, self._ids = [], [], {}
+        for node_id in data:
+            self._intern(node_id)
+        for node_id, node_data in data.items():
+            self._nodes[self._ids[node_id]] = self._from_dict(node_data)
+        self._size = len(data)
+        self._root_children = {
+            index: None for index, node in enumerate(self._nodes)
+            if node is not None and node.parent == NO_PARENT
+        }
+    
+    def _from_dict(self, node_data: dict) -> Node:
+        parent_id = node_data.get('direct_parent_id')
+        return Node(
+            topic=node_data.get('topic', ''),
+            summary=node_data.get('summary', ''),
+            parent=self._intern(parent_id) if parent_id is not None else NO_PARENT,
+            children=[self._intern(child_id) for child_id in node_data.get('children_ids', [])],
+            memory_indexes=node_data.get('all_memory_indexes', []),
+            version=node_data.get('version', 0)
+        )
+    
+    def _ancestors(self, index: int) -> list:
+        """ROOT 쪽부터 순서대로 조상 정수 ID 목록 반환"""
+        path = []
+        parent = self._nodes[index].parent
+        while parent != NO_PARENT and len(path) < len(self._nodes):
+            path.append(parent)
+            node = self._nodes[parent]
+            if node is None:
+                break
+            parent = node.parent
+        path.reverse()
+        return path
+    
+    def _to_dict(self, index: int) -> dict:
+        node = self._nodes[index]
+        uuids = self._uuids
+        return {
+            "node_id": uuids[index],
+            "topic": node.topic,
+            "summary": node.summary,
+            "direct_parent_id": uuids[node.parent] if node.parent != NO_PARENT else None,
+            "all_parent_ids": [uuids[i] for i in self._ancestors(index)],
+            "children_ids": [uuids[i] for i in node.children],
+            "all_memory_indexes": node.memory_indexes.tolist(),
+            "version": node.version
+        }
+    
+    def _set_node(self, index: int, node):
+        """노드 교체와 함께 크기와 ROOT 자식 인덱스를 갱신"""
+        if self._nodes[index] is None and node is not None:
+            self._size += 1
+        elif self._nodes[index] is not None and node is None:
+            self._size -= 1
+        self._nodes[index] = node
+        if node is not None and node.parent == NO_PARENT:
+            self._root_children.setdefault(index, None)
+        else:
+            self._root_children.pop(index, None)
+    
+    @contextmanager
+    def _reading(self):
+        """
+        읽기 잠금: 트리가 로드되어 있으면 스레드 잠금만 사용하고 다른 프로세스의 변경 확인은 생략
+        (아직 로드되지 않았으면 파일 잠금 안에서 로드)
+        """
+        if self._nodes is not None:
+            with self._lock.thread_lock:
+                if self._nodes is not None:
+                    yield
+                    return
+        with self._lock:
+            self._ensure_loaded()
+            yield
+    
+    def refresh(self):
+        """다른 프로세스의 체크포인트나 WAL 추가를 반영 (검색이나 저장 같은 작업을 시작할 때 한 번 호출)"""
+        with self._lock:
+            self._ensure_loaded()
+    
+    def get(self, node_id: str):
+        with self._reading():
+            index = self._ids.get(node_id)
+            if index is None or self._nodes[index] is None:
+                return None
+            return self._to_dict(index)
+    
+    def put(self, node_id: str, node_data: dict) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            index = self._intern(node_id)
+            previous = self._nodes[index]
+            
+            # 낙관적 동시성 검사: 읽은 뒤 다른 곳에서 저장된 노드는 덮어쓰지 않음
+            expected = node_data.get('version')
+            if previous is not None and expected is not None and expected != previous.version:
+                debug_print(f"NodeStore version conflict for {node_id} (expected {expected}, current {previous.version})")
+                return False
+            
+            if self._txn_undo is not None and index not in self._txn_undo:
+                self._txn_undo[index] = previous.copy() if previous is not None else None
+            node = self._from_dict(node_data)
+            node.version = previous.version + 1 if previous is not None else 1
+            self._set_node(index, node)
+            self._dirty.add(index)
+            if self._txn_undo is None:
+                if self.wal_enabled:
+                    self._wal_append([index])
+                elif self.flush_policy == 'interval':
+                    return self.maybe_flush()
+            return True
+    
+    @contextmanager
+    def transaction(self):
+        """
+        여러 노드 변경을 하나의 단위로 묶음
+        블록이 정상 종료되면 한 번의 원자적 쓰기(WAL 레코드 하나 또는 스냅샷)로 반영하고 (exit 정책 제외),
+        예외가 발생하면 블록 안에서 변경한 노드를 모두 되돌림. 중첩 시 가장 바깥 블록 기준
+        """
+        with self._lock:
+            self._ensure_loaded()
+            outermost = self._txn_undo is None
+            if outermost:
+                self._txn_undo = {}
+            try:
+                yield self
+            except BaseException:
+                if outermost:
+                    for index, previous in self._txn_undo.items():
+                        self._set_node(index, previous)
+                    debug_print(f"NodeStore transaction rolled back ({len(self._txn_undo)} nodes)")
+                    self._txn_undo = None
+                raise
+            if outermost:
+                touched = list(self._txn_undo)
+                self._txn_undo = None
+                if self.wal_enabled:
+                    self._wal_append(touched)
+                elif self.flush_policy != 'exit':
+                    self.flush()
+    
+    def node_ids(self) -> list:
+        with self._reading():
+            return [self._uuids[index] for index, node in enumerate(self._nodes) if node is not None]
+    
+    def root_children_ids(self) -> list:
+        """ROOT 직속 자식 ID 목록 (전체 스캔 없이 유지되는 인덱스에서 반환)"""
+        with self._reading():
+            return [self._uuids[index] for index in self._root_children]
+    
+    def __len__(self):
+        with self._reading():
+            return self._size
+    
+    def export_dict(self) -> dict:
+        """hierarchical_memory.json 형식(UUID 키 딕셔너리)으로 전체 트리 반환"""
+        with self._lock:
+            self._ensure_loaded()
+            return {self._uuids[index]: self._to_dict(index)
+                    for index, node in enumerate(self._nodes) if node is not None}
+    
+    def is_dirty(self) -> bool:
+        return bool(self._dirty)
+    
+    def export_json(self, file_path: str = None) -> bool:
+        """트리를 hierarchical_memory.json 형식으로 내보내기"""
+        return save_json(file_path or self.file_path, self.export_dict(), backup=True)
+    
+    def import_json(self, file_path: str = None) -> bool:
+        """hierarchical_memory.json 형식 파일을 가져와 현재 트리를 대체하고 스냅샷 저장"""
+        data = load_json(file_path or self.file_path, None)
+        if not isinstance(data, dict):
+            debug_print(f"ERROR: {file_path or self.file_path} is not a hierarchical memory JSON")
+            return False
+        with self._lock:
+            self._load_dict(data)
+            self._dirty.clear()
+            # 가져온 트리가 기존 스냅샷과 WAL을 대체하므로 (읽을 수 없는 스냅샷도) 다시 읽지 않음
+            self._snapshot_stat = self._snapshot_identity()
+            self._wal_size = os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+            return self.checkpoint()
+    
+    def flush(self) -> bool:
+        """변경된 노드가 있으면 전체 트리를 스냅샷으로 저장 (체크포인트)"""
+        with self._lock:
+            if self._nodes is None or not self._dirty:
+                return True
+            dirty_count = len(self._dirty)
+            if not self.checkpoint():
+                debug_print(f"NodeStore flush failed ({dirty_count} dirty nodes)")
+                return False
+            self._dirty.clear()
+            self._last_flush = time.time()
+            debug_print(f"NodeStore flushed ({dirty_count} dirty nodes)")
+            return True
+    
+    def maybe_flush(self) -> bool:
+        """interval 정책에서 주기가 지났으면 저장"""
+        elapsed_ms = (time.time() - self._last_flush) * 1000
+        if elapsed_ms >= self.flush_interval_ms:
+            return self.flush()
+        return True
+    
+    def end_turn(self) -> bool:
+        """대화 한 턴 종료 시 호출, 정책에 따라 저장"""
+        if self.wal_enabled:
+            self.sync_wal()
+            if self._wal_size >= self.wal_checkpoint_bytes:
+                return self.flush()
+            return True
+        if self.flush_policy == 'turn':
+            return self.flush()
+        if self.flush_policy == 'interval':
+            return self.maybe_flush()
+        return True
+    
+    def close(self):
+        """종료 시 호출: 남은 변경을 저장하고 설정에 따라 JSON으로 내보냄"""
+        with self._lock:
+            if self._nodes is None:
+                return
+            self.flush()
+            if config.JSON_EXPORT_ON_EXIT:
+                self.export_json()
+            if self._wal_fd is not None:
+                os.close(self._wal_fd)
+                self._wal_fd = None
+    
+    def reload(self):
+        """저장하지 않은 변경을 버리고 파일에서 다시 로드"""
+        with self._lock:
+            self._nodes = None
+            self._root_children = {}
+            self._dirty.clear()
+
+_node_store = None
+
+def get_node_store():
+    """프로세스 전역 노드 저장소 반환 (최초 호출 시 STORAGE_BACKEND에 따라 생성)"""
+    global _node_store
+    if _node_store is None:
+        if config.STORAGE_BACKEND == 'sqlite':
+            from memory_sqlite import SQLiteNodeStore
+            _node_store = SQLiteNodeStore(get_sqlite_database())
+        else:
+            _node_store = NodeStore(
+                flush_policy=config.FLUSH_POLICY,
+                flush_interval_ms=config.FLUSH_INTERVAL_MS,
+                wal_enabled=config.WAL_ENABLED,
+                wal_checkpoint_bytes=config.WAL_CHECKPOINT_BYTES
+            )
+            atexit.register(_node_store.close)
+    return _node_store
+
+def transaction():
+    """
+    노드 변경을 원자적으로 묶는 컨텍스트 매니저
+    예: with transaction(): save_node_data(...); save_node_data(...)
+    """
+    return get_node_store().transaction()
+
+def refresh_node_store():
+    """다른 프로세스가 저장한 노드 변경을 반영 (트리 검색/저장을 시작할 때 호출)"""
+    try:
+        get_node_store().refresh()
+    except Exception as e:
+        debug_print(f"Error refreshing node store: {e}")
+
+def end_turn() -> bool:
+    """대화 턴 종료를 저장소에 알림"""
+    return get_node_store().end_turn()
+
+# 트리 JSON 내보내기/가져오기
+def export_tree_json(file_path: str = 'memory/hierarchical_memory.json') -> bool:
+    """현재 트리를 hierarchical_memory.json 형식으로 내보내기"""
+    try:
+        return get_node_store().export_json(file_path)
+    except Exception as e:
+        debug_print(f"Error exporting tree to {file_path}: {e}")
+        return False
+
+def import_tree_json(file_path: str = 'memory/hierarchical_memory.json') -> bool:
+    """hierarchical_memory.json 형식 파일로 현재 트리를 대체"""
+    try:
+        return get_node_store().import_json(file_path)
+    except Exception as e:
+        debug_print(f"Error importing tree from {file_path}: {e}")
+        return False
+
+# ROOT 노드의 자식 ID들 조회
+def get_root_children_ids() -> list:
+    """ROOT 노드의 직접 자식 ID들 반환"""
+    try:
+        return get_node_store().root_children_ids()
+        
+    except Exception as e:
+        debug_print(f"Error getting ROOT children: {e}")
+        return []
+
 # 노드 데이터 조회
 def get_node_data(node_id: str):
     try:
-        hierarchical_memory = load_json('memory/hierarchical_memory.json', {})
-        return hierarchical_memory.get(node_id, None)
+        return get_node_store().get(node_id)
         
     except Exception as e:
         debug_print(f"Error getting node data for {node_id}: {e}")
         return None
 
+# 노드 변경 알림
+_node_listeners = []
+
+def add_node_listener(callback):
+    """save_node_data로 노드가 저장될 때마다 callback(node_id, node_data)를 호출하도록 등록"""
+    if callback not in _node_listeners:
+        _node_listeners.append(callback)
+
 # 노드 데이터 저장
 def save_node_data(node_id: str, node_data: dict) -> bool:
     try:
-        # 기존 계층 메모리 로드
-        hierarchical_memory = load_json('memory/hierarchical_memory.json', {})
-        
-        # 노드 데이터 업데이트
-        hierarchical_memory[node_id] = node_data
-        
-        # 파일 저장
-        success = save_json('memory/hierarchical_memory.json', hierarchical_memory)
+        success = get_node_store().put(node_id, node_data)
         if success:
             debug_print(f"Node data saved for {node_id}")
+            for callback in _node_listeners:
+                callback(node_id, node_data)
         else:
             debug_print(f"Failed to save node data for {node_id}")
         
@@ -147,21 +1160,23 @@ def create_new_node(topic: str, summary: str, parent_id: str = None, memory_inde
             "all_memory_indexes": memory_indexes if memory_indexes else []
         }
         
-        # 노드 저장
-        if save_node_data(new_node_id, node_data):
+        # 노드 저장 (새 노드와 부모의 자식 목록을 함께 반영, 하나라도 실패하면 예외로 전체를 되돌림)
+        with transaction():
+            if not save_node_data(new_node_id, node_data):
+                raise NodeSaveError(f"failed to save new node {new_node_id}")
+            
             # 부모 노드에 자식으로 추가
             if parent_id:
                 parent_data = get_node_data(parent_id)
-                if parent_data:
-                    parent_data['children_ids'].append(new_node_id)
-                    save_node_data(parent_id, parent_data)
-                    debug_print(f"Added {new_node_id} as child to {parent_id}")
-            
-            debug_print(f"New node created: {new_node_id} - {topic}")
-            return new_node_id
-        else:
-            debug_print(f"Failed to create new node: {topic}")
-            return None
+                if not parent_data:
+                    raise NodeSaveError(f"parent node {parent_id} not found")
+                parent_data['children_ids'].append(new_node_id)
+                if not save_node_data(parent_id, parent_data):
+                    raise NodeSaveError(f"failed to link {new_node_id} to parent {parent_id}")
+                debug_print(f"Added {new_node_id} as child to {parent_id}")
+        
+        debug_print(f"New node created: {new_node_id} - {topic}")
+        return new_node_id
             
     except Exception as e:
         debug_print(f"Error creating new node {topic}: {e}")
@@ -175,20 +1190,23 @@ def validate_data_structure() -> bool:
         bool: 검증 성공 여부
     """
     try:
-        # all_memory.json 검증
-        all_memory = load_json('memory/all_memory.json', [])
+        # all_memory 로그 검증
+        all_memory = load_all_memory()
         if not isinstance(all_memory, list):
-            debug_print("ERROR: all_memory.json should be a list")
+            debug_print("ERROR: all_memory should be a list")
             return False
         
-        # hierarchical_memory.json 검증
-        hierarchical_memory = load_json('memory/hierarchical_memory.json', {})
-        if not isinstance(hierarchical_memory, dict):
-            debug_print("ERROR: hierarchical_memory.json should be a dictionary")
-            return False
+        # hierarchical_memory.json 검증 (JSON 백엔드)
+        if config.STORAGE_BACKEND == 'json':
+            hierarchical_memory = load_json('memory/hierarchical_memory.json', {})
+            if not isinstance(hierarchical_memory, dict):
+                debug_print("ERROR: hierarchical_memory.json should be a dictionary")
+                return False
         
-        # 노드 구조 검증
-        for node_id, node_data in hierarchical_memory.items():
+        # 노드 구조 검증 (아직 저장되지 않은 변경까지 포함하도록 NodeStore 기준)
+        store = get_node_store()
+        for node_id in store.node_ids():
+            node_data = store.get(node_id)
             required_fields = ['node_id', 'topic', 'summary', 'direct_parent_id', 
                              'all_parent_ids', 'children_ids', 'all_memory_indexes']
             for field in required_fields:
@@ -206,17 +1224,28 @@ def validate_data_structure() -> bool:
 def initialize_json_files():
     """초기 JSON 파일들을 생성"""
     try:
-        # all_memory.json 초기화
-        if not os.path.exists('memory/all_memory.json'):
-            save_json('memory/all_memory.json', [])
-            debug_print("Created all_memory.json")
+        if config.STORAGE_BACKEND == 'sqlite':
+            # SQLite 데이터베이스 초기화 (처음 생성 시 기존 JSON 데이터를 가져옴)
+            get_sqlite_database().connect()
+            return True
+        
+        # all_memory 로그 초기화 (기존 all_memory.json이 있으면 마이그레이션)
+        get_conversation_log()._ensure_open()
         
-        # hierarchical_memory.json 초기화
-        if not os.path.exists('memory/hierarchical_memory.json'):
-            save_json('memory/hierarchical_memory.json', {})
+        # hierarchical_memory.json 초기화 (스냅샷만 있는 경우는 제외)
+        store = get_node_store()
+        if not os.path.exists(store.file_path) and not os.path.exists(store.snapshot_path):
+            save_json(store.file_path, {})
             debug_print("Created hierarchical_memory.json")
         
+        # 트리를 미리 로드하여 읽을 수 없는 스냅샷을 시작 시 알림
+        len(store)
         return True
+    
+    except SnapshotError as e:
+        print(f"오류: 트리 스냅샷을 읽을 수 없습니다 ({e})")
+        print("스냅샷을 백업에서 복원하거나 --import-json으로 트리를 가져온 뒤 다시 실행하세요.")
+        return False
         
     except Exception as e:
         debug_print(f"Error initializing JSON files: {e}")
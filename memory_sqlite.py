@@ -0,0 +1,294 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import debug_print
+
+def write_node(conn, node_id: str, node_data: dict, version: int):
+    """노드 행과 자식 간선을 현재 트랜잭션에 기록"""
+    conn.execute(
+        "INSERT INTO nodes (node_id, topic, summary, direct_parent_id, all_parent_ids, all_memory_indexes, version) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        # 기존 행을 갱신하여 rowid(생성 순서)를 유지 (INSERT OR REPLACE는 행을 지우고 다시 넣음)
+        "ON CONFLICT(node_id) DO UPDATE SET topic = excluded.topic, summary = excluded.summary, "
+        "direct_parent_id = excluded.direct_parent_id, all_parent_ids = excluded.all_parent_ids, "
+        "all_memory_indexes = excluded.all_memory_indexes, version = excluded.version",
+        (node_id, node_data.get('topic', ''), node_data.get('summary', ''),
+         node_data.get('direct_parent_id'),
+         json.dumps(node_data.get('all_parent_ids', []), ensure_ascii=False),
+         json.dumps(node_data.get('all_memory_indexes', [])), version)
+    )
+    conn.execute("DELETE FROM edges WHERE parent_id = ?", (node_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO edges (parent_id, child_id, position) VALUES (?, ?, ?)",
+        ((node_id, child_id, position) for position, child_id in enumerate(node_data.get('children_ids', [])))
+    )
+
+# SQLite 데이터베이스 (STORAGE_BACKEND = "sqlite")
+class SQLiteDatabase:
+    """
+    계층 메모리 노드와 대화 기록을 하나의 SQLite 파일(WAL 모드)에 저장하는 연결 관리자
+    nodes: 노드 본문, edges: 부모-자식 관계(순서 포함), conversations: ALL_MEMORY
+    Args:
+        db_path: 데이터베이스 파일 경로
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS nodes (
+        node_id TEXT PRIMARY KEY,
+        topic TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        direct_parent_id TEXT,
+        all_parent_ids TEXT NOT NULL,
+        all_memory_indexes TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_nodes_parent ON nodes(direct_parent_id);
+    CREATE TABLE IF NOT EXISTS edges (
+        parent_id TEXT NOT NULL,
+        child_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (parent_id, child_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_edges_parent ON edges(parent_id, position);
+    CREATE TABLE IF NOT EXISTS conversations (
+        idx INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    """
+    
+    def __init__(self, db_path: str = 'memory/hsms.sqlite3'):
+        self.db_path = db_path
+        self._conn = None
+        self.lock = threading.RLock()
+    
+    def connect(self):
+        if self._conn is not None:
+            return self._conn
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        # 가져올 데이터는 데이터베이스 파일을 만들기 전에 읽음 (읽다가 실패하면 빈 데이터베이스가 남지 않음)
+        legacy = self._load_legacy() if not os.path.exists(self.db_path) else None
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self.SCHEMA)
+        self._conn = conn
+        if legacy is not None:
+            self._import(*legacy)
+        debug_print(f"SQLite backend opened: {self.db_path}")
+        return conn
+    
+    def _load_legacy(self) -> tuple:
+        """
+        같은 메모리 디렉터리의 JSON 백엔드 데이터 (계층 메모리 트리, 대화 목록)
+        트리는 hierarchical_memory.json이 아니라 NodeStore(스냅샷 + WAL)에서 읽으므로
+        비정상 종료 후나 JSON_EXPORT_ON_EXIT가 꺼져 있어도 마지막 상태를 가져옴
+        """
+        from memory import NodeStore, ConversationLog
+        
+        memory_dir = os.path.dirname(self.db_path) or '.'
+        store = NodeStore(file_path=os.path.join(memory_dir, 'hierarchical_memory.json'), wal_enabled=False)
+        hierarchical_memory = store.export_dict()
+        log_dir = os.path.join(memory_dir, 'all_memory_log')
+        legacy_path = os.path.join(memory_dir, 'all_memory.json')
+        conversations = ConversationLog(dir_path=log_dir, legacy_path=legacy_path).load_all() \
+            if os.path.isdir(log_dir) or os.path.exists(legacy_path) else []
+        return hierarchical_memory, conversations
+    
+    def _import(self, hierarchical_memory: dict, conversations: list):
+        """JSON 백엔드 데이터를 새 데이터베이스로 1회 가져옴"""
+        if not hierarchical_memory and not conversations:
+            return
+        
+        with self.lock:
+            self._conn.execute("BEGIN")
+            try:
+                for node_id, node_data in hierarchical_memory.items():
+                    write_node(self._conn, node_id, node_data, node_data.get('version', 0))
+                self._conn.executemany(
+                    "INSERT INTO conversations (idx, data) VALUES (?, ?)",
+                    ((i, json.dumps(c, ensure_ascii=False)) for i, c in enumerate(conversations))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        debug_print(f"Imported {len(hierarchical_memory)} nodes and {len(conversations)} conversations into SQLite")
+    
+    def flush(self) -> bool:
+        """WAL 체크포인트 수행"""
+        with self.lock:
+            if self._conn is not None:
+                self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            return True
+    
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# SQLite 노드 저장소
+class SQLiteNodeStore:
+    """NodeStore와 같은 인터페이스로 nodes/edges 테이블을 사용하는 노드 저장소"""
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+    
+    def get(self, node_id: str):
+        with self.db.lock:
+            conn = self.db.connect()
+            row = conn.execute(
+                "SELECT node_id, topic, summary, direct_parent_id, all_parent_ids, all_memory_indexes, version "
+                "FROM nodes WHERE node_id = ?", (node_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            children = [r[0] for r in conn.execute(
+                "SELECT child_id FROM edges WHERE parent_id = ? ORDER BY position", (node_id,)
+            )]
+            return {
+                "node_id": row[0],
+                "topic": row[1],
+                "summary": row[2],
+                "direct_parent_id": row[3],
+                "all_parent_ids": json.loads(row[4]),
+                "children_ids": children,
+                "all_memory_indexes": json.loads(row[5]),
+                "version": row[6]
+            }
+    
+    def put(self, node_id: str, node_data: dict) -> bool:
+        """
+        노드 저장 (저장할 때마다 version 1 증가)
+        get()이 반환한 딕셔너리의 version이 현재 행의 version과 다르면 저장하지 않고 False를 반환함
+        """
+        with self.db.lock:
+            conn = self.db.connect()
+            if conn.in_transaction:
+                return self._write(conn, node_id, node_data)
+            with self.transaction():
+                return self._write(conn, node_id, node_data)
+    
+    def _write(self, conn, node_id: str, node_data: dict) -> bool:
+        row = conn.execute("SELECT version FROM nodes WHERE node_id = ?", (node_id,)).fetchone()
+        expected = node_data.get('version')
+        if row is not None and expected is not None and expected != row[0]:
+            debug_print(f"SQLite version conflict for {node_id} (expected {expected}, current {row[0]})")
+            return False
+        write_node(conn, node_id, node_data, row[0] + 1 if row is not None else 1)
+        return True
+    
+    @contextmanager
+    def transaction(self):
+        """NodeStore.transaction과 동일: 블록 전체를 하나의 SQLite 트랜잭션으로 커밋/롤백"""
+        with self.db.lock:
+            conn = self.db.connect()
+            outermost = not conn.in_transaction
+            if outermost:
+                # 쓰기 잠금을 처음부터 잡아 version 확인과 기록 사이에 다른 프로세스가 끼어들지 않게 함
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+            except BaseException:
+                if outermost:
+                    conn.execute("ROLLBACK")
+                    debug_print("SQLite transaction rolled back")
+                raise
+            if outermost:
+                conn.execute("COMMIT")
+    
+    def node_ids(self) -> list:
+        with self.db.lock:
+            return [r[0] for r in self.db.connect().execute("SELECT node_id FROM nodes ORDER BY rowid")]
+    
+    def root_children_ids(self) -> list:
+        """ROOT 직속 자식 ID 목록 (direct_parent_id 인덱스 사용)"""
+        with self.db.lock:
+            return [r[0] for r in self.db.connect().execute(
+                "SELECT node_id FROM nodes WHERE direct_parent_id IS NULL ORDER BY rowid")]
+    
+    def __len__(self):
+        with self.db.lock:
+            return self.db.connect().execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+    
+    def export_dict(self) -> dict:
+        """hierarchical_memory.json 형식(UUID 키 딕셔너리)으로 전체 트리 반환"""
+        with self.db.lock:
+            return {node_id: self.get(node_id) for node_id in self.node_ids()}
+    
+    def export_json(self, file_path: str = 'memory/hierarchical_memory.json') -> bool:
+        from memory import save_json
+        return save_json(file_path, self.export_dict())
+    
+    def import_json(self, file_path: str = 'memory/hierarchical_memory.json') -> bool:
+        """JSON 트리로 nodes/edges 테이블을 대체"""
+        from memory import load_json
+        data = load_json(file_path, None)
+        if not isinstance(data, dict):
+            debug_print(f"ERROR: {file_path} is not a hierarchical memory JSON")
+            return False
+        with self.transaction():
+            conn = self.db.connect()
+            conn.execute("DELETE FROM edges")
+            conn.execute("DELETE FROM nodes")
+            for node_id, node_data in data.items():
+                write_node(conn, node_id, node_data, node_data.get('version', 0))
+        return True
+    
+    def is_dirty(self) -> bool:
+        return False
+    
+    def flush(self) -> bool:
+        """노드 변경은 즉시 커밋되므로 WAL 체크포인트만 수행"""
+        return self.db.flush()
+    
+    def end_turn(self) -> bool:
+        return True
+    
+    def refresh(self):
+        """SQLite는 읽을 때마다 최신 상태이므로 할 일 없음"""
+        pass
+    
+    def reload(self):
+        pass
+
+# SQLite 대화 기록
+class SQLiteConversationLog:
+    """ConversationLog와 같은 인터페이스로 conversations 테이블을 사용하는 대화 기록"""
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+    
+    def __len__(self):
+        with self.db.lock:
+            return self.db.connect().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+    
+    def append(self, conversation: list) -> int:
+        with self.db.lock:
+            conn = self.db.connect()
+            cursor = conn.execute(
+                "INSERT INTO conversations (idx, data) "
+                "VALUES ((SELECT COALESCE(MAX(idx), -1) + 1 FROM conversations), ?)",
+                (json.dumps(conversation, ensure_ascii=False),)
+            )
+            return cursor.lastrowid
+    
+    def get_conversations(self, indexes: list) -> list:
+        with self.db.lock:
+            conn = self.db.connect()
+            wanted = sorted({idx for idx in indexes if isinstance(idx, int) and idx >= 0})
+            found = {}
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for idx, data in conn.execute(
+                        f"SELECT idx, data FROM conversations WHERE idx IN ({placeholders})", chunk):
+                    found[idx] = json.loads(data)
+            return [found.get(idx) for idx in indexes]
+    
+    def get(self, index: int):
+        return self.get_conversations([index])[0]
+    
+    def load_all(self) -> list:
+        with self.db.lock:
+            return [json.loads(r[0]) for r in self.db.connect().execute(
+                "SELECT data FROM conversations ORDER BY idx")]
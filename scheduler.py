@@ -0,0 +1,417 @@
+import time
+import asyncio
+import weakref
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import config
+from config import CALL_STATS, debug_print
+
+# 토큰 버킷
+class TokenBucket:
+    """
+    capacity만큼 채워져 있다가 초당 refill_rate씩 다시 차는 버킷
+    Args:
+        capacity: 최대 보유량 (분당 한도)
+        refill_rate: 초당 충전량
+    """
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float) -> float:
+        """amount만큼 사용할 수 있을 때까지 남은 시간(초), refill() 이후 호출"""
+        amount = min(amount, self.capacity)  # 한도보다 큰 요청은 버킷이 가득 찼을 때 보냄
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+    
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+# 대략적인 토큰 수 추정 (한국어 위주 텍스트 기준)
+def estimate_tokens(*texts) -> int:
+    return sum(len(text) for text in texts if text) // 2 + 1
+
+# API 키 스케줄러
+class KeyScheduler:
+    """
+    API 키마다 분당 요청 수(RPM)와 분당 토큰 수(TPM) 버킷을 두고,
+    요청마다 여유가 가장 많은 키를 배정하는 스케줄러
+    모든 키가 한도에 도달하면 가장 먼저 여유가 생기는 시점까지 대기하며, 대기 시간은 CALL_STATS에 누적됨
+    키마다 서킷 브레이커를 두어 failure_threshold번 연속 실패한 키는 reset_seconds 동안 배정하지 않고,
+    그 뒤 한 번의 시험 요청이 성공하면 다시 배정함
+    버킷 상태는 스레드 잠금으로만 보호하므로 턴마다 새로 만들어지는 이벤트 루프에서도 그대로 사용할 수 있음
+    Args:
+        keys: API 키 목록
+        rpm_limit: 키 하나당 분당 요청 수
+        tpm_limit: 키 하나당 분당 토큰 수
+        failure_threshold: 서킷을 여는 연속 실패 횟수
+        reset_seconds: 서킷이 열린 뒤 시험 요청을 허용하기까지의 시간
+    """
+    def __init__(self, keys: list, rpm_limit: int, tpm_limit: int,
+                 failure_threshold: int = 3, reset_seconds: float = 30):
+        self.keys = list(keys)
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._requests = {key: TokenBucket(rpm_limit, rpm_limit / 60.0) for key in self.keys}
+        self._tokens = {key: TokenBucket(tpm_limit, tpm_limit / 60.0) for key in self.keys}
+        self._failures = {key: 0 for key in self.keys}  # 연속 실패 횟수
+        self._open_until = {key: 0.0 for key in self.keys}  # 서킷이 열려 있는 시각 (monotonic)
+        self._trial = {}  # 시험 요청이 진행 중인 키 -> 시작 시각 (응답 없이 reset_seconds가 지나면 다시 시험)
+        self._lock = threading.Lock()
+    
+    def try_acquire(self, tokens: int, exclude: str = None):
+        """
+        지금 보낼 수 있는 키 중 여유가 가장 많은 키를 배정 (exclude 키는 제외)
+        Returns:
+            tuple: (배정된 키 또는 None, 키가 없을 때 다음 여유까지의 대기 시간)
+        """
+        with self._lock:
+            now = time.monotonic()
+            best_key, best_headroom = None, -1.0
+            min_wait = float('inf')
+            for key in self.keys:
+                if key == exclude:
+                    continue
+                # 서킷이 열린 키는 제외하고, 시간이 지난 키는 시험 요청 하나만 허용
+                if self._failures[key] >= self.failure_threshold:
+                    if now < self._open_until[key]:
+                        min_wait = min(min_wait, self._open_until[key] - now)
+                        continue
+                    trial_started = self._trial.get(key)
+                    if trial_started is not None and now - trial_started < self.reset_seconds:
+                        min_wait = min(min_wait, trial_started + self.reset_seconds - now)
+                        continue
+                requests, token_bucket = self._requests[key], self._tokens[key]
+                requests.refill(now)
+                token_bucket.refill(now)
+                wait = max(requests.wait_time(1), token_bucket.wait_time(tokens))
+                if wait > 0:
+                    min_wait = min(min_wait, wait)
+                    continue
+                headroom = min(requests.tokens / requests.capacity, token_bucket.tokens / token_bucket.capacity)
+                if headroom > best_headroom:
+                    best_key, best_headroom = key, headroom
+            
+            if best_key is None:
+                return None, min_wait
+            if self._failures[best_key] >= self.failure_threshold:
+                self._trial[best_key] = now
+            self._requests[best_key].take(1)
+            self._tokens[best_key].take(tokens)
+            return best_key, 0.0
+    
+    async def acquire(self, tokens: int) -> str:
+        """여유가 있는 키가 생길 때까지 기다렸다가 키를 배정"""
+        start_time = time.monotonic()
+        queued = False
+        while True:
+            key, wait = self.try_acquire(tokens)
+            if key is not None:
+                break
+            queued = True
+            await asyncio.sleep(wait)
+        
+        if queued:
+            waited = time.monotonic() - start_time
+            CALL_STATS['queued_calls'] += 1
+            CALL_STATS['queue_wait_time'] += waited
+            debug_print(f"API 키 한도 대기 {waited:.2f}초 (키 {key[:4]}****)")
+        return key
+    
+    def record_success(self, key: str):
+        """요청 성공: 연속 실패 횟수를 초기화하고 열린 서킷을 닫음"""
+        with self._lock:
+            if key not in self._failures:
+                return
+            if self._failures[key] >= self.failure_threshold:
+                debug_print(f"API 키 {key[:4]}**** 복구, 배정 재개")
+            self._failures[key] = 0
+            self._trial.pop(key, None)
+    
+    def record_failure(self, key: str, rate_limited: bool = False):
+        """
+        요청 실패: 연속 실패가 기준에 도달하면 서킷을 열어 키를 일시 제외
+        429 응답을 받은 키는 요청 버킷도 비워 한동안 배정되지 않게 함
+        """
+        with self._lock:
+            if key not in self._failures:
+                return
+            if rate_limited:
+                self._requests[key].tokens = 0.0
+            self._failures[key] += 1
+            self._trial.pop(key, None)
+            if self._failures[key] >= self.failure_threshold:
+                self._open_until[key] = time.monotonic() + self.reset_seconds
+                debug_print(f"API 키 {key[:4]}**** 연속 {self._failures[key]}회 실패, {self.reset_seconds}초간 제외")
+    
+    def open_circuits(self) -> list:
+        """현재 배정에서 제외된 키 목록"""
+        with self._lock:
+            now = time.monotonic()
+            return [key for key in self.keys
+                    if self._failures[key] >= self.failure_threshold and now < self._open_until[key]]
+    
+    def headroom(self) -> dict:
+        """키별 남은 (요청 수, 토큰 수)"""
+        with self._lock:
+            now = time.monotonic()
+            result = {}
+            for key in self.keys:
+                self._requests[key].refill(now)
+                self._tokens[key].refill(now)
+                result[key] = (self._requests[key].tokens, self._tokens[key].tokens)
+            return result
+
+_scheduler = None
+
+def get_scheduler():
+    """LOAD_API 키에 대한 프로세스 전역 스케줄러 반환 (키가 없으면 None)"""
+    global _scheduler
+    if _scheduler is None and config.LOAD_API:
+        _scheduler = KeyScheduler(
+            config.LOAD_API, config.API_RPM_LIMIT, config.API_TPM_LIMIT,
+            failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+            reset_seconds=config.CIRCUIT_RESET_SECONDS
+        )
+    return _scheduler
+
+# AI 호출 동시 실행 제한
+class ConcurrencyLimiter:
+    """
+    전체 및 API 키별 동시 실행 수를 제한하는 세마포어 모음
+    asyncio 세마포어는 이벤트 루프에 묶이므로 (main()은 턴마다 새 루프에서 실행됨) 루프별로 따로 만듦
+    Args:
+        max_concurrency: 전체 동시 실행 수
+        max_per_key: API 키 하나당 동시 실행 수
+    """
+    def __init__(self, max_concurrency: int, max_per_key: int):
+        self.max_concurrency = max_concurrency
+        self.max_per_key = max_per_key
+        self._per_loop = weakref.WeakKeyDictionary()  # loop -> (전체 세마포어, {키: 세마포어})
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+    
+    def resize(self, max_concurrency: int, max_per_key: int):
+        """
+        한도 변경 (이후 얻는 슬롯부터 새 한도의 세마포어 사용)
+        이미 슬롯을 가진 호출은 이전 세마포어에 반납하므로 변경 직후 잠시 동안만 두 한도가 겹침
+        """
+        with self._lock:
+            if (max_concurrency, max_per_key) == (self.max_concurrency, self.max_per_key):
+                return
+            self.max_concurrency = max_concurrency
+            self.max_per_key = max_per_key
+            self._per_loop = weakref.WeakKeyDictionary()
+        debug_print(f"AI 동시 실행 한도 변경 (전체 {max_concurrency}, 키당 {max_per_key})")
+    
+    def _semaphores(self, api_key: str):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._per_loop:
+                self._per_loop[loop] = (asyncio.Semaphore(self.max_concurrency), {})
+            global_semaphore, key_semaphores = self._per_loop[loop]
+            if api_key not in key_semaphores:
+                key_semaphores[api_key] = asyncio.Semaphore(self.max_per_key)
+            return global_semaphore, key_semaphores[api_key]
+    
+    @asynccontextmanager
+    async def slot(self, api_key: str):
+        """키 슬롯을 먼저 얻은 뒤 전체 슬롯을 얻음 (바쁜 키를 기다리는 호출이 전체 슬롯을 점유하지 않도록)"""
+        global_semaphore, key_semaphore = self._semaphores(api_key)
+        async with key_semaphore:
+            async with global_semaphore:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+
+# 동일 요청 병합
+class _Flight:
+    """SingleFlight에서 실행 중인 호출 하나 (공유 task, 기다리는 호출 수, 시작 여부)"""
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.started = False
+        self.on_start = []
+    
+    def start(self):
+        self.started = True
+        callbacks, self.on_start = self.on_start, []
+        for callback in callbacks:
+            callback()
+
+class SingleFlight:
+    """
+    같은 키의 요청이 이미 실행 중이면 새로 실행하지 않고 그 결과(또는 예외)를 함께 받음
+    완료된 결과는 보관하지 않으므로 캐시와 달리 오래된 응답을 돌려주지 않음
+    호출은 별도 task로 실행되어 기다리는 호출 중 하나가 취소되어도 나머지는 결과를 받고,
+    기다리는 호출이 모두 취소되면 task도 취소됨
+    task는 이벤트 루프에 묶이므로 루프별로 따로 관리함
+    """
+    def __init__(self):
+        self._per_loop = weakref.WeakKeyDictionary()  # loop -> {키: _Flight}
+        self._lock = threading.Lock()
+    
+    def _calls(self) -> dict:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._per_loop:
+                self._per_loop[loop] = {}
+            return self._per_loop[loop]
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(calls) for calls in self._per_loop.values())
+    
+    async def do(self, key: str, factory, on_start=None):
+        """
+        factory(started)가 만드는 코루틴을 키당 하나만 실행
+        started는 실제 호출을 시작할 때 factory 쪽에서 인자 없이 호출하는 함수 (호출하지 않아도 됨)
+        on_start는 공유 호출이 started를 알렸을 때 인자 없이 호출되고, 이미 시작된 호출에 합류하면 바로 호출됨
+        """
+        calls = self._calls()
+        flight = calls.get(key)
+        if flight is None:
+            flight = _Flight()
+            calls[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(factory(flight.start))
+            flight.task.add_done_callback(lambda task: self._finish(calls, key, flight))
+        else:
+            CALL_STATS['coalesced_calls'] += 1
+        
+        if on_start is not None:
+            if flight.started:
+                on_start()
+            else:
+                flight.on_start.append(on_start)
+        
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 결과를 기다리는 호출이 없으면 공유 호출도 취소 (취소 중인 호출에 새로 합류하지 않도록 키를 먼저 제거)
+                if calls.get(key) is flight:
+                    del calls[key]
+                flight.task.cancel()
+    
+    @staticmethod
+    def _finish(calls: dict, key: str, flight: _Flight):
+        if calls.get(key) is flight:
+            del calls[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # 기다리는 호출이 없어도 "never retrieved" 경고가 나지 않도록 표시
+
+# 헤지 요청
+class Hedger:
+    """
+    호출 종류(task)별 최근 지연 시간을 기록하고, 헤지 요청을 보낼 시점과 예산을 관리
+    Args:
+        percentile: 호출이 최근 지연 시간의 이 백분위수를 넘으면 헤지 (None이면 사용할 때마다 HEDGE_PERCENTILE을 읽음)
+        budget_percent: 헤지 요청 수 상한, 전체 호출 대비 % (None이면 사용할 때마다 HEDGE_BUDGET_PERCENT를 읽음)
+        window: task별로 기억하는 최근 지연 시간 수
+        min_samples: 이보다 기록이 적으면 헤지하지 않음
+    """
+    def __init__(self, percentile: float = None, budget_percent: float = None, window: int = 200, min_samples: int = 20):
+        self._percentile = percentile
+        self._budget_percent = budget_percent
+        self.min_samples = min_samples
+        self._window = window
+        self._latencies = {}  # task -> deque(지연 시간)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+    
+    @property
+    def percentile(self) -> float:
+        return config.HEDGE_PERCENTILE if self._percentile is None else self._percentile
+    
+    @property
+    def budget_percent(self) -> float:
+        return config.HEDGE_BUDGET_PERCENT if self._budget_percent is None else self._budget_percent
+    
+    def record(self, task: str, seconds: float):
+        with self._lock:
+            if task not in self._latencies:
+                self._latencies[task] = deque(maxlen=self._window)
+            self._latencies[task].append(seconds)
+    
+    def delay(self, task: str):
+        """헤지 요청을 보낼 때까지 기다릴 시간 (기록이 부족하면 None)"""
+        percentile = self.percentile
+        with self._lock:
+            latencies = self._latencies.get(task)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+    
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+    
+    def can_hedge(self) -> bool:
+        """헤지 요청을 하나 더 보내도 예산 안인지 여부"""
+        budget_percent = self.budget_percent
+        with self._lock:
+            return self.hedges + 1 <= self.calls * budget_percent / 100
+    
+    def record_hedge(self):
+        with self._lock:
+            self.hedges += 1
+
+_limiter = None
+_executor = None
+_executor_workers = None
+_single_flight = None
+_hedger = None
+
+def get_limiter():
+    """프로세스 전역 동시 실행 제한 반환 (AI_MAX_CONCURRENCY* 설정이 바뀌면 새 한도를 적용)"""
+    global _limiter
+    if _limiter is None:
+        _limiter = ConcurrencyLimiter(config.AI_MAX_CONCURRENCY, config.AI_MAX_CONCURRENCY_PER_KEY)
+    else:
+        _limiter.resize(config.AI_MAX_CONCURRENCY, config.AI_MAX_CONCURRENCY_PER_KEY)
+    return _limiter
+
+def get_executor():
+    """
+    동기 AI 호출 전용 스레드 풀 (기본 executor와 분리하고 동시 실행 수만큼만 스레드 생성)
+    AI_MAX_CONCURRENCY가 바뀌면 새 크기의 풀을 만들고, 이전 풀은 실행 중인 호출이 끝나면 정리됨
+    """
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != config.AI_MAX_CONCURRENCY:
+        previous = _executor
+        _executor_workers = config.AI_MAX_CONCURRENCY
+        _executor = ThreadPoolExecutor(max_workers=_executor_workers, thread_name_prefix='hsms-ai')
+        if previous is not None:
+            previous.shutdown(wait=False)
+    return _executor
+
+def get_single_flight():
+    """프로세스 전역 동일 요청 병합기 반환"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+def get_hedger():
+    """프로세스 전역 헤지 관리자 반환 (백분위수와 예산은 사용할 때마다 설정에서 읽음)"""
+    global _hedger
+    if _hedger is None:
+        _hedger = Hedger()
+    return _hedger
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# config.py는 가져올 때 현재 디렉터리의 config.json을 읽으므로 저장소 루트에서 실행
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+@pytest.fixture
+def node_store(tmp_path, monkeypatch):
+    """임시 디렉터리의 NodeStore를 프로세스 전역 노드 저장소로 사용"""
+    import memory
+    store = memory.NodeStore(file_path=str(tmp_path / 'memory' / 'hierarchical_memory.json'))
+    monkeypatch.setattr(memory, '_node_store', store)
+    yield store
+    store.close()
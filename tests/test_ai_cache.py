@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import config
+import ai_cache
+import ai_func
+import memory
+from ai_cache import SimilarityCache, ResultCache
+from config import CALL_STATS
+from llm_backend import LOCAL_MODEL, get_backend
+
+CAT = {'topic': '고양이 몽이', 'summary': '몽이가 사료를 안 먹음'}
+HIKE = {'topic': '한라산 등산', 'summary': '겨울 한라산 등산 코스'}
+
+@pytest.fixture
+def local_model(monkeypatch):
+    monkeypatch.setattr(config, 'GEMINI_MODEL', LOCAL_MODEL)
+    monkeypatch.setattr(config, 'AI_RESULT_CACHE_ENABLED', False)
+
+# 유사도 캐시
+
+def test_similarity_cache_hits_on_same_content_and_query():
+    cache = SimilarityCache()
+    cache.put('cat', CAT, '몽이  사료', '0.80')
+    assert cache.get('cat', CAT, '몽이 사료') == '0.80'
+    # 같은 내용의 다른 노드도 같은 점수를 사용
+    assert cache.get('other', dict(CAT), 'MONGI') is None
+    assert cache.get('other', dict(CAT), '몽이 사료') == '0.80'
+
+def test_similarity_cache_misses_after_content_change():
+    cache = SimilarityCache()
+    cache.put('cat', CAT, '몽이', '0.80')
+    changed = dict(CAT, summary='몽이가 다시 사료를 먹음')
+    cache.invalidate_node('cat', changed)
+    assert len(cache) == 0
+    assert cache.get('cat', changed, '몽이') is None
+
+def test_similarity_cache_keeps_entries_when_only_children_change():
+    cache = SimilarityCache()
+    cache.put('cat', CAT, '몽이', '0.80')
+    cache.invalidate_node('cat', dict(CAT, children_ids=['x']))
+    assert cache.get('cat', CAT, '몽이') == '0.80'
+
+def test_similarity_cache_evicts_least_recently_used():
+    cache = SimilarityCache(max_entries=2)
+    cache.put('a', CAT, 'q1', '0.1')
+    cache.put('a', CAT, 'q2', '0.2')
+    assert cache.get('a', CAT, 'q1') == '0.1'
+    cache.put('a', CAT, 'q3', '0.3')
+    assert cache.get('a', CAT, 'q2') is None
+    assert cache.get('a', CAT, 'q1') == '0.1'
+
+def test_similarity_cache_persists(tmp_path):
+    path = str(tmp_path / 'similarity_cache.json')
+    cache = SimilarityCache(file_path=path)
+    cache.put('cat', CAT, '몽이', '0.80')
+    assert cache.save()
+    assert SimilarityCache(file_path=path).get('cat', CAT, '몽이') == '0.80'
+
+def test_cached_scores_skip_ai_calls(node_store, local_model, monkeypatch):
+    monkeypatch.setattr(config, 'SIMILARITY_CACHE_ENABLED', True)
+    monkeypatch.setattr(ai_cache, '_similarity_cache', None)
+    node_store.put('cat', CAT)
+    node_store.put('hike', HIKE)
+    
+    first = asyncio.run(ai_func.judgement_similar_multi_AI(['cat', 'hike'], '몽이 사료'))
+    calls = CALL_STATS['total_calls']
+    second = asyncio.run(ai_func.judgement_similar_multi_AI(['cat', 'hike'], '몽이 사료'))
+    assert second == first
+    assert CALL_STATS['total_calls'] == calls
+    
+    # 주제가 바뀐 노드만 다시 평가
+    changed = node_store.get('cat')
+    changed['topic'] = '고양이 몽이 건강'
+    assert memory.save_node_data('cat', changed)
+    asyncio.run(ai_func.judgement_similar_multi_AI(['cat', 'hike'], '몽이 사료'))
+    assert CALL_STATS['total_calls'] == calls + 1
+
+# AI 결과 캐시
+
+def test_result_cache_is_shared_through_disk(tmp_path):
+    path = str(tmp_path / 'ai_result_cache.sqlite3')
+    key = ResultCache.make_key('local', '지침', '프롬프트')
+    first = ResultCache(db_path=path)
+    first.put(key, '응답')
+    second = ResultCache(db_path=path)
+    assert second.get(key) == '응답'
+    assert second.get(ResultCache.make_key('local', '다른 지침', '프롬프트')) is None
+    first.close()
+    second.close()
+
+def test_result_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(ResultCache, 'EVICT_EVERY', 1)
+    cache = ResultCache(db_path=str(tmp_path / 'ai_result_cache.sqlite3'), max_entries=2)
+    cache.put('a', '1')
+    cache.put('b', '2')
+    assert cache.get('a') == '1'
+    cache.put('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert len(cache) == 2
+    cache.close()
+
+def test_summary_and_topic_reuse_cached_results(tmp_path, local_model, monkeypatch):
+    cache = ResultCache(db_path=str(tmp_path / 'ai_result_cache.sqlite3'))
+    monkeypatch.setattr(config, 'AI_RESULT_CACHE_ENABLED', True)
+    monkeypatch.setattr(ai_cache, '_result_cache', cache)
+    backend = get_backend()
+    calls = []
+    generate = backend.generate
+    monkeypatch.setattr(backend, 'generate', lambda *args: calls.append(args[3]) or generate(*args))
+    conversation = [{'role': 'user', 'content': '몽이가 사료를 안 먹어'}]
+    
+    summary = ai_func.summary_AI(conversation, max_length=50)
+    topic = ai_func.topic_generation_AI(summary)
+    assert ai_func.summary_AI(conversation, max_length=50) == summary
+    assert ai_func.topic_generation_AI(summary) == topic
+    assert calls == ['summary', 'topic']
+    # 지침(최대 길이)이 다르면 다른 키
+    ai_func.summary_AI(conversation, max_length=40)
+    assert calls == ['summary', 'topic', 'summary']
+    cache.close()
@@ -0,0 +1,104 @@
+import os
+import json
+
+import memory
+from memory import ConversationLog
+
+def make_log(tmp_path, **kwargs) -> ConversationLog:
+    return ConversationLog(dir_path=str(tmp_path / 'memory' / 'all_memory_log'),
+                           legacy_path=str(tmp_path / 'memory' / 'all_memory.json'), **kwargs)
+
+def conversation(i: int) -> list:
+    return [{'role': 'user', 'content': f'대화 {i}'}, {'role': 'assistant', 'content': f'응답 {i}'}]
+
+def test_log_round_trip_across_segments(tmp_path):
+    log = make_log(tmp_path, max_segment_bytes=200)
+    assert [log.append(conversation(i)) for i in range(10)] == list(range(10))
+    assert len(log._list_segments()) > 1
+    
+    reloaded = make_log(tmp_path, max_segment_bytes=200)
+    assert len(reloaded) == 10
+    assert reloaded.load_all() == [conversation(i) for i in range(10)]
+
+def test_torn_segment_tail_is_truncated(tmp_path):
+    log = make_log(tmp_path)
+    for i in range(3):
+        log.append(conversation(i))
+    segment_path = log._segment_path(0)
+    good_size = os.path.getsize(segment_path)
+    with open(segment_path, 'ab') as f:
+        f.write('[{"role": "user", "content": "중단'.encode('utf-8'))
+    
+    reloaded = make_log(tmp_path)
+    assert len(reloaded) == 3
+    assert os.path.getsize(segment_path) == good_size
+    assert reloaded.append(conversation(3)) == 3
+    assert make_log(tmp_path).load_all() == [conversation(i) for i in range(4)]
+
+def test_legacy_migration(tmp_path):
+    legacy = [conversation(i) for i in range(20)]
+    memory.save_json(str(tmp_path / 'memory' / 'all_memory.json'), legacy)
+    
+    log = make_log(tmp_path, max_segment_bytes=300)
+    assert len(log) == 20
+    assert log.load_all() == legacy
+    assert not os.path.exists(log.legacy_path)
+    assert os.path.exists(f"{log.legacy_path}.migrated")
+
+def test_interrupted_legacy_migration_is_redone(tmp_path):
+    legacy = [conversation(i) for i in range(20)]
+    memory.save_json(str(tmp_path / 'memory' / 'all_memory.json'), legacy)
+    # 중단된 변환이 남긴 임시 디렉터리와, 세그먼트 없이 만들어진 로그 디렉터리
+    log = make_log(tmp_path, max_segment_bytes=300)
+    os.makedirs(f"{log.dir_path}.migrating")
+    with open(os.path.join(f"{log.dir_path}.migrating", 'segment_00000.jsonl'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(legacy[0], ensure_ascii=False) + '\n')
+    os.makedirs(log.dir_path)
+    open(log.index_path, 'wb').close()
+    
+    assert len(log) == 20
+    assert log.load_all() == legacy
+    assert not os.path.exists(f"{log.dir_path}.migrating")
+
+def test_get_conversations_reads_only_requested_indexes(tmp_path):
+    log = make_log(tmp_path, max_segment_bytes=200)
+    for i in range(10):
+        log.append(conversation(i))
+    
+    reloaded = make_log(tmp_path, max_segment_bytes=200)
+    assert reloaded.get_conversations([9, 0, 42, -1, 'x']) == [conversation(9), conversation(0), None, None, None]
+    assert reloaded.get(5) == conversation(5)
+
+def test_missing_index_is_rebuilt(tmp_path):
+    log = make_log(tmp_path, max_segment_bytes=200)
+    for i in range(6):
+        log.append(conversation(i))
+    os.remove(log.index_path)
+    
+    reloaded = make_log(tmp_path, max_segment_bytes=200)
+    assert len(reloaded) == 6
+    assert reloaded.get(4) == conversation(4)
+
+def test_partial_index_record_is_recovered(tmp_path):
+    log = make_log(tmp_path)
+    for i in range(3):
+        log.append(conversation(i))
+    with open(log.index_path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    
+    reloaded = make_log(tmp_path)
+    assert len(reloaded) == 3
+    assert os.path.getsize(log.index_path) == 3 * ConversationLog.INDEX_RECORD.size
+    assert reloaded.get(2) == conversation(2)
+
+def test_segment_written_without_index_record_is_indexed(tmp_path):
+    log = make_log(tmp_path)
+    for i in range(3):
+        log.append(conversation(i))
+    # 세그먼트에는 썼지만 인덱스를 기록하기 전에 중단된 추가
+    with open(log._segment_path(0), 'ab') as f:
+        f.write((json.dumps(conversation(3), ensure_ascii=False) + '\n').encode('utf-8'))
+    
+    reloaded = make_log(tmp_path)
+    assert len(reloaded) == 4
+    assert reloaded.get(3) == conversation(3)
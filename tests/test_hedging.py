@@ -0,0 +1,105 @@
+import time
+import asyncio
+
+import pytest
+
+import config
+import ai_func
+import scheduler
+from config import CALL_STATS
+from llm_backend import LOCAL_MODEL, get_backend
+from scheduler import Hedger, KeyScheduler
+
+@pytest.fixture
+def keyed_backend(monkeypatch):
+    """LOAD_API 키 두 개로 스케줄링되는 로컬 백엔드 (첫 호출만 delays[0]초 걸림)"""
+    monkeypatch.setattr(config, 'GEMINI_MODEL', LOCAL_MODEL)
+    monkeypatch.setattr(config, 'AI_RESULT_CACHE_ENABLED', False)
+    monkeypatch.setattr(config, 'AI_SINGLE_FLIGHT', False)
+    monkeypatch.setattr(config, 'HEDGE_ENABLED', True)
+    monkeypatch.setattr(ai_func, 'LOAD_API', ['key-a', 'key-b'])
+    monkeypatch.setattr(scheduler, '_scheduler', KeyScheduler(['key-a', 'key-b'], rpm_limit=100, tpm_limit=10 ** 6))
+    backend = get_backend()
+    monkeypatch.setattr(backend, 'requires_api_key', True)
+    state = {'delays': [0.5], 'keys': []}
+    generate = backend.generate
+    
+    async def slow_async(prompt, system, api_key=None, task=None):
+        state['keys'].append(api_key)
+        if state['delays']:
+            await asyncio.sleep(state['delays'].pop(0))
+        return generate(prompt, system, api_key, task)
+    
+    monkeypatch.setattr(backend, 'generate_async', slow_async)
+    return state
+
+def test_delay_uses_percentile_after_min_samples():
+    hedger = Hedger(percentile=90, budget_percent=10, min_samples=10)
+    for n in range(9):
+        hedger.record('similarity', n / 100)
+    assert hedger.delay('similarity') is None
+    hedger.record('similarity', 0.09)
+    assert hedger.delay('similarity') == 0.09
+    for _ in range(90):
+        hedger.record('similarity', 0.01)
+    assert hedger.delay('similarity') == 0.01
+    assert hedger.delay('topic') is None
+
+def test_budget_limits_hedges():
+    hedger = Hedger(percentile=90, budget_percent=10)
+    for _ in range(19):
+        hedger.count_call()
+    hedger.record_hedge()
+    assert not hedger.can_hedge()
+    hedger.count_call()
+    assert hedger.can_hedge()
+
+def test_config_is_read_live(monkeypatch):
+    hedger = Hedger()
+    monkeypatch.setattr(config, 'HEDGE_PERCENTILE', 60)
+    monkeypatch.setattr(config, 'HEDGE_BUDGET_PERCENT', 50)
+    assert hedger.percentile == 60
+    assert hedger.budget_percent == 50
+
+def test_slow_call_is_hedged_to_another_key(keyed_backend, monkeypatch):
+    hedger = Hedger(percentile=50, budget_percent=100, min_samples=1)
+    hedger.record('topic', 0.01)
+    monkeypatch.setattr(scheduler, '_hedger', hedger)
+    hedged, wins = CALL_STATS['hedged_calls'], CALL_STATS['hedge_wins']
+    
+    start = time.monotonic()
+    results = asyncio.run(ai_func.ASYNC_MULTI_AI(["몽이 사료"], "지침", task='topic'))
+    assert time.monotonic() - start < 0.4
+    assert results[0]
+    assert len(keyed_backend['keys']) == 2
+    assert keyed_backend['keys'][0] != keyed_backend['keys'][1]
+    assert CALL_STATS['hedged_calls'] == hedged + 1
+    assert CALL_STATS['hedge_wins'] == wins + 1
+
+def test_no_hedge_without_budget(keyed_backend, monkeypatch):
+    hedger = Hedger(percentile=50, budget_percent=0, min_samples=1)
+    hedger.record('topic', 0.01)
+    monkeypatch.setattr(scheduler, '_hedger', hedger)
+    keyed_backend['delays'] = [0.05]
+    
+    results = asyncio.run(ai_func.ASYNC_MULTI_AI(["몽이 사료"], "지침", task='topic'))
+    assert results[0]
+    assert len(keyed_backend['keys']) == 1
+    assert hedger.hedges == 0
+
+def test_hedge_is_charged_to_call_budget(keyed_backend, monkeypatch):
+    hedger = Hedger(percentile=50, budget_percent=100, min_samples=1)
+    hedger.record('topic', 0.01)
+    monkeypatch.setattr(scheduler, '_hedger', hedger)
+    keyed_backend['delays'] = [0.05]
+    
+    async def main():
+        with ai_func.call_budget(1) as budget:
+            results = await ai_func.ASYNC_MULTI_AI(["몽이 사료"], "지침", task='topic')
+        return results, budget
+    
+    results, budget = asyncio.run(main())
+    assert results[0]
+    assert budget.used == 1
+    assert len(keyed_backend['keys']) == 1
+    assert hedger.hedges == 0
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import config
+import ai_func
+from llm_backend import (
+    LOCAL_MODEL, SIMILARITY_SYSTEM, AIError, LLMBackend, get_backend, similarity_prompt, parse_similarity_score
+)
+
+@pytest.fixture(autouse=True)
+def local_model(monkeypatch):
+    monkeypatch.setattr(config, 'GEMINI_MODEL', LOCAL_MODEL)
+    monkeypatch.setattr(config, 'AI_RESULT_CACHE_ENABLED', False)
+
+CONVERSATION = "user: 우리 고양이 몽이가 요즘 사료를 안 먹어\nassistant: 몽이 사료를 바꿔 보세요"
+RELATED = {'topic': '고양이 몽이', 'summary': '고양이 몽이의 사료와 건강'}
+UNRELATED = {'topic': '한라산 등산', 'summary': '겨울 한라산 등산 코스와 장비'}
+
+def node_text(node_data: dict) -> str:
+    return f"주제: {node_data['topic']}\n요약: {node_data['summary']}"
+
+def test_similarity_prompt_round_trip():
+    backend = get_backend()
+    related = backend.generate(similarity_prompt(node_text(RELATED), CONVERSATION), SIMILARITY_SYSTEM,
+                               task='similarity')
+    unrelated = backend.generate(similarity_prompt(node_text(UNRELATED), CONVERSATION), SIMILARITY_SYSTEM,
+                                 task='similarity')
+    assert parse_similarity_score(related) > parse_similarity_score(unrelated)
+    assert backend.score(node_text(RELATED), CONVERSATION) == float(related)
+
+def test_similarity_batch_scores_every_node():
+    scores = asyncio.run(ai_func.judgement_similar_batch_AI([RELATED, UNRELATED, RELATED], CONVERSATION))
+    assert len(scores) == 3
+    assert None not in scores
+    assert float(scores[0]) > float(scores[1])
+    assert scores[0] == scores[2]
+
+def test_need_memory():
+    assert ai_func.need_memory_judgement_AI("저번에 말했던 고양이 이름이 뭐였지?")
+    assert not ai_func.need_memory_judgement_AI("파이썬에서 리스트를 정렬하는 방법은?")
+
+def test_summary_respects_max_length():
+    conversation = [
+        {'role': 'user', 'content': '우리 고양이 몽이가 요즘 사료를 안 먹어. 어제부터 물만 마셔.'},
+        {'role': 'assistant', 'content': '몽이가 걱정되네요. 사료를 바꾸거나 병원에 가 보세요.'}
+    ]
+    summary = ai_func.summary_AI(conversation, max_length=30)
+    assert summary
+    assert len(summary) <= 30
+    assert ai_func.topic_generation_AI(summary)
+
+def test_parent_update_keeps_new_content():
+    summary, topic = ai_func.parent_update_AI('고양이 몽이는 세 살이다.', '몽이가 사료를 바꿨다.', max_length=100)
+    assert '몽이가 사료를 바꿨다' in summary
+    assert len(summary) <= 100
+    assert topic
+
+def test_clustering_selects_related_nodes(monkeypatch):
+    import memory
+    nodes = {'cat-1': RELATED, 'cat-2': {'topic': '몽이 사료', 'summary': '몽이 사료 브랜드'}, 'hike': UNRELATED}
+    monkeypatch.setattr(memory, 'get_node_data', nodes.get)
+    
+    selected, topic = asyncio.run(ai_func.clustering_AI(list(nodes), CONVERSATION, fanout_limit=3))
+    assert sorted(selected) == ['cat-1', 'cat-2']
+    assert topic
+
+def test_local_backend_needs_no_api_key(monkeypatch):
+    monkeypatch.setattr(ai_func, 'AI_API_N', 0)
+    monkeypatch.setattr(ai_func, 'AI_API', [])
+    assert get_backend() is get_backend()
+    assert not get_backend().requires_api_key
+    assert ai_func.AI("안녕", "지침", task='need_memory') == "False"
+
+def test_respond_counts_memories(monkeypatch):
+    conversations = {0: [{'role': 'user', 'content': '몽이 사료'}], 1: [{'role': 'user', 'content': '한라산 등산'}]}
+    monkeypatch.setattr(ai_func, 'get_conversations', lambda indexes: [conversations.get(i) for i in indexes])
+    response = ai_func.respond_AI("몽이는 잘 지내?", memory=[0, 1, 2])
+    assert "기억 2개" in response
+    assert "몽이는 잘 지내?" in response
+
+def test_default_score_uses_similarity_task(monkeypatch):
+    calls = []
+    
+    class EchoBackend(LLMBackend):
+        def generate(self, prompt, system, api_key=None, task=None):
+            calls.append((prompt, system, api_key, task))
+            return " 0.73 "
+    
+    monkeypatch.setattr(config, 'AI_API', ['key-a'])
+    assert EchoBackend().score(node_text(RELATED), CONVERSATION) == 0.73
+    assert calls == [(similarity_prompt(node_text(RELATED), CONVERSATION), SIMILARITY_SYSTEM, 'key-a', 'similarity')]
+    
+    monkeypatch.setattr(config, 'AI_API', [])
+    with pytest.raises(AIError):
+        EchoBackend().score(node_text(RELATED), CONVERSATION)
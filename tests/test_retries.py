@@ -0,0 +1,117 @@
+import time
+import asyncio
+
+import pytest
+
+import config
+import ai_func
+import main_ai
+from ai_func import classify_error, backoff_delay, is_retryable
+from llm_backend import AIError, AIRateLimitError, AITransientError, AIResponseError, LOCAL_MODEL, get_backend
+from scheduler import KeyScheduler
+
+@pytest.fixture
+def flaky_backend(monkeypatch):
+    """처음 몇 번은 지정한 예외를 내고 그 뒤에는 로컬 응답을 주는 백엔드"""
+    monkeypatch.setattr(config, 'GEMINI_MODEL', LOCAL_MODEL)
+    monkeypatch.setattr(config, 'AI_RESULT_CACHE_ENABLED', False)
+    monkeypatch.setattr(ai_func, 'backoff_delay', lambda attempt, error: 0.0)
+    backend = get_backend()
+    state = {'errors': [], 'calls': 0}
+    generate = backend.generate
+    
+    def flaky(prompt, system, api_key=None, task=None):
+        state['calls'] += 1
+        if state['errors']:
+            raise state['errors'].pop(0)
+        return generate(prompt, system, api_key, task)
+    
+    async def flaky_async(prompt, system, api_key=None, task=None):
+        return flaky(prompt, system, api_key, task)
+    
+    monkeypatch.setattr(backend, 'generate', flaky)
+    monkeypatch.setattr(backend, 'generate_async', flaky_async)
+    return state
+
+# 오류 분류와 백오프
+
+def test_classify_error():
+    rate_limited = classify_error(Exception("429 Resource has been exhausted, retry in 7.5s"))
+    assert isinstance(rate_limited, AIRateLimitError)
+    assert rate_limited.retry_after == 7.5
+    assert isinstance(classify_error(ConnectionError("reset")), AITransientError)
+    assert type(classify_error(ValueError("bad request"))) is AIError
+    response_error = AIResponseError("blocked")
+    assert classify_error(response_error) is response_error
+    
+    assert is_retryable(rate_limited) and is_retryable(AITransientError("x"))
+    assert not is_retryable(AIError("x")) and not is_retryable(response_error)
+
+def test_backoff_delay_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, AITransientError("x")) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= ai_func.RETRY_MAX_DELAY for delay in delays)
+    assert len(set(delays)) > 1
+    assert all(backoff_delay(0, AIRateLimitError("x", 3.0)) >= 3.0 for _ in range(20))
+
+# 재시도
+
+def test_ai_retries_transient_errors(flaky_backend):
+    flaky_backend['errors'] = [ConnectionError("reset"), Exception("429 ResourceExhausted")]
+    assert ai_func.AI("몽이", "지침", task='topic')
+    assert flaky_backend['calls'] == 3
+
+def test_ai_gives_up_after_retries(flaky_backend):
+    flaky_backend['errors'] = [ConnectionError("reset")] * 5
+    with pytest.raises(AITransientError):
+        ai_func.AI("몽이", "지침", retries=2)
+    assert flaky_backend['calls'] == 3
+
+def test_ai_does_not_retry_permanent_errors(flaky_backend):
+    flaky_backend['errors'] = [ValueError("bad request")]
+    with pytest.raises(AIError):
+        ai_func.AI("몽이", "지침")
+    assert flaky_backend['calls'] == 1
+
+def test_parallel_calls_return_none_for_failed_queries(flaky_backend, monkeypatch):
+    monkeypatch.setattr(config, 'AI_SINGLE_FLIGHT', False)
+    flaky_backend['errors'] = [ValueError("bad request")]
+    results = asyncio.run(ai_func.ASYNC_MULTI_AI(["a", "b"], "지침"))
+    assert results == [None, "b"]
+
+# 키별 서킷 브레이커
+
+def test_circuit_opens_after_consecutive_failures_and_recovers():
+    scheduler = KeyScheduler(['a', 'b'], rpm_limit=1000, tpm_limit=10 ** 6, failure_threshold=2, reset_seconds=0.05)
+    scheduler.record_failure('a')
+    scheduler.record_success('a')
+    scheduler.record_failure('a')
+    assert scheduler.open_circuits() == []
+    scheduler.record_failure('a')
+    assert scheduler.open_circuits() == ['a']
+    assert {scheduler.try_acquire(1)[0] for _ in range(5)} == {'b'}
+    
+    # reset_seconds 뒤에는 시험 요청 하나만 허용
+    time.sleep(0.06)
+    assert scheduler.try_acquire(1, exclude='b')[0] == 'a'
+    assert scheduler.try_acquire(1, exclude='b')[0] is None
+    scheduler.record_success('a')
+    assert scheduler.try_acquire(1, exclude='b')[0] == 'a'
+
+def test_rate_limited_key_is_skipped():
+    scheduler = KeyScheduler(['a', 'b'], rpm_limit=10, tpm_limit=10 ** 6)
+    scheduler.record_failure('a', rate_limited=True)
+    assert {scheduler.try_acquire(1)[0] for _ in range(5)} == {'b'}
+
+# 응답 생성 실패
+
+def test_failed_response_raises_and_is_not_saved(flaky_backend, monkeypatch):
+    saved = []
+    monkeypatch.setattr(main_ai, 'current_search_mode', 'no')
+    monkeypatch.setattr(main_ai, 'current_no_record', False)
+    monkeypatch.setattr(main_ai, 'save_tree', lambda pair: saved.append(pair))
+    monkeypatch.setattr(main_ai, 'end_turn', lambda: True)
+    flaky_backend['errors'] = [ValueError("bad request")]
+    
+    with pytest.raises(AIError):
+        main_ai.main_sync("안녕")
+    assert saved == []
@@ -0,0 +1,95 @@
+import time
+import asyncio
+
+import config
+import scheduler
+from config import CALL_STATS
+from scheduler import TokenBucket, KeyScheduler, ConcurrencyLimiter, estimate_tokens
+
+# 키별 RPM/TPM 토큰 버킷
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(capacity=10, refill_rate=5)
+    bucket.take(10)
+    assert bucket.wait_time(5) == 1.0
+    bucket.refill(bucket.updated + 0.5)
+    assert bucket.tokens == 2.5
+    bucket.refill(bucket.updated + 10)
+    assert bucket.tokens == 10
+    # 한도보다 큰 요청은 가득 찼을 때 보냄
+    assert bucket.wait_time(50) == 0.0
+
+def test_scheduler_spreads_requests_by_headroom():
+    key_scheduler = KeyScheduler(['a', 'b'], rpm_limit=10, tpm_limit=1000)
+    keys = [key_scheduler.try_acquire(10)[0] for _ in range(4)]
+    assert sorted(keys) == ['a', 'a', 'b', 'b']
+    
+    # 토큰을 많이 쓴 키보다 여유가 많은 키를 배정
+    key_scheduler = KeyScheduler(['a', 'b'], rpm_limit=10, tpm_limit=1000)
+    assert key_scheduler.try_acquire(900, exclude='b')[0] == 'a'
+    assert key_scheduler.try_acquire(10)[0] == 'b'
+
+def test_scheduler_waits_when_every_key_is_at_its_limit():
+    key_scheduler = KeyScheduler(['a'], rpm_limit=2, tpm_limit=1000)
+    assert key_scheduler.try_acquire(1)[0] == 'a'
+    assert key_scheduler.try_acquire(1)[0] == 'a'
+    key, wait = key_scheduler.try_acquire(1)
+    assert key is None
+    assert 0 < wait <= 30
+
+def test_scheduler_tpm_limit():
+    key_scheduler = KeyScheduler(['a'], rpm_limit=100, tpm_limit=100)
+    assert key_scheduler.try_acquire(80)[0] == 'a'
+    assert key_scheduler.try_acquire(30)[0] is None
+    assert key_scheduler.try_acquire(20)[0] == 'a'
+
+def test_acquire_queues_until_a_key_frees_up():
+    key_scheduler = KeyScheduler(['a'], rpm_limit=1200, tpm_limit=10 ** 6)  # 초당 20개 충전
+    for _ in range(1200):
+        key_scheduler.try_acquire(1)
+    queued = CALL_STATS['queued_calls']
+    start = time.monotonic()
+    assert asyncio.run(key_scheduler.acquire(1)) == 'a'
+    assert time.monotonic() - start >= 0.03
+    assert CALL_STATS['queued_calls'] == queued + 1
+
+def test_estimate_tokens():
+    assert estimate_tokens('', None) == 1
+    assert estimate_tokens('가' * 100, 'b' * 100) == 101
+
+# 동시 실행 제한
+
+def run_calls(limiter, keys) -> int:
+    """keys마다 슬롯을 얻어 잠시 실행하고 최대 동시 실행 수를 반환"""
+    async def call(key):
+        async with limiter.slot(key):
+            await asyncio.sleep(0.01)
+    
+    async def run():
+        limiter.peak_in_flight = 0
+        await asyncio.gather(*[call(key) for key in keys])
+        return limiter.peak_in_flight
+    return asyncio.run(run())
+
+def test_limiter_bounds_total_and_per_key_concurrency():
+    limiter = ConcurrencyLimiter(max_concurrency=3, max_per_key=2)
+    assert run_calls(limiter, ['a'] * 10) == 2
+    assert run_calls(limiter, ['a', 'b', 'c', 'd'] * 3) == 3
+    assert limiter.in_flight == 0
+
+def test_limiter_and_executor_follow_config_changes(monkeypatch):
+    monkeypatch.setattr(scheduler, '_limiter', None)
+    monkeypatch.setattr(scheduler, '_executor', None)
+    monkeypatch.setattr(scheduler, '_executor_workers', None)
+    monkeypatch.setattr(config, 'AI_MAX_CONCURRENCY', 4)
+    monkeypatch.setattr(config, 'AI_MAX_CONCURRENCY_PER_KEY', 4)
+    limiter, executor = scheduler.get_limiter(), scheduler.get_executor()
+    assert run_calls(limiter, ['a'] * 8) == 4
+    
+    monkeypatch.setattr(config, 'AI_MAX_CONCURRENCY', 2)
+    assert scheduler.get_limiter() is limiter
+    assert run_calls(scheduler.get_limiter(), ['a'] * 8) == 2
+    assert scheduler.get_executor() is not executor
+    assert scheduler.get_executor() is scheduler.get_executor()
+    assert scheduler.get_executor().submit(lambda: 'ok').result() == 'ok'
+    scheduler.get_executor().shutdown()
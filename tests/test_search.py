@@ -0,0 +1,317 @@
+import time
+import asyncio
+
+import pytest
+
+import config
+import tree
+from llm_backend import LOCAL_MODEL
+
+QUERY = "user: 우리 고양이 몽이가 사료를 안 먹어"
+
+@pytest.fixture
+def search_tree(node_store, monkeypatch):
+    """
+    로컬 백엔드로 검색하는 작은 트리
+    ROOT ─ pets(고양이 몽이) ─ cat(고양이 몽이 사료) [0], dog(강아지 산책) [1]
+         └ hike(한라산 등산) [2]
+    """
+    settings = {
+        'GEMINI_MODEL': LOCAL_MODEL, 'AI_RESULT_CACHE_ENABLED': False, 'SIMILARITY_CACHE_ENABLED': False,
+        'QUERY_CACHE_ENABLED': False, 'VECTOR_PREFILTER_ENABLED': False, 'HEDGE_ENABLED': False,
+        'SEARCH_ALGORITHM': 'bfs', 'SIMILARITY_BATCH_SEARCH': False, 'SIMILARITY_BATCH_STORAGE': False,
+        'REUSE_SEARCH_SCORES': True
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+    put_tree(node_store)
+    return node_store
+
+def put_tree(node_store):
+    node_store.put('pets', {'topic': '고양이 몽이', 'summary': '고양이 몽이가 사료를 안 먹음, 강아지 산책',
+                            'children_ids': ['cat', 'dog']})
+    node_store.put('cat', {'topic': '고양이 몽이 사료', 'summary': '몽이가 사료를 안 먹어 사료를 바꿈',
+                           'direct_parent_id': 'pets', 'all_memory_indexes': [0]})
+    node_store.put('dog', {'topic': '강아지 산책', 'summary': '강아지와 공원 산책',
+                           'direct_parent_id': 'pets', 'all_memory_indexes': [1]})
+    node_store.put('hike', {'topic': '한라산 등산', 'summary': '겨울 한라산 등산 코스', 'all_memory_indexes': [2]})
+
+def search(query: str = QUERY) -> list:
+    return asyncio.run(tree.search_tree(query))
+
+@pytest.mark.parametrize('algorithm', ['bfs', 'pipelined', 'best_first'])
+def test_search_finds_related_memory(search_tree, monkeypatch, algorithm):
+    monkeypatch.setattr(config, 'SEARCH_ALGORITHM', algorithm)
+    assert search() == [0]
+
+def spy_similarity(monkeypatch) -> list:
+    """tree가 호출하는 judgement_similar_multi_AI의 (노드 수, batch, batch_size) 기록"""
+    calls = []
+    judge = tree.judgement_similar_multi_AI
+    
+    async def spy(node_ids, query, batch=False, batch_size=20):
+        calls.append((len(node_ids), batch, batch_size))
+        return await judge(node_ids, query, batch=batch, batch_size=batch_size)
+    
+    monkeypatch.setattr(tree, 'judgement_similar_multi_AI', spy)
+    return calls
+
+@pytest.mark.parametrize('algorithm', ['bfs', 'pipelined', 'best_first'])
+def test_batch_settings_are_read_at_call_time(search_tree, monkeypatch, algorithm):
+    monkeypatch.setattr(config, 'SEARCH_ALGORITHM', algorithm)
+    calls = spy_similarity(monkeypatch)
+    monkeypatch.setattr(config, 'SIMILARITY_BATCH_SEARCH', True)
+    monkeypatch.setattr(config, 'SIMILARITY_BATCH_SIZE', 7)
+    
+    assert search() == [0]
+    assert calls and all(batch and batch_size == 7 for _, batch, batch_size in calls)
+
+# best-first 호출 예산
+
+@pytest.fixture
+def backend_calls(monkeypatch):
+    """로컬 백엔드의 실제 호출 기록 (errors에 넣은 예외를 순서대로 먼저 발생시킴)"""
+    import ai_func
+    from llm_backend import get_backend
+    monkeypatch.setattr(config, 'GEMINI_MODEL', LOCAL_MODEL)
+    monkeypatch.setattr(ai_func, 'backoff_delay', lambda attempt, error: 0.0)
+    backend = get_backend()
+    generate = backend.generate
+    state = {'calls': [], 'errors': []}
+    
+    def counted(prompt, system, api_key=None, task=None):
+        state['calls'].append(task)
+        if state['errors']:
+            raise state['errors'].pop(0)
+        return generate(prompt, system, api_key, task)
+    
+    async def counted_async(prompt, system, api_key=None, task=None):
+        return counted(prompt, system, api_key, task)
+    
+    monkeypatch.setattr(backend, 'generate', counted)
+    monkeypatch.setattr(backend, 'generate_async', counted_async)
+    return state
+
+def test_call_budget_refuses_calls_when_exhausted(backend_calls, monkeypatch):
+    import ai_func
+    from llm_backend import AICallBudgetError
+    
+    async def main():
+        with ai_func.call_budget(2) as budget:
+            assert await ai_func.ASYNC_AI("몽이", "지침", task='topic', coalesce=False)
+            # 스레드 풀에서 실행되는 동기 호출도 같은 예산에서 차감
+            monkeypatch.setattr(ai_func, 'native_async_available', lambda: False)
+            assert await ai_func.ASYNC_AI("몽이", "지침", task='topic', coalesce=False)
+            with pytest.raises(AICallBudgetError):
+                await ai_func.ASYNC_AI("몽이", "지침", task='topic', coalesce=False)
+            assert budget.remaining == 0 and budget.refused == 1
+        assert await ai_func.ASYNC_AI("몽이", "지침", task='topic', coalesce=False)
+    
+    asyncio.run(main())
+    assert len(backend_calls['calls']) == 3
+
+def test_best_first_budget_counts_retries(search_tree, backend_calls, monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_ALGORITHM', 'best_first')
+    monkeypatch.setattr(config, 'SEARCH_MAX_LLM_CALLS', 3)
+    backend_calls['errors'] = [ConnectionError("reset")] * 2
+    search()
+    assert len(backend_calls['calls']) == 3
+
+def test_best_first_budget_counts_batch_fallbacks(search_tree, backend_calls, monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_ALGORITHM', 'best_first')
+    monkeypatch.setattr(config, 'SEARCH_MAX_LLM_CALLS', 2)
+    monkeypatch.setattr(config, 'SIMILARITY_BATCH_SEARCH', True)
+    # 배치 응답을 읽지 못하면 노드마다 개별 호출로 재평가
+    backend_calls['errors'] = [ValueError("bad request")]
+    search()
+    assert len(backend_calls['calls']) == 2
+
+def test_concurrent_searches_have_separate_budgets(search_tree, backend_calls, monkeypatch):
+    monkeypatch.setattr(config, 'AI_SINGLE_FLIGHT', False)
+    
+    async def main():
+        return await asyncio.gather(*[tree.best_first_search(QUERY, max_calls=3) for _ in range(2)])
+    
+    assert asyncio.run(main()) == [[0], [0]]
+    assert len(backend_calls['calls']) == 6
+
+# 파이프라인 검색
+
+@pytest.fixture
+def scripted_tree(node_store, monkeypatch):
+    """
+    점수와 지연 시간을 노드별로 정한 트리 (judge_similarity를 대체하고 평가 시작/종료를 기록)
+    ROOT ─ slow(느린 기억) [5]
+         └ parent ─ first [1], second [2], unrelated [3]
+    """
+    node_store.put('slow', {'topic': 'slow', 'summary': '', 'all_memory_indexes': [5]})
+    node_store.put('parent', {'topic': 'parent', 'summary': '', 'children_ids': ['first', 'second', 'unrelated']})
+    for node_id, index in [('first', 1), ('second', 2), ('unrelated', 3)]:
+        node_store.put(node_id, {'topic': node_id, 'summary': '', 'direct_parent_id': 'parent',
+                                 'all_memory_indexes': [index]})
+    script = {'scores': {'slow': '0.9', 'parent': '0.9', 'first': '0.9', 'second': '0.8', 'unrelated': '0.1'},
+              'delays': {'slow': 0.05}, 'errors': {}, 'events': []}
+    
+    async def judge(node_ids, query, batch, reuse=False):
+        script['events'].extend(('start', node_id) for node_id in node_ids)
+        try:
+            await asyncio.sleep(max(script['delays'].get(node_id, 0) for node_id in node_ids))
+        except asyncio.CancelledError:
+            script['events'].extend(('cancelled', node_id) for node_id in node_ids)
+            raise
+        for node_id in node_ids:
+            if node_id in script['errors']:
+                raise script['errors'][node_id]
+        script['events'].extend(('done', node_id) for node_id in node_ids)
+        return [script['scores'][node_id] for node_id in node_ids]
+    
+    monkeypatch.setattr(tree, 'judge_similarity', judge)
+    monkeypatch.setattr(config, 'VECTOR_PREFILTER_ENABLED', False)
+    monkeypatch.setattr(config, 'SIMILARITY_BATCH_SEARCH', False)
+    return script
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_pipelined_matches_bfs_order(scripted_tree, monkeypatch, batch):
+    monkeypatch.setattr(config, 'SIMILARITY_BATCH_SEARCH', batch)
+    expected = asyncio.run(tree.bfs_search(QUERY))
+    assert expected == [5, 1, 2]
+    assert asyncio.run(tree.pipelined_search(QUERY)) == expected
+
+def test_pipelined_expands_children_before_slow_siblings_finish(scripted_tree):
+    asyncio.run(tree.pipelined_search(QUERY))
+    events = scripted_tree['events']
+    assert events.index(('start', 'first')) < events.index(('done', 'slow'))
+    
+    scripted_tree['events'].clear()
+    asyncio.run(tree.bfs_search(QUERY))
+    assert events.index(('start', 'first')) > events.index(('done', 'slow'))
+
+def test_pipelined_cancels_pending_work_on_error(scripted_tree):
+    scripted_tree['errors']['first'] = RuntimeError("실패")
+    with pytest.raises(RuntimeError):
+        asyncio.run(tree.pipelined_search(QUERY))
+    assert ('cancelled', 'slow') in scripted_tree['events']
+    assert ('done', 'slow') not in scripted_tree['events']
+
+# 검색 점수 재사용
+
+PAIR = [{'role': 'user', 'content': '우리 고양이 몽이가 사료를 안 먹어'}, {'role': 'assistant', 'content': '사료를 바꿔 보세요'}]
+
+def search_then_match(calls, change=None) -> list:
+    """한 턴 안에서 검색한 뒤 ROOT 자식 중 저장 위치를 찾고, 저장 위치 탐색에서 평가한 노드 수 목록을 반환"""
+    async def turn():
+        tree.start_turn_scoring()
+        await tree.search_tree(QUERY)
+        if change:
+            change()
+        before = len(calls)
+        best = await tree.find_best_matching_child(tree.get_root_children_ids(), PAIR)
+        assert best['node_id'] == 'pets'
+        return [count for count, _, _ in calls[before:]]
+    
+    return asyncio.run(turn())
+
+@pytest.fixture
+def similarity_calls(search_tree, monkeypatch):
+    return spy_similarity(monkeypatch)
+
+def test_storage_reuses_search_scores(similarity_calls):
+    assert search_then_match(similarity_calls) == []
+
+def test_reuse_setting_is_read_live(similarity_calls, monkeypatch):
+    monkeypatch.setattr(config, 'REUSE_SEARCH_SCORES', False)
+    assert search_then_match(similarity_calls) == [2]
+    monkeypatch.setattr(config, 'REUSE_SEARCH_SCORES', True)
+    assert search_then_match(similarity_calls) == []
+
+def test_changed_node_is_scored_again(similarity_calls, search_tree):
+    def change():
+        node_data = search_tree.get('hike')
+        node_data['summary'] = '겨울 한라산 등산 코스와 장비'
+        assert search_tree.put('hike', node_data)
+    assert search_then_match(similarity_calls, change) == [1]
+
+def test_scores_do_not_outlive_the_turn(similarity_calls):
+    assert search_then_match(similarity_calls) == []
+    
+    async def next_turn():
+        tree.start_turn_scoring()
+        await tree.find_best_matching_child(tree.get_root_children_ids(), PAIR)
+    
+    before = len(similarity_calls)
+    asyncio.run(next_turn())
+    assert [count for count, _, _ in similarity_calls[before:]] == [2]
+
+# 검색 결과 캐시
+
+@pytest.fixture
+def query_cache(search_tree, monkeypatch):
+    import ai_cache
+    monkeypatch.setattr(config, 'QUERY_CACHE_ENABLED', True)
+    monkeypatch.setattr(ai_cache, '_query_cache', None)
+    return ai_cache.get_query_cache()
+
+def searches_with_calls(similarity_calls, query: str = QUERY) -> tuple:
+    """(검색 결과, 이번 검색에서 유사도 판단을 호출했는지)"""
+    before = len(similarity_calls)
+    return search(query), len(similarity_calls) > before
+
+def test_query_cache_reuses_same_and_similar_queries(query_cache, similarity_calls):
+    assert searches_with_calls(similarity_calls) == ([0], True)
+    assert searches_with_calls(similarity_calls) == ([0], False)
+    assert searches_with_calls(similarity_calls, QUERY + "?") == ([0], False)
+    assert searches_with_calls(similarity_calls, "user: 한라산 겨울 등산 코스 알려줘")[1]
+
+def test_query_cache_drops_results_when_path_node_changes(query_cache, similarity_calls):
+    import memory
+    search()
+    # 경로 밖의 노드(점수가 낮았던 hike)가 바뀌면 유지
+    hike = memory.get_node_data('hike')
+    hike['summary'] = '여름 한라산 등산 코스'
+    assert memory.save_node_data('hike', hike)
+    assert searches_with_calls(similarity_calls) == ([0], False)
+    
+    cat = memory.get_node_data('cat')
+    cat['all_memory_indexes'] = [0, 3]
+    assert memory.save_node_data('cat', cat)
+    assert searches_with_calls(similarity_calls) == ([0, 3], True)
+
+def test_query_cache_drops_results_when_root_node_is_added(query_cache, similarity_calls):
+    import memory
+    search()
+    memory.create_new_node('고양이 몽이 병원', '고양이 몽이가 사료를 안 먹어 병원에 감', memory_indexes=[4])
+    assert searches_with_calls(similarity_calls) == ([4, 0], True)
+
+def test_query_cache_ttl(search_tree, similarity_calls, monkeypatch):
+    import ai_cache
+    monkeypatch.setattr(config, 'QUERY_CACHE_ENABLED', True)
+    monkeypatch.setattr(config, 'QUERY_CACHE_TTL', 0.05)
+    monkeypatch.setattr(ai_cache, '_query_cache', None)
+    search()
+    assert searches_with_calls(similarity_calls) == ([0], False)
+    time.sleep(0.1)
+    assert searches_with_calls(similarity_calls) == ([0], True)
+
+def test_query_cache_sees_sqlite_writes_from_other_processes(search_tree, similarity_calls, tmp_path, monkeypatch):
+    import ai_cache
+    import memory
+    from memory_sqlite import SQLiteDatabase, SQLiteNodeStore
+    monkeypatch.setattr(config, 'QUERY_CACHE_ENABLED', True)
+    monkeypatch.setattr(ai_cache, '_query_cache', None)
+    db_path = str(tmp_path / 'hsms.sqlite3')
+    ours, theirs = SQLiteDatabase(db_path), SQLiteDatabase(db_path)
+    try:
+        store = SQLiteNodeStore(ours)
+        put_tree(store)
+        monkeypatch.setattr(memory, '_node_store', store)
+        assert searches_with_calls(similarity_calls) == ([0], True)
+        
+        # 다른 프로세스의 저장은 리스너를 거치지 않으므로 조회 시 version으로 확인
+        other = SQLiteNodeStore(theirs)
+        cat = other.get('cat')
+        cat['all_memory_indexes'] = [0, 3]
+        assert other.put('cat', cat)
+        assert searches_with_calls(similarity_calls) == ([0, 3], True)
+    finally:
+        ours.close()
+        theirs.close()
@@ -0,0 +1,130 @@
+import os
+import sys
+import stat
+import subprocess
+
+import memory
+from memory import NodeStore, ConversationLog, save_json, save_bytes
+
+from conftest import ROOT
+
+def make_store(tmp_path, **kwargs) -> NodeStore:
+    return NodeStore(file_path=str(tmp_path / 'memory' / 'hierarchical_memory.json'), **kwargs)
+
+def make_log(tmp_path) -> ConversationLog:
+    return ConversationLog(dir_path=str(tmp_path / 'memory' / 'all_memory_log'),
+                           legacy_path=str(tmp_path / 'memory' / 'all_memory.json'))
+
+def file_mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+# 낙관적 동시성 검사
+
+def test_stale_write_is_rejected(tmp_path):
+    store = make_store(tmp_path)
+    store.put('a', {'topic': 'a'})
+    first, second = store.get('a'), store.get('a')
+    second['topic'] = '먼저 저장'
+    assert store.put('a', second)
+    first['topic'] = '오래된 사본'
+    assert not store.put('a', first)
+    assert store.get('a')['topic'] == '먼저 저장'
+    assert store.get('a')['version'] == 2
+
+def test_write_without_version_always_applies(tmp_path):
+    store = make_store(tmp_path)
+    store.put('a', {'topic': 'a'})
+    assert store.put('a', {'topic': '버전 없이 저장'})
+    assert store.get('a')['version'] == 2
+
+# 다른 프로세스의 변경 반영
+
+def test_other_process_wal_records_are_seen_on_refresh(tmp_path):
+    reader = make_store(tmp_path)
+    reader.put('a', {'topic': 'a'})
+    writer = make_store(tmp_path)
+    writer.put('b', {'topic': 'b'})
+    
+    # 읽기는 작업 시작 시(refresh) 한 번만 파일을 확인함
+    assert reader.get('b') is None
+    reader.refresh()
+    assert reader.get('b')['topic'] == 'b'
+    assert reader.root_children_ids() == ['a', 'b']
+
+def test_write_checks_other_process_changes_first(tmp_path):
+    reader = make_store(tmp_path)
+    reader.put('a', {'topic': 'a'})
+    stale = reader.get('a')
+    writer = make_store(tmp_path)
+    fresh = writer.get('a')
+    fresh['topic'] = '다른 프로세스가 저장'
+    assert writer.put('a', fresh)
+    
+    stale['topic'] = '오래된 사본'
+    assert not reader.put('a', stale)
+    assert reader.get('a')['topic'] == '다른 프로세스가 저장'
+
+def test_other_process_checkpoint_is_reloaded(tmp_path):
+    reader = make_store(tmp_path)
+    reader.put('a', {'topic': 'a'})
+    writer = make_store(tmp_path)
+    writer.put('b', {'topic': 'b'})
+    assert writer.checkpoint()
+    
+    reader.refresh()
+    assert reader.node_ids() == ['a', 'b']
+
+def test_conversation_log_follows_other_process_appends(tmp_path):
+    reader = make_log(tmp_path)
+    reader.append([{'role': 'user', 'content': '0'}])
+    writer = make_log(tmp_path)
+    writer.append([{'role': 'user', 'content': '1'}])
+    
+    assert len(reader) == 2
+    assert reader.get(1) == [{'role': 'user', 'content': '1'}]
+    assert reader.append([{'role': 'user', 'content': '2'}]) == 2
+
+WRITER_SCRIPT = """
+import sys
+from memory import NodeStore, ConversationLog
+store = NodeStore(file_path=sys.argv[1] + '/hierarchical_memory.json')
+log = ConversationLog(dir_path=sys.argv[1] + '/all_memory_log', legacy_path=sys.argv[1] + '/all_memory.json')
+for i in range(30):
+    index = log.append([{'role': 'user', 'content': sys.argv[2] + str(i)}])
+    store.put(f'{sys.argv[2]}-{index}', {'topic': sys.argv[2], 'all_memory_indexes': [index]})
+    if i % 10 == 9:
+        store.checkpoint()
+store.close()
+"""
+
+def test_concurrent_processes_do_not_lose_writes(tmp_path):
+    memory_dir = str(tmp_path / 'memory')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    writers = [subprocess.Popen([sys.executable, '-c', WRITER_SCRIPT, memory_dir, name], cwd=ROOT, env=env)
+               for name in ('p', 'q')]
+    assert [writer.wait(timeout=60) for writer in writers] == [0, 0]
+    
+    store = make_store(tmp_path)
+    log = make_log(tmp_path)
+    assert len(log) == 60
+    assert len(store) == 60
+    for node_id in store.node_ids():
+        index = store.get(node_id)['all_memory_indexes'][0]
+        assert node_id == f"{store.get(node_id)['topic']}-{index}"
+
+# 원자적 저장 파일 권한
+
+def test_new_files_follow_umask(tmp_path):
+    json_path, bytes_path = str(tmp_path / 'a.json'), str(tmp_path / 'b.snap')
+    assert save_json(json_path, {})
+    assert save_bytes(bytes_path, b'data')
+    assert file_mode(json_path) == 0o666 & ~memory._UMASK
+    assert file_mode(bytes_path) == 0o666 & ~memory._UMASK
+
+def test_replaced_files_keep_their_mode(tmp_path):
+    json_path = str(tmp_path / 'a.json')
+    assert save_json(json_path, {})
+    os.chmod(json_path, 0o664)
+    assert save_json(json_path, {'a': 1}, backup=True)
+    assert file_mode(json_path) == 0o664
+    assert file_mode(f"{json_path}.backup") == 0o664
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+import config
+import ai_func
+from llm_backend import LOCAL_MODEL
+from scheduler import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    single_flight = SingleFlight()
+    runs = []
+    
+    async def work(started):
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "결과"
+    
+    async def main():
+        results = await asyncio.gather(*[single_flight.do('key', work) for _ in range(5)])
+        assert single_flight.in_flight() == 0
+        return results
+    
+    assert asyncio.run(main()) == ["결과"] * 5
+    assert runs == [1]
+
+def test_error_is_shared():
+    single_flight = SingleFlight()
+    
+    async def work(started):
+        await asyncio.sleep(0.01)
+        raise ValueError("실패")
+    
+    async def main():
+        return await asyncio.gather(*[single_flight.do('key', work) for _ in range(2)], return_exceptions=True)
+    
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_cancelled_leader_does_not_cancel_followers():
+    single_flight = SingleFlight()
+    runs = []
+    
+    async def work(started):
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "결과"
+    
+    async def main():
+        leader = asyncio.ensure_future(asyncio.wait_for(single_flight.do('key', work), timeout=0.01))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(single_flight.do('key', work))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        return await follower
+    
+    assert asyncio.run(main()) == "결과"
+    assert runs == [1]
+
+def test_shared_call_is_cancelled_when_no_one_waits():
+    single_flight = SingleFlight()
+    cancelled = []
+    
+    async def work(started):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+    
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(single_flight.do('key', work), timeout=0.01)
+        await asyncio.sleep(0)
+        assert single_flight.in_flight() == 0
+        # 취소된 호출에 합류하지 않고 새로 실행
+        async def again(started):
+            return "새 결과"
+        return await single_flight.do('key', again)
+    
+    assert asyncio.run(main()) == "새 결과"
+    assert cancelled == [1]
+
+def test_on_start_reaches_followers():
+    single_flight = SingleFlight()
+    events = []
+    
+    async def work(started):
+        await asyncio.sleep(0.01)
+        events.append('start')
+        started()
+        await asyncio.sleep(0.01)
+        return "결과"
+    
+    async def main():
+        leader = asyncio.ensure_future(single_flight.do('key', work, on_start=lambda: events.append('leader')))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(single_flight.do('key', work, on_start=lambda: events.append('follower')))
+        await asyncio.sleep(0.015)
+        # 이미 시작된 호출에 합류하면 바로 호출됨
+        late = single_flight.do('key', work, on_start=lambda: events.append('late'))
+        return await asyncio.gather(leader, follower, late)
+    
+    assert asyncio.run(main()) == ["결과"] * 3
+    assert events == ['start', 'leader', 'follower', 'late']
+
+def test_coalesced_async_ai_forwards_on_start(monkeypatch):
+    monkeypatch.setattr(config, 'GEMINI_MODEL', LOCAL_MODEL)
+    monkeypatch.setattr(config, 'AI_SINGLE_FLIGHT', True)
+    started = []
+    
+    async def main():
+        return await asyncio.gather(*[
+            ai_func.ASYNC_AI("몽이 사료", "지침", task='topic', on_start=lambda n=n: started.append(n))
+            for n in range(3)
+        ])
+    
+    results = asyncio.run(main())
+    assert len(set(results)) == 1
+    assert sorted(started) == [0, 1, 2]
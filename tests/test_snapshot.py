@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import memory
+from memory import (
+    NodeStore, SnapshotError,
+    SNAPSHOT_HEADER, SNAPSHOT_MAGIC
+)
+
+def make_store(tmp_path, **kwargs) -> NodeStore:
+    return NodeStore(file_path=str(tmp_path / 'memory' / 'hierarchical_memory.json'), **kwargs)
+
+def build_tree(store: NodeStore):
+    store.put('root-a', {'topic': '고양이', 'summary': '고양이 몽이 이야기', 'children_ids': ['leaf-a']})
+    store.put('leaf-a', {'topic': '몽이', 'summary': '몽이는 세 살', 'direct_parent_id': 'root-a',
+                         'all_memory_indexes': [0, 2]})
+    store.put('root-b', {'topic': '등산', 'summary': '한라산', 'all_memory_indexes': [1]})
+
+# 스냅샷
+
+def test_snapshot_round_trip(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    assert store.flush()
+    
+    with open(store.snapshot_path, 'rb') as f:
+        assert SNAPSHOT_HEADER.unpack_from(f.read()) == (SNAPSHOT_MAGIC, memory.SNAPSHOT_VERSION)
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.export_dict() == store.export_dict()
+    assert reloaded.root_children_ids() == ['root-a', 'root-b']
+    assert reloaded.get('leaf-a')['all_parent_ids'] == ['root-a']
+
+def test_corrupt_snapshot_raises_instead_of_loading_json(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    assert store.flush()
+    # 마지막 정상 종료 때 내보낸 오래된 JSON
+    memory.save_json(store.file_path, {'stale': {'topic': 'stale'}})
+    
+    with open(store.snapshot_path, 'rb') as f:
+        raw = bytearray(f.read())
+    raw[-5] ^= 0xFF
+    with open(store.snapshot_path, 'wb') as f:
+        f.write(raw)
+    
+    broken = make_store(tmp_path)
+    with pytest.raises(SnapshotError):
+        broken.get('root-a')
+    # 손상된 스냅샷을 오래된 트리로 덮어쓰지 않음
+    with open(store.snapshot_path, 'rb') as f:
+        assert f.read() == bytes(raw)
+
+def test_truncated_snapshot_raises(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    assert store.flush()
+    with open(store.snapshot_path, 'r+b') as f:
+        f.truncate(os.path.getsize(store.snapshot_path) - 3)
+    with pytest.raises(SnapshotError):
+        len(make_store(tmp_path))
+
+def test_unknown_snapshot_version_raises(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    assert store.flush()
+    with open(store.snapshot_path, 'r+b') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, memory.SNAPSHOT_VERSION - 1))
+    with pytest.raises(SnapshotError, match='unknown snapshot format'):
+        len(make_store(tmp_path))
+
+def test_import_json_recovers_from_corrupt_snapshot(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    assert store.flush()
+    export_path = str(tmp_path / 'export.json')
+    assert store.export_json(export_path)
+    with open(store.snapshot_path, 'wb') as f:
+        f.write(b'HSMS garbage')
+    
+    recovered = make_store(tmp_path)
+    assert recovered.import_json(export_path)
+    assert make_store(tmp_path).export_dict() == store.export_dict()
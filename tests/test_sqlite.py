@@ -0,0 +1,67 @@
+import pytest
+
+from memory import NodeStore, ConversationLog
+from memory_sqlite import SQLiteDatabase, SQLiteNodeStore, SQLiteConversationLog
+
+@pytest.fixture
+def memory_dir(tmp_path):
+    return tmp_path / 'memory'
+
+@pytest.fixture
+def database(memory_dir):
+    db = SQLiteDatabase(db_path=str(memory_dir / 'hsms.sqlite3'))
+    yield db
+    db.close()
+
+def conversation(i: int) -> list:
+    return [{'role': 'user', 'content': f'대화 {i}'}, {'role': 'assistant', 'content': f'응답 {i}'}]
+
+def test_first_open_imports_snapshot_and_wal(memory_dir, database):
+    json_store = NodeStore(file_path=str(memory_dir / 'hierarchical_memory.json'))
+    json_store.put('a', {'topic': '체크포인트된 노드'})
+    assert json_store.checkpoint()
+    # 내보내지 않고 WAL에만 남은 변경 (비정상 종료)
+    json_store.put('b', {'topic': 'WAL에만 있는 노드', 'direct_parent_id': 'a'})
+    json_store.sync_wal()
+    log = ConversationLog(dir_path=str(memory_dir / 'all_memory_log'),
+                          legacy_path=str(memory_dir / 'all_memory.json'))
+    for i in range(3):
+        log.append(conversation(i))
+    
+    store = SQLiteNodeStore(database)
+    assert store.export_dict().keys() == {'a', 'b'}
+    assert store.get('b')['topic'] == 'WAL에만 있는 노드'
+    assert SQLiteConversationLog(database).load_all() == [conversation(i) for i in range(3)]
+
+def test_conversation_log_round_trip(database):
+    log = SQLiteConversationLog(database)
+    assert [log.append(conversation(i)) for i in range(5)] == list(range(5))
+    assert log.get_conversations([4, 0, 9]) == [conversation(4), conversation(0), None]
+    assert len(log) == 5
+
+def test_saving_a_node_keeps_creation_order(database):
+    store = SQLiteNodeStore(database)
+    for node_id in ('a', 'b', 'c'):
+        store.put(node_id, {'topic': node_id})
+    store.put('a', {'topic': '갱신된 a', 'children_ids': ['c']})
+    store.put('c', {'topic': '갱신된 c', 'direct_parent_id': 'a'})
+    
+    assert store.node_ids() == ['a', 'b', 'c']
+    assert store.root_children_ids() == ['a', 'b']
+    assert list(store.export_dict()) == ['a', 'b', 'c']
+
+def test_version_is_bumped_and_checked(database):
+    store = SQLiteNodeStore(database)
+    assert store.put('a', {'topic': 'a'})
+    first = store.get('a')
+    assert first['version'] == 1
+    
+    second = store.get('a')
+    second['topic'] = '먼저 저장'
+    assert store.put('a', second)
+    assert store.get('a')['version'] == 2
+    
+    # 갱신 전에 읽은 딕셔너리로는 덮어쓰지 않음
+    first['topic'] = '오래된 사본'
+    assert not store.put('a', first)
+    assert store.get('a')['topic'] == '먼저 저장'
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import memory
+from memory import NodeStore, create_new_node, get_node_data, transaction
+
+def test_transaction_rolls_back_every_change(node_store):
+    node_store.put('a', {'topic': 'a', 'children_ids': []})
+    wal_size = os.path.getsize(node_store.wal_path)
+    
+    with pytest.raises(RuntimeError):
+        with transaction():
+            node_store.put('b', {'topic': 'b', 'direct_parent_id': 'a'})
+            node_store.put('a', {'topic': 'a', 'children_ids': ['b']})
+            raise RuntimeError("중간 실패")
+    
+    assert node_store.get('b') is None
+    assert node_store.get('a')['children_ids'] == []
+    assert node_store.root_children_ids() == ['a']
+    assert os.path.getsize(node_store.wal_path) == wal_size
+
+def test_transaction_commits_as_one_wal_record(node_store, tmp_path):
+    node_store.put('a', {'topic': 'a'})
+    with transaction():
+        node_store.put('b', {'topic': 'b', 'direct_parent_id': 'a'})
+        node_store.put('a', {'topic': 'a', 'children_ids': ['b']})
+    node_store.sync_wal()
+    
+    reloaded = NodeStore(file_path=node_store.file_path)
+    assert reloaded.get('a')['children_ids'] == ['b']
+    assert reloaded.get('b')['all_parent_ids'] == ['a']
+
+def test_create_new_node_links_child_and_parent(node_store):
+    parent_id = create_new_node('부모', '요약')
+    child_id = create_new_node('자식', '요약', parent_id=parent_id, memory_indexes=[3])
+    
+    assert get_node_data(parent_id)['children_ids'] == [child_id]
+    assert get_node_data(child_id)['all_parent_ids'] == [parent_id]
+    assert get_node_data(child_id)['all_memory_indexes'] == [3]
+
+def test_create_new_node_rolls_back_when_parent_save_fails(node_store, monkeypatch):
+    parent_id = create_new_node('부모', '요약')
+    put = node_store.put
+    monkeypatch.setattr(node_store, 'put', lambda node_id, node_data:
+                        False if node_id == parent_id else put(node_id, node_data))
+    
+    assert create_new_node('자식', '요약', parent_id=parent_id) is None
+    assert node_store.node_ids() == [parent_id]
+    assert get_node_data(parent_id)['children_ids'] == []
+
+def test_create_new_node_rolls_back_on_version_conflict(node_store, monkeypatch):
+    parent_id = create_new_node('부모', '요약')
+    # 자식을 저장한 뒤 부모를 다시 읽기 전에 다른 곳에서 부모가 갱신됨
+    stale_parent = get_node_data(parent_id)
+    get_node_data_now = memory.get_node_data
+    monkeypatch.setattr(memory, 'get_node_data', lambda node_id:
+                        dict(stale_parent) if node_id == parent_id else get_node_data_now(node_id))
+    node_store.put(parent_id, get_node_data_now(parent_id))
+    
+    assert create_new_node('자식', '요약', parent_id=parent_id) is None
+    assert node_store.node_ids() == [parent_id]
+
+def test_create_new_node_requires_existing_parent(node_store):
+    assert create_new_node('자식', '요약', parent_id='missing') is None
+    assert len(node_store) == 0
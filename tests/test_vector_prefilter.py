@@ -0,0 +1,63 @@
+import pytest
+
+import config
+import memory
+import vector_index
+from config import CALL_STATS
+from vector_index import prefilter_candidates
+
+@pytest.fixture
+def pets(node_store, monkeypatch):
+    """고양이/강아지 부모 아래 자식 노드 6개"""
+    monkeypatch.setattr(config, 'VECTOR_PREFILTER_ENABLED', True)
+    monkeypatch.setattr(vector_index, '_vector_index', None)
+    cats = memory.create_new_node('고양이', '고양이 몽이 이야기')
+    dogs = memory.create_new_node('강아지', '강아지 산책 이야기')
+    return [
+        memory.create_new_node('몽이 사료', '고양이 몽이가 사료를 안 먹음', cats, [0]),
+        memory.create_new_node('몽이 병원', '고양이 몽이 병원 예방 접종', cats, [1]),
+        memory.create_new_node('한라산 등산', '겨울 한라산 등산 코스', cats, [2]),
+        memory.create_new_node('강아지 산책', '강아지 아침 산책 코스', dogs, [3]),
+        memory.create_new_node('강아지 간식', '강아지 간식 브랜드', dogs, [4]),
+        memory.create_new_node('주식 투자', '주식 투자 공부', dogs, [5]),
+    ]
+
+QUERY = "user: 우리 고양이 몽이가 사료를 안 먹어\nuser: 강아지 산책 코스 추천해줘"
+
+def test_disabled_without_numpy(pets, monkeypatch, capsys):
+    monkeypatch.setattr(vector_index, 'np', None)
+    monkeypatch.setattr(vector_index, '_numpy_warned', False)
+    assert prefilter_candidates(pets, QUERY, top_k=1) == pets
+    assert prefilter_candidates(pets, QUERY, top_k=1) == pets
+    assert capsys.readouterr().out.count("NumPy") == 1
+
+def test_disabled_by_config(pets, monkeypatch):
+    monkeypatch.setattr(config, 'VECTOR_PREFILTER_ENABLED', False)
+    assert prefilter_candidates(pets, QUERY, top_k=1) == pets
+
+def test_keeps_top_k_per_sibling_group_in_order(pets):
+    pytest.importorskip('numpy')
+    saved = CALL_STATS['prefilter_saved_calls']
+    kept = prefilter_candidates(pets, QUERY, top_k=2)
+    # 부모마다 관련 없는 노드 하나씩 제외하고 원래 순서 유지
+    assert kept == [pets[0], pets[1], pets[3], pets[4]]
+    assert CALL_STATS['prefilter_saved_calls'] == saved + 2
+
+def test_small_groups_are_not_filtered(pets):
+    pytest.importorskip('numpy')
+    saved = CALL_STATS['prefilter_saved_calls']
+    assert prefilter_candidates(pets[:2], QUERY, top_k=2) == pets[:2]
+    assert CALL_STATS['prefilter_saved_calls'] == saved
+
+def test_vector_is_recomputed_after_summary_change(pets):
+    pytest.importorskip('numpy')
+    index = vector_index.get_vector_index()
+    ranked = index.rank(pets[:3], "한라산 등산")
+    assert ranked[0][0] == pets[2]
+    
+    node_data = memory.get_node_data(pets[0])
+    node_data['topic'] = '한라산 등산 준비'
+    node_data['summary'] = '한라산 등산 장비와 코스'
+    assert memory.save_node_data(pets[0], node_data)
+    ranked = index.rank(pets[:2], "한라산 등산 장비")
+    assert ranked[0][0] == pets[0]
@@ -0,0 +1,90 @@
+import os
+import shutil
+
+import pytest
+
+from memory import NodeStore, WAL_RECORD_HEADER
+
+def make_store(tmp_path, **kwargs) -> NodeStore:
+    return NodeStore(file_path=str(tmp_path / 'memory' / 'hierarchical_memory.json'), **kwargs)
+
+def build_tree(store: NodeStore):
+    store.put('root-a', {'topic': '고양이', 'summary': '고양이 몽이 이야기', 'children_ids': ['leaf-a']})
+    store.put('leaf-a', {'topic': '몽이', 'summary': '몽이는 세 살', 'direct_parent_id': 'root-a',
+                         'all_memory_indexes': [0, 2]})
+    store.put('root-b', {'topic': '등산', 'summary': '한라산', 'all_memory_indexes': [1]})
+
+
+def test_wal_replays_changes_after_crash(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    store.sync_wal()  # 체크포인트 없이 종료
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.export_dict() == store.export_dict()
+
+@pytest.mark.parametrize('tail', [
+    WAL_RECORD_HEADER.pack(100, 0) + b'{"partial',  # 쓰다가 중단된 레코드
+    b'\x07\x00',  # 헤더 일부
+])
+def test_torn_wal_tail_is_truncated(tmp_path, tail):
+    store = make_store(tmp_path)
+    build_tree(store)
+    store.sync_wal()
+    good_size = os.path.getsize(store.wal_path)
+    with open(store.wal_path, 'ab') as f:
+        f.write(tail)
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.export_dict() == store.export_dict()
+    assert os.path.getsize(store.wal_path) == good_size
+    
+    # 잘라낸 뒤 이어서 기록한 변경도 재생됨
+    reloaded.put('root-c', {'topic': '새 노드'})
+    reloaded.sync_wal()
+    assert make_store(tmp_path).get('root-c')['topic'] == '새 노드'
+
+def test_wal_record_with_bad_checksum_is_dropped(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    store.sync_wal()
+    good_size = os.path.getsize(store.wal_path)
+    store.put('root-c', {'topic': '손상될 노드'})
+    store.sync_wal()
+    with open(store.wal_path, 'r+b') as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b'!!')
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.get('root-c') is None
+    assert reloaded.get('leaf-a')['summary'] == '몽이는 세 살'
+    assert os.path.getsize(store.wal_path) == good_size
+
+def test_checkpoint_folds_wal_into_snapshot(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    assert store.checkpoint()
+    assert os.path.getsize(store.wal_path) == 0
+    assert make_store(tmp_path).export_dict() == store.export_dict()
+
+def test_interrupted_checkpoint_replays_idempotently(tmp_path):
+    store = make_store(tmp_path)
+    build_tree(store)
+    store.sync_wal()
+    wal_copy = str(tmp_path / 'wal.copy')
+    shutil.copy(store.wal_path, wal_copy)
+    # 스냅샷은 저장했지만 WAL을 비우기 전에 중단됨
+    assert store.checkpoint()
+    shutil.copy(wal_copy, store.wal_path)
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.export_dict() == store.export_dict()
+    assert reloaded.get('leaf-a')['version'] == 1
+
+def test_without_wal_changes_wait_for_flush(tmp_path):
+    store = make_store(tmp_path, wal_enabled=False, flush_policy='exit')
+    build_tree(store)
+    assert not os.path.exists(store.wal_path)
+    assert make_store(tmp_path, wal_enabled=False).get('root-a') is None
+    assert store.flush()
+    assert make_store(tmp_path, wal_enabled=False).export_dict() == store.export_dict()
@@ -1,22 +1,100 @@
+import time
+import heapq
 import asyncio
-from config import debug_print, FANOUT_LIMIT, MAX_SEARCH_DEPTH, MAX_SUMMARY_LENGTH, UPDATE_TOPIC
-from memory import load_json, save_json, get_node_data, save_node_data, create_new_node, update_all_memory
-from ai_func import judgement_similar_multi_AI, summary_AI, topic_generation_AI, clustering_AI, parent_update_AI
+import contextvars
+import config
+from config import debug_print, FANOUT_LIMIT, MAX_SEARCH_DEPTH, MAX_SUMMARY_LENGTH, UPDATE_TOPIC, CALL_STATS
+from memory import get_root_children_ids, get_node_data, save_node_data, create_new_node, update_all_memory, transaction
+from memory import refresh_node_store
+from ai_func import judgement_similar_multi_AI, summary_AI, topic_generation_AI, clustering_AI, parent_update_AI, AIError
+from ai_func import call_budget
+from llm_backend import parse_similarity_score
+from vector_index import prefilter_candidates
+from ai_cache import content_hash, get_query_cache
 
 SIMILARITY_THRESHOLD = 0.7  # 기존 노드에 추가하는 임계값 (엄격하게)
 EXPLORATION_THRESHOLD = 0.5  # 탐색을 계속하는 임계값 (적당하게)
 
-# ROOT 노드의 자식 ID들 조회
-def get_root_children_ids():
-    """ROOT 노드의 직접 자식들 반환"""
-    hierarchical_memory = load_json('memory/hierarchical_memory.json', {})
-    root_children = []
-    
-    for node_id, node_data in hierarchical_memory.items():
-        if node_data.get('direct_parent_id') is None:  # ROOT의 직접 자식
-            root_children.append(node_id)
-    
-    return root_children
+# 턴 단위 유사도 점수 기록
+class TurnScores:
+    """
+    한 턴에서 평가한 노드별 유사도 응답을 기록하여, 검색에서 평가한 노드를
+    같은 턴의 저장 위치 탐색에서 다시 평가하지 않도록 함
+    노드 내용 해시와 함께 저장하므로 그 사이 주제나 요약이 바뀐 노드의 점수는 재사용하지 않음
+    """
+    def __init__(self):
+        self._scores = {}  # node_id -> (content_hash, 유사도 응답)
+    
+    def record(self, node_ids, results):
+        for node_id, result in zip(node_ids, results):
+            if parse_similarity_score(result) is None:
+                continue
+            node_data = get_node_data(node_id)
+            if node_data:
+                self._scores[node_id] = (content_hash(node_data), result)
+    
+    def lookup(self, node_id):
+        """기록된 유사도 응답 (없거나 노드가 바뀌었으면 None)"""
+        entry = self._scores.get(node_id)
+        if entry is None:
+            return None
+        node_data = get_node_data(node_id)
+        if not node_data or content_hash(node_data) != entry[0]:
+            return None
+        return entry[1]
+
+_turn_scores = contextvars.ContextVar('turn_scores', default=None)
+_search_path = contextvars.ContextVar('search_path', default=None)  # 검색이 따라 내려간 노드 ID 집합
+
+def start_turn_scoring():
+    """
+    현재 턴의 점수 기록 시작 (main_ai.main 시작 시 호출)
+    main은 턴마다 asyncio.run의 새 태스크에서 실행되고 태스크는 컨텍스트 복사본을 가지므로, 턴이 끝나면 기록도 함께 사라짐
+    """
+    turn_scores = TurnScores()
+    _turn_scores.set(turn_scores)
+    return turn_scores
+
+# 노드 유사도 판단 (턴 점수 기록 사용)
+async def judge_similarity(node_ids, query, batch, reuse=False):
+    """
+    judgement_similar_multi_AI로 노드들을 평가하고 결과를 이번 턴의 점수 기록에 저장
+    reuse=True이면 이번 턴에 이미 평가한 노드는 호출 없이 기록된 점수를 사용하고 나머지만 평가
+    """
+    turn_scores = _turn_scores.get()
+    if turn_scores is None:
+        results = await judgement_similar_multi_AI(
+            node_ids, query, batch=batch, batch_size=config.SIMILARITY_BATCH_SIZE
+        )
+        record_search_path(node_ids, results)
+        return results
+    
+    results = [turn_scores.lookup(node_id) if reuse else None for node_id in node_ids]
+    missing = [i for i, result in enumerate(results) if result is None]
+    reused = len(node_ids) - len(missing)
+    if reused:
+        CALL_STATS['turn_score_reuses'] += reused
+        debug_print(f"검색 점수 재사용 {reused}/{len(node_ids)}개 노드")
+    
+    if missing:
+        fresh = await judgement_similar_multi_AI(
+            [node_ids[i] for i in missing], query, batch=batch, batch_size=config.SIMILARITY_BATCH_SIZE
+        )
+        for i, result in zip(missing, fresh):
+            results[i] = result
+        turn_scores.record([node_ids[i] for i in missing], fresh)
+    record_search_path(node_ids, results)
+    return results
+
+def record_search_path(node_ids, results):
+    """검색 중이면 탐색을 계속할 노드(점수가 EXPLORATION_THRESHOLD를 넘거나 알 수 없는 노드)를 경로에 기록"""
+    path = _search_path.get()
+    if path is None:
+        return
+    for node_id, result in zip(node_ids, results):
+        similarity_score = parse_similarity_score(result)
+        if similarity_score is None or similarity_score > EXPLORATION_THRESHOLD:
+            path.add(node_id)
 
 # 특정 노드의 자식 ID들 조회
 def get_children_ids(node_id):
@@ -42,8 +120,42 @@ def get_memory_children_ids(parent_id):
     
     return memory_nodes
 
-# BFS 기반 트리 검색
+# 트리 검색
 async def search_tree(current_conversation):
+    """
+    관련 기억을 탐색하여 대화 인덱스 리스트를 반환 (SEARCH_ALGORITHM에 따라 BFS 또는 best-first)
+    QUERY_CACHE_ENABLED가 켜져 있으면 같거나 비슷한 이전 질의의 결과를 유사도 판단 없이 반환
+    """
+    CALL_STATS['memory_searches'] += 1
+    # 다른 프로세스의 변경은 검색 시작 시 한 번만 반영 (검색 중 노드 읽기는 메모리에서 처리)
+    refresh_node_store()
+    query_cache = get_query_cache()
+    if query_cache is not None:
+        cached = query_cache.get(current_conversation)
+        if cached is not None:
+            CALL_STATS['query_cache_hits'] += 1
+            debug_print(f"검색 결과 캐시 사용 (기억: {len(cached)}개)")
+            return cached
+    
+    path = set()
+    token = _search_path.set(path)
+    try:
+        if config.SEARCH_ALGORITHM == 'best_first':
+            found_memories = await best_first_search(current_conversation)
+        elif config.SEARCH_ALGORITHM == 'pipelined':
+            found_memories = await pipelined_search(current_conversation)
+        else:
+            found_memories = await bfs_search(current_conversation)
+    finally:
+        _search_path.reset(token)
+    
+    # 결과가 없으면 다음 턴에 저장될 기억을 놓치지 않도록 저장하지 않음
+    if query_cache is not None and found_memories:
+        query_cache.put(current_conversation, found_memories, path)
+    return found_memories
+
+# BFS 기반 트리 검색
+async def bfs_search(current_conversation):
     """
     BFS(너비 우선 탐색) 방식으로 관련 기억을 탐색
     """
@@ -52,6 +164,7 @@ async def search_tree(current_conversation):
     visited = set()
     found_memories = []
     depth = 1
+    saved_calls = 0
     
     debug_print(f"BFS 검색 시작 (초기 노드: {len(current_level_nodes)}개)")
     
@@ -63,29 +176,26 @@ async def search_tree(current_conversation):
         
         if not unvisited_nodes:
             break
+        visited.update(unvisited_nodes)
+        
+        # 형제 노드가 많으면 로컬 벡터 유사도로 상위 노드만 남김 (사전 필터를 사용하지 않으면 그대로)
+        candidates = prefilter_candidates(unvisited_nodes, current_conversation)
+        saved_calls += len(unvisited_nodes) - len(candidates)
         
         # 현재 레벨의 모든 노드에 대해 병렬 유사도 검사
-        similarity_results = await judgement_similar_multi_AI(
-            unvisited_nodes, current_conversation
-        )
+        similarity_results = await judge_similarity(candidates, current_conversation, config.SIMILARITY_BATCH_SEARCH)
         
         next_level_nodes = []
         
-        for i, node_id in enumerate(unvisited_nodes):
-            visited.add(node_id)
-            
+        for i, node_id in enumerate(candidates):
             # 유사도 점수로 판단
-            try:
-                similarity_score = float(similarity_results[i].strip())
-            except (ValueError, IndexError):
-                # 숫자로 변환 실패 시 기존 방식으로 fallback
-                if similarity_results[i].strip().lower() == 'true':
-                    similarity_score = 0.8
-                else:
-                    similarity_score = 0.0
+            similarity_score = parse_similarity_score(similarity_results[i])
+            if similarity_score is None:
+                # 점수를 알 수 없는 노드는 관련 없다고 단정하지 않고 탐색 대상에 포함
+                debug_print(f"유사도 알 수 없음: 노드 {node_id[:8]}... (탐색 유지)")
             
             # 최소 탐색 임계값 확인
-            if similarity_score > EXPLORATION_THRESHOLD:
+            if similarity_score is None or similarity_score > EXPLORATION_THRESHOLD:
                 node_data = get_node_data(node_id)
                 if not node_data:
                     continue
@@ -104,9 +214,181 @@ async def search_tree(current_conversation):
         current_level_nodes = next_level_nodes
         depth += 1
     
+    if saved_calls:
+        debug_print(f"벡터 사전 필터로 유사도 판단 {saved_calls}개 생략")
     debug_print(f"BFS 검색 완료 (발견된 기억: {len(found_memories)}개)")
     return found_memories
 
+# 단계 구분 없는 파이프라인 트리 검색
+async def pipelined_search(current_conversation):
+    """
+    BFS와 같은 방문/깊이/임계값 규칙으로 탐색하되, 단계 전체를 기다리지 않고
+    노드의 점수가 나오는 즉시 그 노드의 자식을 평가하기 시작함 (검색 시간이 단계별 최대 지연의 합이 아니라 가장 긴 경로에 비례)
+    SIMILARITY_BATCH_SEARCH가 켜져 있으면 형제 노드 그룹 단위로, 아니면 노드 단위로 평가하며
+    발견된 기억은 BFS와 같은 순서(깊이, 트리 내 위치)로 반환
+    """
+    visited = set()
+    found = []  # (깊이, 경로, 대화 인덱스 리스트)
+    pending = {}  # 평가 작업 -> (노드 그룹, 깊이, 노드별 경로)
+    saved_calls = 0
+    
+    async def score_group(group):
+        return await judge_similarity(group, current_conversation, config.SIMILARITY_BATCH_SEARCH)
+    
+    def schedule(children_ids, depth, parent_path):
+        """형제 노드들을 평가 작업으로 등록 (경로는 부모 경로 + 형제 목록 내 위치)"""
+        nonlocal saved_calls
+        if depth > MAX_SEARCH_DEPTH:
+            return
+        positions = {node_id: parent_path + (i,) for i, node_id in enumerate(children_ids)}
+        unvisited_nodes = [node_id for node_id in children_ids if node_id not in visited]
+        if not unvisited_nodes:
+            return
+        visited.update(unvisited_nodes)
+        
+        candidates = prefilter_candidates(unvisited_nodes, current_conversation)
+        saved_calls += len(unvisited_nodes) - len(candidates)
+        groups = [candidates] if config.SIMILARITY_BATCH_SEARCH else [[node_id] for node_id in candidates]
+        for group in groups:
+            pending[asyncio.ensure_future(score_group(group))] = (group, depth, positions)
+    
+    debug_print(f"파이프라인 검색 시작 (초기 노드: {len(get_root_children_ids())}개)")
+    schedule(get_root_children_ids(), 1, ())
+    
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                group, depth, positions = pending.pop(task)
+                for node_id, result in zip(group, task.result()):
+                    similarity_score = parse_similarity_score(result)
+                    if similarity_score is None:
+                        # 점수를 알 수 없는 노드는 관련 없다고 단정하지 않고 탐색 대상에 포함
+                        debug_print(f"유사도 알 수 없음: 노드 {node_id[:8]}... (탐색 유지)")
+                    elif similarity_score <= EXPLORATION_THRESHOLD:
+                        continue
+                    
+                    node_data = get_node_data(node_id)
+                    if not node_data:
+                        continue
+                    if not node_data.get('children_ids'):
+                        found.append((depth, positions[node_id], node_data.get('all_memory_indexes', [])))
+                        debug_print(f"기억 발견: 노드 {node_id[:8]}... ({len(node_data.get('all_memory_indexes', []))}개 대화)")
+                    else:
+                        children = node_data.get('children_ids', [])
+                        schedule(children, depth + 1, positions[node_id])
+                        debug_print(f"하위 탐색: 노드 {node_id[:8]}... ({len(children)}개 자식, 깊이 {depth + 1})")
+    finally:
+        for task in pending:
+            task.cancel()
+    
+    found.sort(key=lambda item: (item[0], item[1]))
+    found_memories = [index for _, _, indexes in found for index in indexes]
+    if saved_calls:
+        debug_print(f"벡터 사전 필터로 유사도 판단 {saved_calls}개 생략")
+    debug_print(f"파이프라인 검색 완료 (발견된 기억: {len(found_memories)}개)")
+    return found_memories
+
+# 예산 제한 best-first 트리 검색
+async def best_first_search(current_conversation, max_calls=None, time_budget_ms=None, top_k=None):
+    """
+    유사도 점수가 높은 노드부터 펼치는 best-first 방식으로 관련 기억을 탐색
+    - AI 호출 수(max_calls)와 소요 시간(time_budget_ms)을 넘지 않으며, 예산이 남아도
+      SIMILARITY_THRESHOLD를 넘는 기억 노드를 top_k개 찾으면 조기 종료
+    - 호출 수는 이 검색의 호출 예산(call_budget)으로 세므로 재시도, 배치 실패 후 개별 재평가, 헤지 요청도 포함되고
+      동시에 실행되는 다른 검색의 호출과 섞이지 않음
+    - 점수가 높은 기억 노드 top_k개의 대화 인덱스를 점수 순으로 반환
+    - 점수를 알 수 없는 노드는 EXPLORATION_THRESHOLD 점수로 취급 (점수가 확인된 노드보다 나중에 펼침)
+    """
+    max_calls = max_calls or config.SEARCH_MAX_LLM_CALLS
+    top_k = top_k or config.SEARCH_TOP_K
+    start_time = time.monotonic()
+    deadline = start_time + (time_budget_ms or config.SEARCH_TIME_BUDGET_MS) / 1000
+    
+    frontier = []  # (-점수, 순번, 노드 ID, 깊이) 최대 힙
+    leaves = []  # (점수, 노드 ID)
+    scored = set()
+    saved_calls = 0
+    stop_reason = "탐색 완료"
+    
+    async def score_nodes(node_ids, depth, budget):
+        """노드들을 평가하여 기억 노드는 leaves에, 부모 노드는 frontier에 추가 (예산이 끝났으면 False)"""
+        nonlocal saved_calls, stop_reason
+        node_ids = [node_id for node_id in node_ids if node_id not in scored]
+        if not node_ids:
+            return True
+        candidates = prefilter_candidates(node_ids, current_conversation)
+        saved_calls += len(node_ids) - len(candidates)
+        
+        remaining_calls = budget.remaining
+        remaining_time = deadline - time.monotonic()
+        if remaining_calls <= 0 or remaining_time <= 0:
+            stop_reason = "호출 예산 소진" if remaining_calls <= 0 else "시간 예산 소진"
+            return False
+        batch = config.SIMILARITY_BATCH_SEARCH
+        if not batch and len(candidates) > remaining_calls:
+            # 개별 호출은 노드마다 한 번 이상이므로 남은 호출 수보다 많은 노드는 평가하지 않음
+            candidates = candidates[:remaining_calls]
+        
+        refused_before = budget.refused
+        try:
+            similarity_results = await asyncio.wait_for(
+                judge_similarity(candidates, current_conversation, batch),
+                timeout=remaining_time
+            )
+        except asyncio.TimeoutError:
+            stop_reason = "시간 예산 소진"
+            return False
+        # 예산 때문에 거절된 호출이 있으면 점수가 없는 노드는 평가하지 않은 것으로 취급
+        refused = budget.refused > refused_before
+        
+        for node_id, result in zip(candidates, similarity_results):
+            similarity_score = parse_similarity_score(result)
+            if similarity_score is None and refused:
+                continue
+            scored.add(node_id)
+            if similarity_score is not None and similarity_score <= EXPLORATION_THRESHOLD:
+                continue
+            node_data = get_node_data(node_id)
+            if not node_data:
+                continue
+            priority = EXPLORATION_THRESHOLD if similarity_score is None else similarity_score
+            if node_data.get('children_ids'):
+                heapq.heappush(frontier, (-priority, len(scored), node_id, depth))
+            else:
+                leaves.append((priority, node_id))
+        if refused:
+            stop_reason = "호출 예산 소진"
+            return False
+        return True
+    
+    debug_print(f"best-first 검색 시작 (호출 예산: {max_calls}회, 시간 예산: {deadline - start_time:.1f}초, top-k: {top_k})")
+    
+    with call_budget(max_calls) as budget:
+        within_budget = await score_nodes(get_root_children_ids(), 1, budget)
+        while within_budget and frontier:
+            if sum(1 for score, _ in leaves if score > SIMILARITY_THRESHOLD) >= top_k:
+                stop_reason = "확실한 기억 충분"
+                break
+            negative_score, _, node_id, depth = heapq.heappop(frontier)
+            if depth >= MAX_SEARCH_DEPTH:
+                continue
+            debug_print(f"노드 펼침: {node_id[:8]}... (점수 {-negative_score:.2f}, 깊이 {depth})")
+            within_budget = await score_nodes(get_children_ids(node_id), depth + 1, budget)
+    
+    leaves.sort(key=lambda leaf: -leaf[0])
+    found_memories = []
+    for score, node_id in leaves[:top_k]:
+        node_data = get_node_data(node_id)
+        if node_data:
+            found_memories.extend(index for index in node_data.get('all_memory_indexes', []) if index not in found_memories)
+    
+    if saved_calls:
+        debug_print(f"벡터 사전 필터로 유사도 판단 {saved_calls}개 생략")
+    debug_print(f"best-first 검색 완료 ({stop_reason}, AI 호출 {budget.used}회, "
+                f"{time.monotonic() - start_time:.2f}초, 기억 노드 {min(len(leaves), top_k)}/{len(leaves)}개, 발견된 기억: {len(found_memories)}개)")
+    return found_memories
+
 # 최적 자식 노드 찾기 (저장 위치 탐색용)
 async def find_best_matching_child(children_ids, conversation_pair):
     """가장 유사한 자식 노드 찾기"""
@@ -120,8 +402,12 @@ async def find_best_matching_child(children_ids, conversation_pair):
         content = msg.get('content', '')
         conversation_str += f"{role}: {content}\n"
     
-    # 유사도 검사
-    similarity_results = await judgement_similar_multi_AI(children_ids, conversation_str)
+    # 형제 노드가 많으면 로컬 벡터 유사도로 상위 노드만 남긴 뒤 유사도 검사
+    # (같은 턴의 검색에서 평가한 노드는 그 점수를 재사용)
+    children_ids = prefilter_candidates(children_ids, conversation_str)
+    similarity_results = await judge_similarity(
+        children_ids, conversation_str, config.SIMILARITY_BATCH_STORAGE, reuse=config.REUSE_SEARCH_SCORES
+    )
     
     best_match = None
     best_score = 0.0
@@ -133,16 +419,11 @@ async def find_best_matching_child(children_ids, conversation_pair):
         
         # 유사도 결과를 점수로 변환
         # 원래 점수로 안하는데 조절이 힘들어서 점수 방식을 사용함
-        try:
-            similarity_score = float(similarity_results[i].strip())
-        except (ValueError, IndexError):
-            # 숫자로 변환 실패 시 기존 방식으로 fallback
-            # 이런 경우는 거의 발생하지 않음
-            if similarity_results[i].strip().lower() == 'true':
-                similarity_score = 0.8 
-                #True인 경우 중간 점수
-            else:
-                similarity_score = 0.0
+        similarity_score = parse_similarity_score(similarity_results[i])
+        if similarity_score is None:
+            # 점수를 알 수 없는 노드에는 저장하지 않음
+            debug_print(f"유사도 알 수 없음: 노드 {child_id[:8]}... (저장 후보에서 제외)")
+            continue
         
         if similarity_score > best_score:
             best_score = similarity_score
@@ -232,7 +513,13 @@ async def add_to_existing_node(node_id, memory_index, conversation_summary):
             node_data['topic'] = new_topic
     
     success = save_node_data(node_id, node_data)
-
+    if not success:
+        # 요약 압축 중 다른 프로세스가 먼저 저장한 경우(version 충돌) 최신 노드에 압축 없이 다시 반영
+        latest_data = get_node_data(node_id)
+        if latest_data and latest_data.get('version') != node_data.get('version'):
+            latest_data['all_memory_indexes'] = latest_data.get('all_memory_indexes', []) + [memory_index]
+            latest_data['summary'] = f"{latest_data.get('summary', '')}\n{conversation_summary}"
+            success = save_node_data(node_id, latest_data)
 
     if success:
         debug_print(f"기존 노드에 대화 추가 완료: {node_id[:8]}...")
@@ -294,52 +581,73 @@ async def perform_clustering(parent_id, new_memory_index, new_conversation_summa
         selected_node_ids = memory_children_ids[:min(2, len(memory_children_ids))]
         new_parent_topic = "관련 주제"
     
-    #새로운 중간 부모 노드 생성
-    new_parent_id = create_new_node(
-        topic=new_parent_topic,
-        summary="",  # 나중에 업데이트할 예정ㅇ
-        parent_id=parent_id if parent_id != "ROOT" else None,
-        memory_indexes=[]
-    )
-    
-    if not new_parent_id:
-        debug_print("ERROR: 새 부모 노드 생성 실패")
-        return None
-    
-    #선택된 노드들을 새 부모 밑으로 이동
-    all_memory_indexes = [new_memory_index]
+    # AI 호출(주제명, 통합 요약)은 트리 변경 전에 모두 수행
+    selected_nodes = []
     combined_summaries = [new_conversation_summary]
-    
     for node_id in selected_node_ids:
         node_data = get_node_data(node_id)
         if node_data:
-            # 부모 변경
-            node_data['direct_parent_id'] = new_parent_id
-            node_data['all_parent_ids'] = node_data.get('all_parent_ids', []) + [new_parent_id]
-            save_node_data(node_id, node_data)
-            
-            # 데이터 수집
-            all_memory_indexes.extend(node_data.get('all_memory_indexes', []))
+            selected_nodes.append(node_data)
             combined_summaries.append(node_data.get('summary', ''))
-        
-        # 기존 부모에서 제거
-        if parent_id != "ROOT":
-            parent_data = get_node_data(parent_id)
-            if parent_data and node_id in parent_data.get('children_ids', []):
-                parent_data['children_ids'].remove(node_id)
-                save_node_data(parent_id, parent_data)
-    
-    #새 기억 노드 생성 (현재 대화용)
-    new_memory_node_id = await create_new_memory_node(new_parent_id, new_memory_index, new_conversation_summary)
-    
-    # 새 부모 노드 업데이트
-    new_parent_data = get_node_data(new_parent_id)
-    if new_parent_data:
-        new_parent_data['children_ids'] = selected_node_ids + ([new_memory_node_id] if new_memory_node_id else [])
-        # 통합 요약 생성
-        combined_summary = summary_AI([{"role": "system", "content": "\n".join(combined_summaries)}])
-        new_parent_data['summary'] = combined_summary
-        save_node_data(new_parent_id, new_parent_data)
+    selected_node_ids = [node_data['node_id'] for node_data in selected_nodes]
+    
+    memory_topic = topic_generation_AI(new_conversation_summary)
+    combined_summary = summary_AI([{"role": "system", "content": "\n".join(combined_summaries)}])
+    
+    # 구조 변경은 하나의 트랜잭션으로 반영 (중간 실패 시 전체 롤백)
+    try:
+        with transaction():
+            #새로운 중간 부모 노드 생성
+            new_parent_id = create_new_node(
+                topic=new_parent_topic,
+                summary=combined_summary,
+                parent_id=parent_id if parent_id != "ROOT" else None,
+                memory_indexes=[]
+            )
+            if not new_parent_id:
+                raise RuntimeError("새 부모 노드 생성 실패")
+            new_parent_data = get_node_data(new_parent_id)
+            
+            #선택된 노드들을 새 부모 밑으로 이동
+            for node_data in selected_nodes:
+                node_id = node_data['node_id']
+                node_data['direct_parent_id'] = new_parent_id
+                node_data['all_parent_ids'] = new_parent_data.get('all_parent_ids', []) + [new_parent_id]
+                if not save_node_data(node_id, node_data):
+                    raise RuntimeError(f"노드 {node_id[:8]}... 이동 실패")
+            
+            # 기존 부모에서 제거
+            if parent_id != "ROOT":
+                parent_data = get_node_data(parent_id)
+                if parent_data:
+                    parent_data['children_ids'] = [
+                        child_id for child_id in parent_data.get('children_ids', [])
+                        if child_id not in selected_node_ids
+                    ]
+                    if not save_node_data(parent_id, parent_data):
+                        raise RuntimeError("기존 부모 노드 갱신 실패")
+            
+            #새 기억 노드 생성 (현재 대화용)
+            new_memory_node_id = create_new_node(
+                topic=memory_topic,
+                summary=new_conversation_summary,
+                parent_id=new_parent_id,
+                memory_indexes=[new_memory_index]
+            )
+            if not new_memory_node_id:
+                raise RuntimeError("새 기억 노드 생성 실패")
+            
+            # 새 부모 노드 자식 목록 확정
+            new_parent_data = get_node_data(new_parent_id)
+            new_parent_data['children_ids'] = selected_node_ids + [new_memory_node_id]
+            if not save_node_data(new_parent_id, new_parent_data):
+                raise RuntimeError("새 부모 노드 갱신 실패")
+    except Exception as e:
+        debug_print(f"ERROR: 클러스터링 실패, 변경 사항을 되돌렸습니다: {e}")
+        return None
+    
+    # 새 부모 위의 조상 노드들 업데이트 (새 부모 요약에는 이미 현재 대화가 포함됨)
+    await update_parent_nodes(new_parent_id, new_conversation_summary)
     
     debug_print(f"클러스터링 완료 (새 부모: '{new_parent_topic}', 통합된 노드: {len(selected_node_ids)}개)")
     return new_parent_id
@@ -359,29 +667,31 @@ async def update_parent_nodes(updated_node_id, new_content_summary):
     if not all_parent_ids:
         return  # ROOT 직속 자식인 경우
     
-    # 요약 이어붙이기 (순차적 처리)
+    # 요약 이어붙이기 (순차적 처리, 한 번에 반영)
     need_compression = []
     
-    for parent_id in all_parent_ids:
-        parent_data = get_node_data(parent_id)
-        if not parent_data:
-            continue
-        
-        parent_data['summary'] = parent_data.get('summary', '') + f"\n{new_content_summary}"
-        
-        # 길이 체크
-        if len(parent_data['summary']) > MAX_SUMMARY_LENGTH:
-            if UPDATE_TOPIC in ['smart', 'always']:
-                need_compression.append(parent_id)
-            elif UPDATE_TOPIC == 'never':
-                debug_print(f"경고: 노드 {parent_id[:8]}... 요약 길이 초과 ({len(parent_data['summary'])}/{MAX_SUMMARY_LENGTH})")
-        
-        save_node_data(parent_id, parent_data)
+    with transaction():
+        for parent_id in all_parent_ids:
+            parent_data = get_node_data(parent_id)
+            if not parent_data:
+                continue
+            
+            parent_data['summary'] = parent_data.get('summary', '') + f"\n{new_content_summary}"
+            
+            # 길이 체크
+            if len(parent_data['summary']) > MAX_SUMMARY_LENGTH:
+                if UPDATE_TOPIC in ['smart', 'always']:
+                    need_compression.append(parent_id)
+                elif UPDATE_TOPIC == 'never':
+                    debug_print(f"경고: 노드 {parent_id[:8]}... 요약 길이 초과 ({len(parent_data['summary'])}/{MAX_SUMMARY_LENGTH})")
+            
+            save_node_data(parent_id, parent_data)
     
     # 병렬 압축 처리 (필요한 경우)
     if need_compression:
         debug_print(f"부모 노드 압축 시작 ({len(need_compression)}개)")
         
+        compressed = []
         for parent_id in need_compression:
             parent_data = get_node_data(parent_id)
             if parent_data:
@@ -392,7 +702,12 @@ async def update_parent_nodes(updated_node_id, new_content_summary):
                 parent_data['summary'] = new_summary
                 if new_topic:
                     parent_data['topic'] = new_topic
-                save_node_data(parent_id, parent_data)
+                compressed.append(parent_data)
+        
+        # 압축 중 다른 곳에서 갱신된 노드는 version 충돌로 저장되지 않고 다음 갱신 때 다시 압축됨
+        with transaction():
+            for parent_data in compressed:
+                save_node_data(parent_data['node_id'], parent_data)
         
         debug_print(f"부모 노드 압축 완료 ({len(need_compression)}개)")
 
@@ -400,34 +715,40 @@ async def update_parent_nodes(updated_node_id, new_content_summary):
 async def save_tree(conversation_pair):
     """새로운 대화를 적절한 위치에 저장"""
     debug_print("대화 저장 프로세스 시작")
+    refresh_node_store()
     
     memory_index = update_all_memory(conversation_pair)
     if memory_index == -1:
         debug_print("ERROR: ALL_MEMORY 업데이트 실패")
         return False
     
-    conversation_summary = summary_AI(conversation_pair, MAX_SUMMARY_LENGTH)
-    
-    target_location = await find_storage_location(conversation_pair)
-    
-    if target_location.get('existing_memory_node'):
-        # 기존 기억 노드에 추가
-        success = await add_to_existing_node(
-            target_location['node_id'], 
-            memory_index, 
-            conversation_summary
-        )
-    else:
-        # 새 기억 노드 생성 필요
-        parent_id = target_location.get('parent_id', "ROOT")
+    try:
+        conversation_summary = summary_AI(conversation_pair, MAX_SUMMARY_LENGTH)
         
-        # Fanout 제한 확인
-        if will_exceed_fanout_limit(parent_id):
-            # 클러스터링 수행
-            success = await perform_clustering(parent_id, memory_index, conversation_summary)
+        target_location = await find_storage_location(conversation_pair)
+        
+        if target_location.get('existing_memory_node'):
+            # 기존 기억 노드에 추가
+            success = await add_to_existing_node(
+                target_location['node_id'], 
+                memory_index, 
+                conversation_summary
+            )
         else:
-            # 직접 새 노드 생성
-            success = await create_new_memory_node(parent_id, memory_index, conversation_summary)
+            # 새 기억 노드 생성 필요
+            parent_id = target_location.get('parent_id', "ROOT")
+            
+            # Fanout 제한 확인
+            if will_exceed_fanout_limit(parent_id):
+                # 클러스터링 수행
+                success = await perform_clustering(parent_id, memory_index, conversation_summary)
+            else:
+                # 직접 새 노드 생성
+                success = await create_new_memory_node(parent_id, memory_index, conversation_summary)
+    except AIError as e:
+        # 요약/주제 생성 실패: 대화는 ALL_MEMORY에 남고 트리에는 반영하지 않음
+        debug_print(f"ERROR: AI 호출 실패로 트리 저장을 건너뜁니다 (ALL_MEMORY 인덱스 {memory_index}): {e}")
+        return False
     
     debug_print("대화 저장 프로세스 완료")
     return bool(success)
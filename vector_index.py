@@ -0,0 +1,143 @@
+import zlib
+import threading
+try:
+    import numpy as np
+except ImportError:  # NumPy가 없으면 사전 필터를 사용하지 않음
+    np = None
+import config
+from config import CALL_STATS
+from memory import get_node_data, add_node_listener
+from ai_cache import content_hash
+
+VECTOR_DIM = 1 << 16  # 해시 버킷 수 (노드 벡터는 희소 형식으로 저장하므로 메모리와 무관)
+NGRAM_SIZES = (2, 3)  # 글자 n-gram 길이 (조사가 붙은 한국어 단어도 어간 부분이 겹치도록)
+
+# 글자 n-gram
+def char_ngrams(text: str):
+    padded = f" {' '.join(text.lower().split())} "
+    for size in NGRAM_SIZES:
+        for i in range(len(padded) - size + 1):
+            gram = padded[i:i + size]
+            if gram.strip():
+                yield gram
+
+# 해시된 n-gram 빈도 벡터 (희소)
+def hashed_tf(text: str):
+    """
+    Returns:
+        tuple: (정렬된 버킷 번호 배열, 1 + log(빈도) 가중치 배열)
+    """
+    buckets = np.fromiter(
+        (zlib.crc32(gram.encode('utf-8')) % VECTOR_DIM for gram in char_ngrams(text)), dtype=np.int64
+    )
+    indices, counts = np.unique(buckets, return_counts=True)
+    return indices, 1.0 + np.log(counts)
+
+# 노드 벡터 저장소
+class VectorIndex:
+    """
+    노드별 (주제 + 요약) 해시 n-gram 벡터를 보관하고 질의와 가까운 순으로 노드를 정렬
+    벡터는 노드 내용 해시와 함께 저장되어 요약이 바뀌면 다시 계산되고,
+    save_node_data로 주제나 요약이 바뀐 노드의 이전 벡터는 즉시 제거됨
+    IDF는 정렬하는 형제 노드들과 질의만으로 계산하므로 전역 통계를 유지하지 않음
+    """
+    def __init__(self):
+        self._vectors = {}  # node_id -> (content_hash, indices, weights)
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._vectors)
+    
+    def invalidate_node(self, node_id: str, node_data: dict):
+        """노드의 주제나 요약이 바뀌었으면 이전 벡터를 제거 (다음 정렬 때 다시 계산)"""
+        content = content_hash(node_data)
+        with self._lock:
+            cached = self._vectors.get(node_id)
+            if cached is not None and cached[0] != content:
+                del self._vectors[node_id]
+    
+    def node_vector(self, node_id: str, node_data: dict):
+        content = content_hash(node_data)
+        with self._lock:
+            cached = self._vectors.get(node_id)
+        if cached is not None and cached[0] == content:
+            return cached[1], cached[2]
+        indices, weights = hashed_tf(f"{node_data.get('topic', '')}\n{node_data.get('summary', '')}")
+        with self._lock:
+            self._vectors[node_id] = (content, indices, weights)
+        return indices, weights
+    
+    def rank(self, node_ids: list, query: str) -> list:
+        """
+        node_ids를 질의와의 TF-IDF 코사인 유사도가 높은 순으로 정렬
+        Returns:
+            list: [(node_id, 점수), ...] (노드 데이터가 없으면 0.0)
+        """
+        vectors = [hashed_tf(query)]
+        for node_id in node_ids:
+            node_data = get_node_data(node_id)
+            vectors.append(self.node_vector(node_id, node_data) if node_data else hashed_tf(""))
+        
+        # 등장한 버킷만으로 밀집 행렬 구성 (행 0은 질의)
+        vocabulary = np.unique(np.concatenate([indices for indices, _ in vectors]))
+        matrix = np.zeros((len(vectors), len(vocabulary)), dtype=np.float32)
+        for row, (indices, weights) in enumerate(vectors):
+            matrix[row, np.searchsorted(vocabulary, indices)] = weights
+        
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        matrix *= np.log((len(vectors) + 1) / (document_frequency + 1)) + 1.0
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        matrix /= norms[:, None]
+        scores = matrix[1:] @ matrix[0]
+        
+        order = np.argsort(-scores, kind='stable')
+        return [(node_ids[i], float(scores[i])) for i in order]
+
+_vector_index = None
+_numpy_warned = False
+
+def get_vector_index():
+    """프로세스 전역 벡터 저장소 반환 (VECTOR_PREFILTER_ENABLED가 false이거나 NumPy가 없으면 None)"""
+    global _vector_index, _numpy_warned
+    if not config.VECTOR_PREFILTER_ENABLED:
+        return None
+    if np is None:
+        if not _numpy_warned:
+            # 설정으로 켠 기능이 꺼진 채 동작하므로 디버그 모드가 아니어도 알림
+            print("경고: VECTOR_PREFILTER_ENABLED가 켜져 있지만 NumPy가 설치되어 있지 않아 벡터 사전 필터를 사용하지 않습니다. "
+                  "(pip install numpy)")
+            _numpy_warned = True
+        return None
+    if _vector_index is None:
+        _vector_index = VectorIndex()
+        add_node_listener(_vector_index.invalidate_node)
+    return _vector_index
+
+# LLM 유사도 판단 전 후보 줄이기
+def prefilter_candidates(node_ids: list, query: str, top_k: int = None) -> list:
+    """
+    같은 부모를 가진 형제 노드끼리 질의와 가까운 top_k개만 남김 (순서는 유지)
+    사전 필터를 사용하지 않으면 node_ids를 그대로 반환하고, 제외한 노드 수는 CALL_STATS['prefilter_saved_calls']에 누적
+    """
+    top_k = top_k or config.VECTOR_PREFILTER_TOP_K
+    index = get_vector_index()
+    if index is None or len(node_ids) <= top_k:
+        return node_ids
+    
+    siblings = {}
+    for node_id in node_ids:
+        node_data = get_node_data(node_id)
+        parent_id = node_data.get('direct_parent_id') if node_data else None
+        siblings.setdefault(parent_id, []).append(node_id)
+    
+    kept = set()
+    for group in siblings.values():
+        if len(group) <= top_k:
+            kept.update(group)
+        else:
+            kept.update(node_id for node_id, _ in index.rank(group, query)[:top_k])
+    
+    result = [node_id for node_id in node_ids if node_id in kept]
+    CALL_STATS['prefilter_saved_calls'] += len(node_ids) - len(result)
+    return result